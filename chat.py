@@ -23,6 +23,31 @@ class Chat:
 To set a custom name, send it along with the URL separated by <code>|</code>.  
 Example: <i>url|custom_name.mp4</i>  
 
+🎞 <b>Muxing:</b>  
+<code>/softmux</code> · <code>/hardmux</code> · <code>/nosub</code> – mux the files you sent  
+<code>/auto</code> – pick the cheapest mode that honours your settings  
+<code>/trim start end [exact]</code> – cut a clip, e.g. <code>/trim 1:30 4:05</code>  
+<code>/batch</code> – collect many files, then <code>/batch soft|hard|nosub</code> or <code>/batch cancel</code>  
+
+📋 <b>Queue:</b>  
+<code>/queue</code> – your running and queued jobs  
+<code>/cancel &lt;job_id|batch_id&gt;</code> – stop a job or a whole batch  
+<code>/move &lt;job_id&gt; &lt;position&gt;</code> · <code>/top &lt;job_id&gt;</code> – reorder the queue (admins)  
+<code>/urgent &lt;job_id&gt;</code> – run a queued job now, pausing the running one (admins)  
+
+⚙️ <b>Settings:</b>  
+<code>/settings</code> – resolution, codec, preset and CRF  
+<code>/targetsize &lt;MB&gt;|tg|off</code> – two-pass encode to a file size  
+<code>/smartrender on|off</code> – hardmux re-encodes only the subtitled ranges  
+<code>/uploadas video|document</code> – how MP4 results are sent  
+<code>/defaultsub first|none|&lt;lang&gt;</code> – default soft-muxed subtitle track  
+<code>/srt2ass on|off</code> – convert SRT to styled ASS at upload  
+
+📊 <b>Stats:</b>  
+<code>/usage [all] [days]</code> – ffmpeg CPU / RAM / IO per mode  
+<code>/lag</code> – bot event-loop health  
+<code>/loglevel [&lt;logger&gt; &lt;LEVEL&gt;]</code> – view or change log levels (admins)  
+
 ⚠️ <b>Note:</b>  
 <i>Hardmux only supports English fonts. Other scripts may appear as empty blocks in the video!</i>  
 
@@ -9,7 +9,86 @@ class Config:
 
     #comma seperated user id of users who are allowed to use
     ALLOWED_USERS = [x.strip(' ') for x in os.environ.get('ALLOWED_USERS','1423807625,1048110820,6520490787,7100701721,7297547385').split(',')]
+    #comma seperated user id of admins (may reorder the queue with /move, /top)
+    ADMINS = [x.strip(' ') for x in os.environ.get('ADMINS','1423807625').split(',')]
  # Absolute path to the folder where you keep your .ttf/.otf files
     FONTS_DIR = os.path.join(os.getcwd(), "fonts")
+    # Shipped font (a family in FONTS_DIR) SRT subtitles are drawn with; every hard-mux
+    # fonts folder also gets it, so libass always has a font to substitute missing ones with
+    SUB_FALLBACK_FONT = os.environ.get('SUB_FALLBACK_FONT', 'Arial Rounded MT Bold')
     
     DOWNLOAD_DIR = 'downloads'
+
+    # Largest file a bot may upload (Telegram's 2GB limit, see Chat.MAX_FILE_SIZE)
+    TG_MAX_FILE_SIZE = 2000 * 1024 * 1024
+    # Cap plain CRF encodes at the bitrate that fits one TG_MAX_FILE_SIZE file. Off by default: the cap
+    # is the whole video's average budget, so it starves busy scenes, and oversized outputs get split anyway
+    CRF_SIZE_CAP = os.environ.get('CRF_SIZE_CAP', 'false').lower() in ('1', 'true', 'yes')
+
+    # Auto-CRF ("auto" in /settings): samples scored before the full encode
+    AUTO_CRF_SAMPLES = int(os.environ.get('AUTO_CRF_SAMPLES', 4))
+    AUTO_CRF_SAMPLE_SECONDS = float(os.environ.get('AUTO_CRF_SAMPLE_SECONDS', 4))
+    AUTO_CRF_PARALLEL = int(os.environ.get('AUTO_CRF_PARALLEL', max(1, (os.cpu_count() or 2) // 2)))
+    AUTO_CRF_TARGET_VMAF = float(os.environ.get('AUTO_CRF_TARGET_VMAF', 93))
+    AUTO_CRF_TARGET_SSIM = float(os.environ.get('AUTO_CRF_TARGET_SSIM', 0.985))
+
+    # Smart-render hard-mux falls back to a full encode above this subtitle coverage
+    SMART_RENDER_MAX_COVERAGE = float(os.environ.get('SMART_RENDER_MAX_COVERAGE', 0.6))
+
+    # Event-loop lag monitor: stalls longer than this (seconds) are logged with a stack
+    LOOP_STALL_THRESHOLD = float(os.environ.get('LOOP_STALL_THRESHOLD', 0.25))
+    LOOP_STALL_LOG = os.path.join(DOWNLOAD_DIR, 'loop_stalls.jsonl')
+
+    # Per-user ffmpeg CPU-second quota over a rolling window (0 = unlimited)
+    CPU_QUOTA_SECONDS = float(os.environ.get('CPU_QUOTA_SECONDS', 0))
+    CPU_QUOTA_WINDOW = int(os.environ.get('CPU_QUOTA_WINDOW', 24 * 3600))
+
+    # Lazy ingest: only remember Telegram videos and download them shortly before their job runs
+    LAZY_INGEST = os.environ.get('LAZY_INGEST', 'false').lower() in ('1', 'true', 'yes')
+    INGEST_LOOKAHEAD = float(os.environ.get('INGEST_LOOKAHEAD', 600))
+    INGEST_MAX_PARALLEL = int(os.environ.get('INGEST_MAX_PARALLEL', 2))
+
+    # Parallel uploads: outputs above UPLOAD_PARALLEL_MIN are sent as parts over UPLOAD_SESSIONS media sessions
+    UPLOAD_SESSIONS = int(os.environ.get('UPLOAD_SESSIONS', 4))
+    UPLOAD_PARALLEL_MIN = int(os.environ.get('UPLOAD_PARALLEL_MIN', 20 * 1024 * 1024))
+    UPLOAD_PART_RETRIES = int(os.environ.get('UPLOAD_PART_RETRIES', 3))
+
+    # ffmpeg supervisor: kill runs whose out_time stalls for FFMPEG_STALL_TIMEOUT seconds or that take longer
+    # than max(FFMPEG_DEADLINE_MIN, FFMPEG_DEADLINE_FACTOR x media duration), then retry with safer options
+    FFMPEG_STALL_TIMEOUT = float(os.environ.get('FFMPEG_STALL_TIMEOUT', 120))
+    FFMPEG_DEADLINE_FACTOR = float(os.environ.get('FFMPEG_DEADLINE_FACTOR', 20))
+    FFMPEG_DEADLINE_MIN = float(os.environ.get('FFMPEG_DEADLINE_MIN', 600))
+    FFMPEG_RETRIES = int(os.environ.get('FFMPEG_RETRIES', 2))
+
+    # Settings profiles for the headless muxcli.py (JSON files with the keys /settings stores)
+    PROFILES_DIR = os.environ.get('PROFILES_DIR', 'profiles')
+
+    # Logging: default level, per-subsystem levels (logger=LEVEL,...; /loglevel changes them at runtime),
+    # 'json' or 'text' lines, and the minimum seconds between two sampled events (progress ticks) of a job
+    LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.environ.get('LOG_LEVELS', 'pyrogram=WARNING,aiohttp=WARNING')
+    LOG_FORMAT = os.environ.get('LOG_FORMAT', 'json')
+    LOG_SAMPLE_INTERVAL = float(os.environ.get('LOG_SAMPLE_INTERVAL', 30))
+
+    # Outputs over TG_MAX_FILE_SIZE are split into stream-copied parts; this many parts upload at once
+    SPLIT_UPLOAD_PARALLEL = int(os.environ.get('SPLIT_UPLOAD_PARALLEL', 2))
+
+    # Preemption: a queued job predicted to take at most PREEMPT_SHORT_SECONDS (0 = off) pauses a running
+    # job with more than PREEMPT_MIN_REMAINING seconds left, which resumes once the short job is done
+    PREEMPT_SHORT_SECONDS = float(os.environ.get('PREEMPT_SHORT_SECONDS', 300))
+    PREEMPT_MIN_REMAINING = float(os.environ.get('PREEMPT_MIN_REMAINING', 1200))
+    # ...and stops pausing it for short jobs once it was held back this many seconds in total (/urgent still can)
+    PREEMPT_MAX_PAUSE = float(os.environ.get('PREEMPT_MAX_PAUSE', 900))
+
+    # Scratch tier: short soft-mux outputs and job segment/sample folders go to this RAM-backed dir
+    # ('' = off) while they fit in SCRATCH_BUDGET bytes; inputs and files over SCRATCH_MAX_FILE stay on disk
+    SCRATCH_DIR = os.environ.get('SCRATCH_DIR', '/dev/shm/muxbot' if os.path.isdir('/dev/shm') else '')
+    SCRATCH_BUDGET = int(os.environ.get('SCRATCH_BUDGET', 512 * 1024 * 1024))
+    SCRATCH_MAX_FILE = int(os.environ.get('SCRATCH_MAX_FILE', 64 * 1024 * 1024))
+
+    # Local HTTP job API (off while API_TOKEN is empty): bearer token, bind address and the directories
+    # local input paths may come from (comma separated; none = URL inputs only)
+    API_TOKEN = os.environ.get('API_TOKEN', '')
+    API_HOST = os.environ.get('API_HOST', '127.0.0.1')
+    API_PORT = int(os.environ.get('API_PORT', 8765))
+    API_PATHS = [x.strip() for x in os.environ.get('API_PATHS', '').split(',') if x.strip()]
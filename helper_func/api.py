@@ -0,0 +1,316 @@
+# helper_func/api.py
+"""
+Local HTTP API for automated pipelines, served on the bot's event loop
+(off while API_TOKEN is empty). Jobs go into the same queue as the
+Telegram commands and their results are uploaded to `chat_id` like any
+other job. Every request needs `Authorization: Bearer <API_TOKEN>`.
+
+  POST   /jobs                  submit, returns 202 {"job_id", "state"}
+  GET    /jobs                  queued and running jobs
+  GET    /jobs/<id>             state, queue position, latest status and progress
+  GET    /jobs/<id>/events      newline-delimited JSON events until the job ends (?after=<seq>)
+  DELETE /jobs/<id>             cancel
+
+A submission is JSON:
+
+  {"mode": "soft", "chat_id": 1423807625,
+   "video": "/srv/in/ep01.mkv" | "https://…", "subtitle": "/srv/in/ep01.ass",
+   "name": "Ep 01.mkv", "settings": {"crf": "24", "preset": "slow"},
+   "trim": {"start": "1:30", "end": "4:05", "exact": false}}
+
+`subtitle` is needed for soft/hard, `trim` for trim, `name` (the file name
+the result is sent under) must end in .mkv or .mp4. Local paths must lie
+under one of API_PATHS; they are linked into DOWNLOAD_DIR, never modified.
+`settings` are applied over the user's /settings for this job only.
+"""
+
+import os, json, hmac, time, uuid, shutil, asyncio, logging
+from aiohttp import web
+from config import Config
+from pyrogram.enums import ParseMode
+from helper_func import jobevents, keyframes, storage
+from helper_func.queue import Job, job_queue, StatusMessage
+from helper_func.dbhelper import Database as Db
+from helper_func.batch import VIDEO_EXTS
+from helper_func.preflight import preflight, SubtitleError
+from helper_func.settings_manager import SettingsManager
+from plugins.save_file import _download_http_with_progress
+from plugins.muxer import cancel_jobs, _quota_exceeded, _misfit_subtitle, _parse_ts
+
+logger = logging.getLogger(__name__)
+
+db = Db()
+
+MODES = ('soft', 'hard', 'nosub', 'remux', 'trim')
+
+# job_id -> task staging the inputs of a job that is not queued yet
+_preparing: dict[str, asyncio.Task] = {}
+
+
+class BadRequest(ValueError):
+    """The submission cannot be accepted; the message says why."""
+
+
+def _error(status: int, message: str):
+    return web.json_response({'error': message}, status=status)
+
+@web.middleware
+async def _auth(request, handler):
+    given = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(given.encode(), f"Bearer {Config.API_TOKEN}".encode()):
+        return _error(401, 'missing or wrong bearer token')
+    return await handler(request)
+
+
+# ---------- submissions ----------
+
+def _is_url(src: str) -> bool:
+    return src.startswith(('http://', 'https://'))
+
+def _local(path: str) -> str:
+    """Resolve a local input and check it lies under API_PATHS."""
+    real  = os.path.realpath(path)
+    roots = [os.path.realpath(r) for r in Config.API_PATHS]
+    if not any(real == r or real.startswith(r + os.sep) for r in roots):
+        raise BadRequest(f"{path} is not under API_PATHS")
+    if not os.path.isfile(real):
+        raise BadRequest(f"{path} is not a file")
+    return real
+
+def _validate(body) -> dict:
+    """Check a submission and fill in defaults. Raises BadRequest."""
+    if not isinstance(body, dict):
+        raise BadRequest('the body must be a JSON object')
+    mode = body.get('mode')
+    if mode not in MODES:
+        raise BadRequest(f"mode must be one of {', '.join(MODES)}")
+    try:
+        chat_id = int(body.get('chat_id'))
+    except (TypeError, ValueError):
+        raise BadRequest('chat_id (the Telegram user receiving the result) is required')
+    if str(chat_id) not in Config.ALLOWED_USERS:
+        raise BadRequest(f"chat_id {chat_id} is not in ALLOWED_USERS")
+
+    sources = {'video': body.get('video')}
+    if mode in ('soft', 'hard'):
+        sources['subtitle'] = body.get('subtitle')
+    for key, src in sources.items():
+        if not isinstance(src, str) or not src:
+            raise BadRequest(f"{key} (a local path or URL) is required for mode {mode}")
+        if not _is_url(src):
+            sources[key] = _local(src)
+
+    settings = body.get('settings') or {}
+    if not isinstance(settings, dict) or any(isinstance(v, (dict, list)) for v in settings.values()):
+        raise BadRequest('settings must be an object of plain values')
+
+    trim = ()
+    if mode == 'trim':
+        spec = body.get('trim') or {}
+        try:
+            trim = (_parse_ts(str(spec['start'])), _parse_ts(str(spec['end'])), bool(spec.get('exact')))
+        except (KeyError, TypeError, ValueError):
+            raise BadRequest('trim needs {"start": …, "end": …} as seconds or [hh:]mm:ss')
+        if trim[1] <= trim[0]:
+            raise BadRequest('the trim end has to come after the start')
+
+    # only the display name of the result: on disk it always goes under the job id
+    if body.get('name'):
+        name = os.path.basename(str(body['name']))
+        if os.path.splitext(name)[1].lower().lstrip('.') not in VIDEO_EXTS:
+            raise BadRequest(f"name must end in {' or '.join('.' + e for e in VIDEO_EXTS)}")
+    else:
+        stem, ext = os.path.splitext(os.path.basename(sources['video'].split('?')[0]))
+        name = (stem or 'output') + (ext if ext.lower().lstrip('.') in VIDEO_EXTS else '.mkv')
+    return {
+        'mode': mode, 'chat_id': chat_id, 'video': sources['video'], 'subtitle': sources.get('subtitle'),
+        'name': name, 'trim': trim,
+        # stored values are strings, like the ones /settings writes
+        'cfg': {**SettingsManager.get(chat_id), **{k: str(v) for k, v in settings.items() if v is not None}},
+    }
+
+
+async def _fetch(src: str, name: str, status, job_id: str, copy: bool = False) -> str:
+    """Bring one input into DOWNLOAD_DIR as `name` (URLs keep their own unique name). Returns the file name."""
+    if _is_url(src):
+        return await _download_http_with_progress(src, Config.DOWNLOAD_DIR, status, time.time(), job_id)
+    dst = os.path.join(Config.DOWNLOAD_DIR, name)
+    if copy:
+        await asyncio.to_thread(shutil.copyfile, src, dst)
+    else:
+        try:
+            os.symlink(src, dst)
+        except OSError:
+            await asyncio.to_thread(shutil.copyfile, src, dst)
+    return name
+
+async def _prepare(client, job_id: str, req: dict, status):
+    """Stage the inputs, check the subtitle and queue the job."""
+    staged = []
+    try:
+        ext = os.path.splitext(req['video'].split('?')[0])[1]
+        vid = await _fetch(req['video'], f"{job_id}_video{ext}", status, job_id)
+        staged.append(vid)
+        keyframes.warm(os.path.join(Config.DOWNLOAD_DIR, vid))
+        sub = None
+        if req['subtitle']:
+            # pre-flight rewrites the file, so local subtitles are copied
+            ext = os.path.splitext(req['subtitle'].split('?')[0])[1].lower()
+            sub = await _fetch(req['subtitle'], f"{job_id}{ext}", status, job_id, copy=True)
+            staged.append(sub)
+            to_ass = req['cfg'].get('srt_to_ass', 'off') == 'on'
+            try:
+                info = await asyncio.to_thread(preflight, os.path.join(Config.DOWNLOAD_DIR, sub), to_ass)
+            except SubtitleError as e:
+                raise BadRequest(f"subtitle rejected: {e}")
+            sub = os.path.basename(info['path'])
+            staged.append(sub)
+            refusal = await _misfit_subtitle(vid, [sub])
+            if refusal:
+                raise BadRequest(refusal.splitlines()[0].lstrip('❌ '))
+
+        try:
+            await status.edit(f"🧾 Job <code>{job_id}</code> enqueued at position {job_queue.qsize() + 1} (API)",
+                              parse_mode=ParseMode.HTML)
+        except Exception:
+            pass
+        await job_queue.put(Job(job_id, req['mode'], req['chat_id'], vid, sub, req['name'], status.id,
+                                trim=req['trim'], cfg=req['cfg']))
+        staged.clear()
+    except asyncio.CancelledError:
+        jobevents.publish(job_id, 'state', state='cancelled')
+        try:
+            await status.edit(f"❌ Job <code>{job_id}</code> cancelled before start.", parse_mode=ParseMode.HTML)
+        except Exception:
+            pass
+    except Exception as e:
+        logger.warning("API job %s could not be queued: %s", job_id, e)
+        jobevents.publish(job_id, 'state', state='failed', error=str(e))
+        try:
+            await status.edit(f"❌ Job <code>{job_id}</code> could not be queued.\n<code>{e}</code>",
+                              parse_mode=ParseMode.HTML)
+        except Exception:
+            pass
+    finally:
+        _preparing.pop(job_id, None)
+        for fn in set(staged):
+            try:
+                await asyncio.to_thread(storage.remove, os.path.join(Config.DOWNLOAD_DIR, fn))
+            except OSError:
+                pass
+
+
+async def submit(request):
+    try:
+        req = _validate(await request.json())
+    except json.JSONDecodeError:
+        return _error(400, 'the body must be JSON')
+    except BadRequest as e:
+        return _error(400, str(e))
+    refusal = await _quota_exceeded(req['chat_id'])
+    if refusal:
+        return _error(429, refusal)
+
+    client = request.app['client']
+    job_id = uuid.uuid4().hex[:8]
+    try:
+        msg = await client.send_message(req['chat_id'], f"📥 API job <code>{job_id}</code> ({req['mode']}): "
+                                        "fetching the inputs…", parse_mode=ParseMode.HTML)
+    except Exception as e:
+        # e.g. the user never started the bot or blocked it
+        logger.warning("API job %s: cannot message chat %s: %s", job_id, req['chat_id'], e)
+        return _error(502, f"cannot send messages to chat {req['chat_id']}: {e}")
+    jobevents.watch(job_id)
+    status = StatusMessage(client, req['chat_id'], msg.id, job_id)
+    jobevents.publish(job_id, 'state', state='preparing')
+    _preparing[job_id] = asyncio.create_task(_prepare(client, job_id, req, status))
+    logger.info("API job submitted", extra={'job_id': job_id, 'mode': req['mode'], 'user_id': req['chat_id']})
+    return web.json_response({'job_id': job_id, 'state': 'preparing'}, status=202)
+
+
+# ---------- status ----------
+
+def _summary(job: Job) -> dict:
+    return {
+        'job_id': job.job_id, 'mode': job.mode, 'chat_id': job.chat_id, 'name': job.final_name,
+        'state': 'running' if job.job_id in job_queue.running else 'queued',
+        'position': job_queue.position(job.job_id),
+    }
+
+async def list_jobs(request):
+    running = [_summary(j) for j in job_queue.running.values()]
+    queued  = [_summary(job_queue.get_job(i)) for i in job_queue.live_order()]
+    return web.json_response({'running': running, 'queued': queued, 'preparing': sorted(_preparing)})
+
+async def get_job(request):
+    job_id = request.match_info['job_id']
+    feed   = jobevents.get(job_id)
+    job    = job_queue.get_job(job_id)
+    if job:
+        out = _summary(job)
+    elif feed:
+        out = {'job_id': job_id, 'state': feed.state, 'position': 0}
+    else:
+        row = await db.run(db.journal_state, job_id)
+        if not row:
+            return _error(404, f"no job {job_id}")
+        out = {'job_id': job_id, 'state': row[0], 'mode': row[1], 'chat_id': row[2], 'position': 0,
+               'updated_at': row[3]}
+    if feed:
+        for kind in ('status', 'progress'):
+            if kind in feed.last:
+                out[kind] = feed.last[kind]
+        if 'error' in feed.last.get('state', {}):
+            out['error'] = feed.last['state']['error']
+    return web.json_response(out)
+
+async def job_events(request):
+    job_id = request.match_info['job_id']
+    if jobevents.get(job_id) is None:
+        if not job_queue.get_job(job_id):
+            return _error(404, f"no live job {job_id}")
+        jobevents.watch(job_id)   # a Telegram job: follow it from now on
+    try:
+        after = int(request.query.get('after', 0))
+    except ValueError:
+        return _error(400, 'after must be an event number')
+
+    resp = web.StreamResponse(headers={'Content-Type': 'application/x-ndjson', 'Cache-Control': 'no-cache'})
+    await resp.prepare(request)
+    try:
+        async for ev in jobevents.follow(job_id, after):
+            await resp.write((json.dumps(ev) + '\n').encode())
+    except ConnectionResetError:
+        pass
+    return resp
+
+async def cancel(request):
+    job_id = request.match_info['job_id']
+    task   = _preparing.get(job_id)
+    if task:
+        task.cancel()
+        return web.json_response({'job_id': job_id, 'state': 'cancelled'})
+    removed, killed = await cancel_jobs(request.app['client'], {job_id})
+    if not (removed or killed):
+        return _error(404, f"no queued or running job {job_id}")
+    return web.json_response({'job_id': job_id, 'state': 'cancelled'})
+
+
+async def start(client):
+    """Serve the API on API_HOST:API_PORT if API_TOKEN is set. Returns the runner (or None)."""
+    if not Config.API_TOKEN:
+        return None
+    app = web.Application(middlewares=[_auth])
+    app['client'] = client
+    app.add_routes([
+        web.post('/jobs', submit),
+        web.get('/jobs', list_jobs),
+        web.get('/jobs/{job_id}', get_job),
+        web.get('/jobs/{job_id}/events', job_events),
+        web.delete('/jobs/{job_id}', cancel),
+    ])
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, Config.API_HOST, Config.API_PORT).start()
+    logger.info("Job API listening on %s:%d", Config.API_HOST, Config.API_PORT)
+    return runner
@@ -0,0 +1,84 @@
+# helper_func/auto_mode.py
+
+import os, json, asyncio
+from config import Config
+
+# what an MP4 can carry without re-encoding
+MP4_VIDEO = {'h264', 'hevc', 'av1'}
+MP4_AUDIO = {'aac', 'mp3', 'ac3', 'eac3', 'opus', 'alac', 'flac'}
+
+MODE_NAMES = {
+    'soft':  'soft-mux (stream copy + subtitle track)',
+    'remux': 'remux (container change only)',
+    'hard':  'hard-mux (full encode, subtitles burned in)',
+    'nosub': 'encode (full re-encode)',
+}
+
+
+async def probe_streams(path: str) -> dict:
+    """{'container', 'video', 'audio', 'width', 'height', 'duration'} of a file ({} if unreadable)."""
+    proc = await asyncio.create_subprocess_exec(
+        'ffprobe', '-v', 'error', '-of', 'json',
+        '-show_entries', 'format=format_name,duration:stream=codec_type,codec_name,width,height',
+        '-i', path,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    out, _ = await proc.communicate()
+    try:
+        data = json.loads(out or b'{}')
+    except ValueError:
+        return {}
+    info = {
+        'container': data.get('format', {}).get('format_name', ''),
+        'duration':  float(data.get('format', {}).get('duration', 0) or 0),
+    }
+    for s in data.get('streams', []):
+        kind = s.get('codec_type')
+        if kind in ('video', 'audio') and kind not in info:
+            info[kind] = s.get('codec_name')
+            if kind == 'video':
+                info['width'], info['height'] = s.get('width', 0), s.get('height', 0)
+    return info
+
+
+def mp4_compatible(info: dict) -> bool:
+    return info.get('video') in MP4_VIDEO and info.get('audio') in MP4_AUDIO | {None}
+
+
+def needs_encode(info: dict, cfg: dict, size: int, target: int) -> list:
+    """
+    Reasons the video itself has to be re-encoded ([] = stream copy is enough).
+    The resolution setting is not one: it only says what encodes scale to,
+    and a copy keeps the source size, which is never worse than scaling it.
+    """
+    reasons = []
+    if cfg.get('fps', 'original') != 'original':
+        reasons.append(f"your settings change the frame rate to {cfg['fps']} fps")
+    if size > Config.TG_MAX_FILE_SIZE:
+        reasons.append("it is larger than Telegram's upload limit")
+    elif target and size > target:
+        reasons.append("it is larger than your target size")
+    return reasons
+
+
+def decide(info: dict, cfg: dict, sub: str, size: int, target: int) -> tuple:
+    """
+    (mode, reasons, alternative) for a video with an optional subtitle.
+    Copy beats encode whenever the settings and size limits allow it.
+    """
+    encode = needs_encode(info, cfg, size, target)
+    if sub:
+        if encode:
+            return 'hard', encode + ["so the subtitles are burned in during that encode"], 'soft'
+        why = ["the video can be stream-copied", f"MKV carries {os.path.splitext(sub)[1].lstrip('.').upper()} subtitles as a track"]
+        return 'soft', why, 'hard'
+    if encode:
+        return 'nosub', encode, 'remux'
+    why = ["the video already fits your settings, nothing needs re-encoding"]
+    if not info:
+        why.append("the streams are only copied (the container is picked once it is downloaded)")
+    elif mp4_compatible(info):
+        why.append(f"{info.get('video')}/{info.get('audio') or 'no audio'} streams go into a streamable MP4")
+    else:
+        why.append("its codecs need MKV, the streams are only copied")
+    return 'remux', why, 'nosub'
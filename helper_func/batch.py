@@ -0,0 +1,125 @@
+# helper_func/batch.py
+
+import os, re, zipfile
+from pyrogram.enums import ParseMode
+from config import Config
+
+VIDEO_EXTS = ('mp4', 'mkv')
+SUB_EXTS   = ('srt', 'ass')
+
+# most specific first: S01E05 / 1x05 / E05 / EP 05 / "- 05" / [05]
+episode_patterns = [
+    re.compile(r'[Ss]\d{1,2}\s*[Ee](\d{1,4})'),
+    re.compile(r'\b\d{1,2}x(\d{1,4})\b'),
+    re.compile(r'(?:^|[\s._\-\[])(?:[Ee][Pp]?|[Ee]pisode)\s*\.?\s*(\d{1,4})(?!\d)'),
+    re.compile(r'\s-\s(\d{1,4})(?!\d)'),
+    re.compile(r'\[(\d{1,4})\]'),
+]
+# numbers that are never episode numbers
+noise_pattern = re.compile(
+    r'\b(?:\d{3,4}p|\d+k|[xh]\.?26[45]|10bit|8bit|\d{4}x\d{3,4}|(?:19|20)\d{2})\b|\d\.\d|\[[0-9A-Fa-f]{8}\]',
+    re.IGNORECASE
+)
+number_pattern = re.compile(r'(?<!\d)(\d{1,4})(?!\d)')
+lang_suffix_pattern = re.compile(r'\.[A-Za-z]{2,3}$')
+
+# batch_id -> {'chat_id', 'msg', 'jobs', 'done', 'failed', 'cancelled'}
+batches: dict[str, dict] = {}
+
+
+def episode_number(name: str):
+    """Best-effort episode number from a release filename, or None."""
+    stem = lang_suffix_pattern.sub('', os.path.splitext(os.path.basename(name))[0])
+    for pat in episode_patterns:
+        m = pat.search(stem)
+        if m:
+            return int(m.group(1))
+    nums = number_pattern.findall(noise_pattern.sub(' ', stem))
+    return int(nums[-1]) if nums else None
+
+
+def _norm(name: str) -> str:
+    stem = os.path.splitext(os.path.basename(name))[0].lower()
+    # drop language suffixes like ".en" / ".eng" from subtitle names
+    stem = lang_suffix_pattern.sub('', stem)
+    return re.sub(r'[^a-z0-9]+', '', stem)
+
+
+def pair_files(videos: list, subs: list) -> tuple:
+    """
+    Pair (stored_name, original_name) videos with subtitles, first by identical
+    normalised filename, then by episode number. Returns (pairs, unmatched_subs)
+    where pairs = [(video, sub_or_None)] sorted by episode.
+    """
+    subs_left = list(subs)
+    pairs = []
+    for vid in videos:
+        match = next((s for s in subs_left if _norm(s[1]) == _norm(vid[1])), None)
+        if match is None:
+            ep = episode_number(vid[1])
+            if ep is not None:
+                match = next((s for s in subs_left if episode_number(s[1]) == ep), None)
+        if match is not None:
+            subs_left.remove(match)
+        pairs.append((vid, match))
+
+    def _key(p):
+        ep = episode_number(p[0][1])
+        return (ep is None, ep or 0, p[0][1])
+    return sorted(pairs, key=_key), subs_left
+
+
+def extract_archive(path: str, stamp: str) -> list:
+    """Unpack the video/subtitle members of a .zip into DOWNLOAD_DIR -> [(stored_name, original_name)]."""
+    out = []
+    with zipfile.ZipFile(path) as zf:
+        for i, info in enumerate(zf.infolist()):
+            if info.is_dir():
+                continue
+            og  = os.path.basename(info.filename)
+            ext = og.rsplit('.', 1)[-1].lower()
+            if ext not in VIDEO_EXTS + SUB_EXTS:
+                continue
+            stored = f"{stamp}_{i}.{ext}"
+            with zf.open(info) as src, open(os.path.join(Config.DOWNLOAD_DIR, stored), 'wb') as dst:
+                while True:
+                    chunk = src.read(1024 * 1024)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+            out.append((stored, og))
+    return out
+
+
+async def report(batch_id: str):
+    """Refresh the aggregate batch card."""
+    b = batches.get(batch_id)
+    if not b:
+        return
+    total    = len(b['jobs'])
+    finished = b['done'] + b['failed'] + b['cancelled']
+    pct      = finished * 100 / total if total else 100
+    filled   = int(pct // 5)
+    text = (
+        f"📦 <b>Batch</b> <code>{batch_id}</code>\n\n"
+        "[" + "◼️" * filled + "◻️" * (20 - filled) + "]\n\n"
+        f"✅ Done: {b['done']}  ❌ Failed: {b['failed']}  🛑 Cancelled: {b['cancelled']}\n"
+        f"📈 {finished}/{total} episodes\n\n"
+    )
+    if finished < total:
+        text += f"Send <code>/cancel {batch_id}</code> to cancel the whole batch."
+    try:
+        await b['msg'].edit(text, parse_mode=ParseMode.HTML)
+    except:
+        pass
+    if finished >= total:
+        batches.pop(batch_id, None)
+
+
+async def job_finished(batch_id: str, outcome: str):
+    """outcome: 'done' | 'failed' | 'cancelled'"""
+    b = batches.get(batch_id)
+    if not b:
+        return
+    b[outcome] += 1
+    await report(batch_id)
@@ -0,0 +1,175 @@
+# helper_func/crf_search.py
+
+import os, re, time, shutil, signal, asyncio
+from config import Config
+from pyrogram.enums import ParseMode
+from helper_func.resources import new_usage, track
+from helper_func import encoders, keyframes, storage
+from helper_func.preempt import PauseState, signal_procs
+
+# CRF grid tried per codec (higher CRF = smaller file)
+CRF_CANDIDATES = {
+    'libx264':    [18, 20, 22, 24, 26, 28, 30],
+    'libx265':    [20, 22, 24, 26, 28, 30, 32],
+    'libvpx-vp9': [24, 28, 32, 36, 40, 44],
+    'libaom-av1': [24, 28, 32, 36, 40, 44],
+    'libsvtav1':  [24, 28, 32, 36, 40, 44],
+}
+
+ssim_pattern = re.compile(r'All:\s*([\d.]+)')
+vmaf_pattern = re.compile(r'VMAF score[:=]\s*([\d.]+)')
+
+
+class _ProcGroup(list):
+    """Lets /cancel kill every sample encode at once (running_jobs expects .kill())."""
+    def __init__(self, usage: dict = None, pause: PauseState = None):
+        super().__init__()
+        self.usage = usage if usage is not None else new_usage()
+        self.pause = pause if pause is not None else PauseState()
+
+    def kill(self):
+        for p in self:
+            if p.returncode is None:
+                try:
+                    p.kill()
+                except ProcessLookupError:
+                    pass
+
+
+async def _run(procs: _ProcGroup, *cmd) -> tuple:
+    await procs.pause.resumed.wait()
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    procs.append(proc)
+    if procs.pause.paused:
+        signal_procs(proc, signal.SIGSTOP)
+    sampler = asyncio.create_task(track(proc.pid, procs.usage))
+    t0, paused0 = time.time(), procs.pause.seconds()
+    comm = asyncio.ensure_future(proc.communicate())
+    while not comm.done():
+        await asyncio.wait([comm], timeout=5)
+        # samples are a few seconds long, a run this slow (not counting pauses) is stuck
+        if not comm.done() and time.time() - t0 - (procs.pause.seconds() - paused0) > Config.FFMPEG_DEADLINE_MIN:
+            proc.kill()
+            break
+    out, err = await comm
+    sampler.cancel()
+    await asyncio.gather(sampler, return_exceptions=True)
+    return proc.returncode, err.decode(errors='ignore')
+
+
+async def has_libvmaf() -> bool:
+    """Whether the installed ffmpeg was built with libvmaf (from the startup capability probe)."""
+    caps = await asyncio.to_thread(encoders.probe)
+    return 'libvmaf' in caps['filters']
+
+
+def sample_points(total_dur: float, count: int, length: float) -> list:
+    """Start times of `count` samples spread evenly over the runtime (skipping the very ends)."""
+    if total_dur <= length:
+        return [0.0]
+    count = max(1, min(count, int(total_dur // length)))
+    step  = total_dur / (count + 1)
+    return [round(step * (i + 1) - length / 2, 3) for i in range(count)]
+
+
+def pick_crf(scores: dict, target: float):
+    """
+    scores = {crf: (mean_quality, mean_bytes)}. Return the highest CRF (lowest
+    bitrate) that still meets `target`, or the best-quality CRF if none does.
+    """
+    passing = [crf for crf, (q, _) in scores.items() if q >= target]
+    if passing:
+        return max(passing)
+    return min(scores) if scores else None
+
+
+async def search_crf(vid_path: str, vf: list, codec: str, preset: str, total_dur: float,
+                     msg, job_id: str, procs: _ProcGroup):
+    """
+    Encode a few short samples at every candidate CRF in parallel, score them
+    against a lossless reference (VMAF if available, else SSIM) and return
+    (crf, quality, metric).
+    """
+    crfs   = CRF_CANDIDATES.get(codec, CRF_CANDIDATES['libx264'])
+    length = Config.AUTO_CRF_SAMPLE_SECONDS
+    points = sample_points(total_dur, Config.AUTO_CRF_SAMPLES, length)
+    kfs    = keyframes.cached(vid_path)
+    if kfs:
+        # start samples on keyframes so seeking to them decodes nothing extra
+        points = sorted({keyframes.before(kfs, t) for t in points})
+    use_vmaf = await has_libvmaf()
+    metric   = 'VMAF' if use_vmaf else 'SSIM'
+    target   = Config.AUTO_CRF_TARGET_VMAF if use_vmaf else Config.AUTO_CRF_TARGET_SSIM
+
+    # lossless references run ~30x a typical source bitrate; the trial encodes are small next to them
+    rate    = os.path.getsize(vid_path) / total_dur if total_dur > 0 else 0
+    workdir = await asyncio.to_thread(storage.workdir, f"{job_id}_crf", int(rate * length * 30 * len(points)))
+    sem   = asyncio.Semaphore(Config.AUTO_CRF_PARALLEL)
+    vf_args = ['-vf', ",".join(vf)] if vf else []
+    done, total = 0, len(points) * len(crfs)
+    last_edit = 0.0
+
+    async def _reference(i, t):
+        ref = os.path.join(workdir, f"ref{i}.mkv")
+        async with sem:
+            rc, _ = await _run(
+                procs, 'ffmpeg', '-hide_banner', '-v', 'error',
+                '-ss', str(t), '-i', vid_path, '-t', str(length), *vf_args,
+                '-map', '0:v:0', '-an', '-c:v', 'ffv1', '-y', ref
+            )
+        return ref if rc == 0 else None
+
+    async def _trial(i, ref, crf):
+        nonlocal done, last_edit
+        enc = os.path.join(workdir, f"s{i}_crf{crf}.mkv")
+        async with sem:
+            rc, _ = await _run(
+                procs, 'ffmpeg', '-hide_banner', '-v', 'error', '-i', ref,
+                '-c:v', codec, *encoders.preset_args(codec, preset), '-crf', str(crf), '-an', '-y', enc
+            )
+            if rc != 0:
+                return None
+            lavfi = '[0:v][1:v]libvmaf' if use_vmaf else '[0:v][1:v]ssim'
+            rc, err = await _run(
+                procs, 'ffmpeg', '-hide_banner', '-i', enc, '-i', ref,
+                '-lavfi', lavfi, '-f', 'null', '-'
+            )
+        m = (vmaf_pattern if use_vmaf else ssim_pattern).search(err)
+        done += 1
+        now = time.time()
+        if now - last_edit >= 5:
+            last_edit = now
+            try:
+                await msg.edit(
+                    f"🔎 <b>Auto-CRF</b> [<code>{job_id}</code>]\n\n"
+                    f"Scoring samples with {metric}: {done}/{total}",
+                    parse_mode=ParseMode.HTML
+                )
+            except:
+                pass
+        if rc != 0 or not m:
+            return None
+        return crf, float(m.group(1)), os.path.getsize(enc)
+
+    try:
+        refs = await asyncio.gather(*(_reference(i, t) for i, t in enumerate(points)))
+        trials = [_trial(i, ref, crf) for i, ref in enumerate(refs) if ref for crf in crfs]
+        results = [r for r in await asyncio.gather(*trials) if r]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    per_crf = {}
+    for crf, q, size in results:
+        per_crf.setdefault(crf, []).append((q, size))
+    # only trust CRFs that were scored on every usable sample
+    n = max((len(v) for v in per_crf.values()), default=0)
+    scores = {
+        crf: (sum(q for q, _ in v) / len(v), sum(s for _, s in v) / len(v))
+        for crf, v in per_crf.items() if len(v) == n
+    }
+    crf = pick_crf(scores, target)
+    if crf is None:
+        return None, 0.0, metric
+    return crf, scores[crf][0], metric
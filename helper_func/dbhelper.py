@@ -1,11 +1,22 @@
+import json
 import sqlite3
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 
 class Database:
 
+    # one thread owns every sqlite call, so handlers never block the event loop on disk
+    _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+
     def __init__(self):
 
         self.conn = sqlite3.connect('muxdb.sqlite', check_same_thread = False)
 
+    async def run(self, method, *args):
+        """await db.run(db.put_video, ...) – run a Database method off the event loop."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, method, *args)
+
     def setup(self):
 
         cmd = """CREATE TABLE IF NOT EXISTS muxbot(
@@ -16,6 +27,82 @@ class Database:
         );"""
 
         self.conn.execute(cmd)
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS batch_items(
+        user_id INT,
+        kind TEXT,
+        file_name TEXT,
+        og_name TEXT
+        );""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS batch_open(
+        user_id INT PRIMARY KEY
+        );""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS sub_tracks(
+        user_id INT,
+        sub_name TEXT,
+        lang TEXT,
+        title TEXT
+        );""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS pending_ingest(
+        file_name TEXT PRIMARY KEY,
+        user_id INT,
+        file_id TEXT,
+        size INT
+        );""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS job_journal(
+        job_id TEXT PRIMARY KEY,
+        state TEXT,
+        mode TEXT,
+        user_id INT,
+        vid_name TEXT,
+        sub_name TEXT,
+        filename TEXT,
+        status_msg_id INT,
+        batch_id TEXT,
+        subs TEXT,
+        seq REAL,
+        updated_at REAL,
+        trim TEXT,
+        cfg TEXT
+        );""")
+        # journals written before /trim and the HTTP API existed lack these columns
+        columns = [row[1] for row in self.conn.execute('PRAGMA table_info(job_journal);')]
+        for column in ('trim', 'cfg'):
+            if column not in columns:
+                self.conn.execute(f'ALTER TABLE job_journal ADD COLUMN {column} TEXT;')
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS job_retries(
+        job_id TEXT,
+        user_id INT,
+        attempt INT,
+        reason TEXT,
+        fallback TEXT,
+        ts REAL
+        );""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS job_trace(
+        job_id TEXT,
+        user_id INT,
+        mode TEXT,
+        size INT,
+        queued_at REAL,
+        download_s REAL,
+        wait_s REAL,
+        fetch_s REAL,
+        encode_s REAL,
+        upload_s REAL,
+        outcome TEXT,
+        finished_at REAL
+        );""")
+        self.conn.execute("""CREATE TABLE IF NOT EXISTS job_usage(
+        job_id TEXT,
+        user_id INT,
+        mode TEXT,
+        cpu_user REAL,
+        cpu_sys REAL,
+        peak_rss INT,
+        read_bytes INT,
+        write_bytes INT,
+        wall REAL,
+        finished_at REAL
+        );""")
         self.conn.commit()
 
     def put_video(self, user_id, vid_name, filename):
@@ -109,7 +196,166 @@ class Database:
 
         try :
             self.conn.execute(erase_cmd)
+            self.conn.execute('DELETE FROM sub_tracks WHERE user_id=?;', (user_id,))
             self.conn.commit()
             return True
         except :
             return False
+
+    # ---------- subtitle tracks (soft-mux takes all of them) ----------
+
+    def add_sub_track(self, user_id, sub_name, lang, title) :
+
+        """Add a track, replacing one with the same language and title; returns the replaced file name or None."""
+        cmd = 'SELECT rowid, sub_name FROM sub_tracks WHERE user_id=? AND lang=? AND title=?;'
+        old = self.conn.execute(cmd, (user_id, lang, title)).fetchone()
+        if old:
+            self.conn.execute('UPDATE sub_tracks SET sub_name=? WHERE rowid=?;', (sub_name, old[0]))
+        else:
+            self.conn.execute('INSERT INTO sub_tracks VALUES (?,?,?,?);', (user_id, sub_name, lang, title))
+        self.conn.commit()
+        return old[1] if old else None
+
+    def get_sub_tracks(self, user_id) :
+
+        cmd = 'SELECT sub_name, lang, title FROM sub_tracks WHERE user_id=? ORDER BY rowid;'
+        return [tuple(r) for r in self.conn.execute(cmd, (user_id,)).fetchall()]
+
+    # ---------- lazy ingest (Telegram file refs not downloaded yet) ----------
+
+    def add_pending_ingest(self, file_name, user_id, file_id, size) :
+
+        self.conn.execute('INSERT OR REPLACE INTO pending_ingest VALUES (?,?,?,?);', (file_name, user_id, file_id, size))
+        self.conn.commit()
+
+    def get_pending_ingest(self, file_name) :
+
+        """(user_id, file_id, size) or None"""
+        cmd = 'SELECT user_id, file_id, size FROM pending_ingest WHERE file_name=?;'
+        res = self.conn.execute(cmd, (file_name,)).fetchone()
+        return tuple(res) if res else None
+
+    def remove_pending_ingest(self, file_name) :
+
+        self.conn.execute('DELETE FROM pending_ingest WHERE file_name=?;', (file_name,))
+        self.conn.commit()
+
+    # ---------- job journal (survives restarts) ----------
+
+    def journal_job(self, job, state, ts) :
+
+        """Record a state transition ('queued', 'running', 'done', 'failed', 'cancelled')."""
+        cmd = ('INSERT INTO job_journal VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?) '
+               'ON CONFLICT(job_id) DO UPDATE SET state=excluded.state, updated_at=excluded.updated_at;')
+        data = (job.job_id, state, job.mode, job.chat_id, job.vid, job.sub, job.final_name,
+                job.status_msg_id, job.batch_id, json.dumps(job.subs), ts, ts, json.dumps(job.trim),
+                json.dumps(job.cfg) if job.cfg is not None else None)
+        self.conn.execute(cmd, data)
+        self.conn.commit()
+
+    def journal_reorder(self, job_ids) :
+
+        self.conn.executemany('UPDATE job_journal SET seq=? WHERE job_id=?;',
+                              [(i, job_id) for i, job_id in enumerate(job_ids)])
+        self.conn.commit()
+
+    def journal_unfinished(self) :
+
+        """Rows of jobs that were running or queued, in the order they should run again."""
+        cmd = ('SELECT job_id, state, mode, user_id, vid_name, sub_name, filename, status_msg_id, batch_id, subs, trim, cfg '
+               "FROM job_journal WHERE state IN ('running', 'queued') "
+               "ORDER BY state='queued', seq;")
+        return self.conn.execute(cmd).fetchall()
+
+    def journal_state(self, job_id) :
+
+        """(state, mode, user_id, updated_at) of a journalled job, or None."""
+        cmd = 'SELECT state, mode, user_id, updated_at FROM job_journal WHERE job_id=?;'
+        return self.conn.execute(cmd, (job_id,)).fetchone()
+
+    def journal_batch(self, batch_id) :
+
+        """(job_id, state, user_id) of every journalled job of a batch."""
+        cmd = 'SELECT job_id, state, user_id FROM job_journal WHERE batch_id=? ORDER BY rowid;'
+        return self.conn.execute(cmd, (batch_id,)).fetchall()
+
+    def journal_prune(self, before) :
+
+        cmd = "DELETE FROM job_journal WHERE state NOT IN ('running', 'queued') AND updated_at<?;"
+        self.conn.execute(cmd, (before,))
+        self.conn.commit()
+
+    # ---------- batch mode ----------
+
+    def start_batch(self, user_id) :
+
+        self.conn.execute('INSERT OR IGNORE INTO batch_open VALUES (?);', (user_id,))
+        self.conn.commit()
+
+    def in_batch(self, user_id) :
+
+        res = self.conn.execute('SELECT 1 FROM batch_open WHERE user_id=?;', (user_id,)).fetchone()
+        return bool(res)
+
+    def add_batch_item(self, user_id, kind, file_name, og_name) :
+
+        self.conn.execute('INSERT INTO batch_items VALUES (?,?,?,?);', (user_id, kind, file_name, og_name))
+        self.conn.commit()
+
+    def get_batch_items(self, user_id, kind) :
+
+        cmd = 'SELECT file_name, og_name FROM batch_items WHERE user_id=? AND kind=? ORDER BY rowid;'
+        return [tuple(r) for r in self.conn.execute(cmd, (user_id, kind)).fetchall()]
+
+    def end_batch(self, user_id) :
+
+        self.conn.execute('DELETE FROM batch_items WHERE user_id=?;', (user_id,))
+        self.conn.execute('DELETE FROM batch_open WHERE user_id=?;', (user_id,))
+        self.conn.commit()
+
+    # ---------- resource accounting ----------
+
+    def record_usage(self, job_id, user_id, mode, usage, finished_at) :
+
+        cmd = 'INSERT INTO job_usage VALUES (?,?,?,?,?,?,?,?,?,?);'
+        data = (job_id, user_id, mode, usage.get('cpu_user', 0), usage.get('cpu_sys', 0),
+                usage.get('peak_rss', 0), usage.get('read_bytes', 0), usage.get('write_bytes', 0),
+                usage.get('wall', 0), finished_at)
+        self.conn.execute(cmd, data)
+        self.conn.commit()
+
+    def record_trace(self, row) :
+
+        """One finished job's phases, replayed by helper_func/simulator.py."""
+        self.conn.execute('INSERT INTO job_trace VALUES (?,?,?,?,?,?,?,?,?,?,?,?);', row)
+        self.conn.commit()
+
+    def trace_rows(self, since=0) :
+
+        cmd = ('SELECT job_id, user_id, mode, size, queued_at, download_s, wait_s, fetch_s, encode_s, upload_s, '
+               'outcome, finished_at FROM job_trace WHERE queued_at>=? ORDER BY queued_at;')
+        return self.conn.execute(cmd, (since,)).fetchall()
+
+    def record_retries(self, job_id, user_id, retries) :
+
+        cmd = 'INSERT INTO job_retries VALUES (?,?,?,?,?,?);'
+        self.conn.executemany(cmd, [(job_id, user_id, r['attempt'], r['reason'], r['fallback'], r['ts'])
+                                    for r in retries])
+        self.conn.commit()
+
+    def cpu_used_since(self, user_id, since) :
+
+        cmd = 'SELECT COALESCE(SUM(cpu_user + cpu_sys), 0) FROM job_usage WHERE user_id=? AND finished_at>=?;'
+        return self.conn.execute(cmd, (user_id, since)).fetchone()[0]
+
+    def usage_summary(self, since, user_id=None) :
+
+        """[(user_id, mode, jobs, cpu_s, max_rss, read_bytes, write_bytes)] since a timestamp."""
+        cmd = ('SELECT user_id, mode, COUNT(*), SUM(cpu_user + cpu_sys), MAX(peak_rss), '
+               'SUM(read_bytes), SUM(write_bytes) FROM job_usage WHERE finished_at>=?')
+        args = [since]
+        if user_id is not None:
+            cmd += ' AND user_id=?'
+            args.append(user_id)
+        cmd += ' GROUP BY user_id, mode ORDER BY SUM(cpu_user + cpu_sys) DESC;'
+        return [tuple(r) for r in self.conn.execute(cmd, args).fetchall()]
@@ -0,0 +1,155 @@
+# helper_func/encoders.py
+
+import sys, time, logging, subprocess
+
+logger = logging.getLogger(__name__)
+
+# codec family (the value stored in settings) -> implementations, fastest first.
+# `python -m helper_func.encoders` re-runs the benchmark behind this order.
+FAMILIES = {
+    'libx264':    ['libx264'],
+    'libx265':    ['libx265'],
+    'libvpx-vp9': ['libvpx-vp9'],
+    'libaom-av1': ['libsvtav1', 'libaom-av1'],
+}
+
+# x264 CRF -> CRF of about the same visual quality per encoder, as enc = slope * x264 + offset
+# (x265 28, vp9 31, aom 30 and svt-av1 35 all land near x264 23)
+CRF_EQUIV = {
+    'libx264':    (1.0, 0.0),
+    'libx265':    (1.0, 5.0),
+    'libvpx-vp9': (1.4, -1.2),
+    'libaom-av1': (1.3, 0.1),
+    'libsvtav1':  (1.4, 2.8),
+}
+
+# valid CRF range of each encoder (the settings prompt is in the family's scale)
+CRF_MAX = {
+    'libx264': 51, 'libx265': 51,
+    'libvpx-vp9': 63, 'libaom-av1': 63, 'libsvtav1': 63,
+}
+CRF_MIN = {'libsvtav1': 1}
+
+def crf_range(family: str) -> tuple:
+    """(lowest, highest) CRF a user may pick for `family`."""
+    return CRF_MIN.get(family, 0), CRF_MAX.get(family, 51)
+
+# x264 preset name -> native speed knob of the other encoders
+PRESET_LEVEL = {
+    'ultrafast': 0, 'superfast': 1, 'veryfast': 2, 'faster': 3, 'fast': 4,
+    'medium': 5, 'slow': 6, 'slower': 7, 'veryslow': 8,
+}
+_SVT_PRESET  = [12, 11, 10, 9, 8, 7, 6, 5, 4]     # libsvtav1 -preset (0 slowest .. 13 fastest)
+_VPX_CPU     = [8, 7, 6, 5, 4, 3, 2, 1, 0]        # libvpx-vp9 -cpu-used
+_AOM_CPU     = [8, 8, 7, 6, 5, 4, 3, 2, 1]        # libaom-av1 -cpu-used
+
+# encoders whose ffmpeg wrapper supports -pass 1/2
+TWO_PASS = {'libx264', 'libx265', 'libvpx-vp9', 'libaom-av1'}
+
+_caps = None   # {'encoders': set, 'filters': set}, filled by probe()
+
+
+def _names(args: list) -> set:
+    """Names listed by `ffmpeg -encoders` / `ffmpeg -filters` (after the ' ------' header)."""
+    out = subprocess.run(['ffmpeg', '-hide_banner', *args],
+                         capture_output=True, text=True, timeout=30).stdout
+    names, started = set(), False
+    for line in out.splitlines():
+        if line.strip().startswith('---'):
+            started = True
+            continue
+        parts = line.split()
+        if started and len(parts) >= 2:
+            names.add(parts[1])
+    return names
+
+
+def probe(force: bool = False) -> dict:
+    """Ask ffmpeg once which encoders and filters it was built with (blocking)."""
+    global _caps
+    if _caps is None or force:
+        try:
+            _caps = {'encoders': _names(['-encoders']), 'filters': _names(['-filters'])}
+        except (OSError, subprocess.SubprocessError) as e:
+            logger.warning("Could not probe ffmpeg capabilities: %s", e)
+            _caps = {'encoders': set(), 'filters': set()}
+        picked = {fam: resolve(fam) for fam in FAMILIES}
+        logger.info("ffmpeg encoders in use: %s", picked)
+    return _caps
+
+
+def has_encoder(name: str) -> bool:
+    # before (or without) a successful probe assume everything is there
+    return not _caps or not _caps['encoders'] or name in _caps['encoders']
+
+
+def has_filter(name: str) -> bool:
+    return not _caps or not _caps['filters'] or name in _caps['filters']
+
+
+def resolve(family: str, two_pass: bool = False):
+    """Fastest installed implementation of `family` (optionally one that can do 2-pass), or None."""
+    if not _caps or not _caps['encoders']:
+        return family   # nothing probed: keep the configured encoder as is
+    for enc in FAMILIES.get(family, [family]):
+        if has_encoder(enc) and (not two_pass or enc in TWO_PASS):
+            return enc
+    return None
+
+
+def available_families() -> list:
+    return [fam for fam in FAMILIES if resolve(fam)]
+
+
+def preset_args(encoder: str, preset: str) -> list:
+    """Translate an x264-style preset name into the encoder's own speed option."""
+    level = PRESET_LEVEL.get(preset, PRESET_LEVEL['faster'])
+    if encoder == 'libsvtav1':
+        return ['-preset', str(_SVT_PRESET[level])]
+    if encoder == 'libvpx-vp9':
+        return ['-deadline', 'good', '-cpu-used', str(_VPX_CPU[level]), '-row-mt', '1']
+    if encoder == 'libaom-av1':
+        return ['-cpu-used', str(_AOM_CPU[level]), '-row-mt', '1']
+    return ['-preset', preset]
+
+
+def crf_value(family: str, encoder: str, crf) -> str:
+    """
+    Translate a CRF in `family`'s scale (or x264's, for family 'libx264')
+    into the CRF of about the same quality for `encoder`, e.g. an aom-av1
+    setting run on svt-av1, or trim edges matched to an x265 source.
+    """
+    f_slope, f_off = CRF_EQUIV.get(family, (1.0, 0.0))
+    e_slope, e_off = CRF_EQUIV.get(encoder, (f_slope, f_off))
+    value = round((float(crf) - f_off) / f_slope * e_slope + e_off)
+    return str(max(CRF_MIN.get(encoder, 0), min(CRF_MAX.get(encoder, 51), value)))
+
+
+def bench(seconds: int = 5, size: str = '1280x720') -> list:
+    """
+    Encode the same synthetic clip with every installed implementation at the
+    default 'faster' preset. Returns [(encoder, fps, bytes)], fastest first.
+    """
+    probe()
+    frames  = seconds * 30
+    results = []
+    for impls in FAMILIES.values():
+        for enc in impls:
+            if not has_encoder(enc):
+                continue
+            cmd = ['ffmpeg', '-hide_banner', '-v', 'error',
+                   '-f', 'lavfi', '-i', f'testsrc2=size={size}:rate=30:duration={seconds}',
+                   '-c:v', enc, *preset_args(enc, 'faster'), '-crf', crf_value('libx264', enc, 27),
+                   '-f', 'matroska', 'pipe:1']
+            t0  = time.time()
+            out = subprocess.run(cmd, capture_output=True)
+            took = time.time() - t0
+            if out.returncode == 0:
+                results.append((enc, frames / took, len(out.stdout)))
+    return sorted(results, key=lambda r: -r[1])
+
+
+if __name__ == '__main__':
+    # python -m helper_func.encoders [seconds]
+    for enc, fps, size in bench(int(sys.argv[1]) if len(sys.argv) > 1 else 5):
+        print(f"{enc:12s} {fps:7.1f} fps  {size / 1024:8.0f} KiB")
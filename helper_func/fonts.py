@@ -0,0 +1,204 @@
+# helper_func/fonts.py
+
+import os, re, json, shutil, struct, logging
+from config import Config
+from helper_func.subtitles import read_text
+
+logger = logging.getLogger(__name__)
+
+FONT_EXTS = ('.ttf', '.otf', '.ttc', '.otc')
+
+INDEX_PATH = os.path.join(Config.DOWNLOAD_DIR, 'font_index.json')
+
+fn_override_pattern = re.compile(r'\\fn([^\\}]+)')
+
+_index = None
+
+
+# ---------- font file parsing ----------
+
+def _name_records(data: bytes, offset: int) -> dict:
+    """Read family/style names out of one sfnt font starting at `offset`."""
+    num_tables = struct.unpack_from('>H', data, offset + 4)[0]
+    name_off = None
+    for i in range(num_tables):
+        tag, _, off, _ = struct.unpack_from('>4sIII', data, offset + 12 + i * 16)
+        if tag == b'name':
+            name_off = off
+            break
+    if name_off is None:
+        return {}
+
+    _, count, str_off = struct.unpack_from('>HHH', data, name_off)
+    names = {}
+    for i in range(count):
+        pid, eid, lid, nid, length, off = struct.unpack_from('>HHHHHH', data, name_off + 6 + i * 12)
+        if nid not in (1, 2, 4, 16, 17):
+            continue
+        raw = data[name_off + str_off + off: name_off + str_off + off + length]
+        if pid == 3 or pid == 0:
+            val = raw.decode('utf-16-be', errors='ignore')
+        elif pid == 1:
+            val = raw.decode('mac_roman', errors='ignore')
+        else:
+            continue
+        # keep every family alias for matching, remember the English one for display
+        names.setdefault(nid, set()).add(val.strip())
+        if (pid == 3 and lid == 0x409) or (pid == 1 and lid == 0):
+            names.setdefault(('en', nid), val.strip())
+    return names
+
+def read_font_names(path: str) -> list:
+    """[{'families': [...], 'style': str, 'full': str}] for each face in the file."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    offsets = [0]
+    if data[:4] == b'ttcf':
+        n = struct.unpack_from('>I', data, 8)[0]
+        offsets = list(struct.unpack_from(f'>{n}I', data, 12))
+    faces = []
+    for off in offsets:
+        names = _name_records(data, off)
+        families = sorted(names.get(1, set()) | names.get(16, set()))
+        if not families:
+            continue
+        faces.append({
+            'families': families,
+            'style': names.get(('en', 17)) or names.get(('en', 2)) or 'Regular',
+            'full': names.get(('en', 4)) or families[0],
+        })
+    return faces
+
+
+# ---------- persistent index ----------
+
+def _signature() -> list:
+    """Cheap change detector for FONTS_DIR: (name, size, mtime) of every font file."""
+    sig = []
+    if os.path.isdir(Config.FONTS_DIR):
+        for e in os.scandir(Config.FONTS_DIR):
+            if e.is_file() and e.name.lower().endswith(FONT_EXTS):
+                st = e.stat()
+                sig.append([e.name, st.st_size, int(st.st_mtime)])
+    return sorted(sig)
+
+def load_index(force: bool = False) -> dict:
+    """
+    Return {'signature': [...], 'fonts': [{'file', 'families', 'style', 'full'}]}.
+    Built once, kept in memory and on disk, and rebuilt only when the fonts
+    folder changes.
+    """
+    global _index
+    sig = _signature()
+    if not force and _index and _index['signature'] == sig:
+        return _index
+
+    if not force and os.path.exists(INDEX_PATH):
+        try:
+            with open(INDEX_PATH, 'r') as f:
+                cached = json.load(f)
+            if cached.get('signature') == sig:
+                _index = cached
+                return _index
+        except (OSError, ValueError):
+            pass
+
+    fonts = []
+    for name, _, _ in sig:
+        try:
+            for face in read_font_names(os.path.join(Config.FONTS_DIR, name)):
+                fonts.append({'file': name, **face})
+        except (OSError, struct.error) as e:
+            logger.warning("Skipping unreadable font %s: %s", name, e)
+
+    _index = {'signature': sig, 'fonts': fonts}
+    try:
+        with open(INDEX_PATH, 'w') as f:
+            json.dump(_index, f)
+    except OSError:
+        pass
+    logger.info("Font index built: %d faces from %d files", len(fonts), len(sig))
+    return _index
+
+def lookup(family: str) -> list:
+    """Files providing `family` (matched on family or full name, case-insensitive)."""
+    key = family.strip().lstrip('@').lower()
+    return sorted({
+        f['file'] for f in load_index()['fonts']
+        if key in (n.lower() for n in f['families']) or key == f['full'].lower()
+    })
+
+
+# ---------- per-job font set ----------
+
+def fallback_font():
+    """SUB_FALLBACK_FONT if FONTS_DIR has it, else the first indexed family (None without fonts)."""
+    if lookup(Config.SUB_FALLBACK_FONT):
+        return Config.SUB_FALLBACK_FONT
+    fonts = load_index()['fonts']
+    return fonts[0]['families'][0] if fonts else None
+
+def force_style(sub_path: str) -> str:
+    """
+    Extra `subtitles` filter option drawing a non-ASS subtitle with the
+    fallback font (ffmpeg would ask for Arial, which is not shipped).
+    """
+    family = fallback_font()
+    if sub_path.lower().endswith('.ass') or not family:
+        return ''
+    return f":force_style='FontName={family}'"
+
+def referenced_fonts(sub_path: str) -> list:
+    """
+    Font names a subtitle needs: [V4+ Styles] Fontname plus inline \\fn
+    overrides. Other formats name none, they are drawn with fallback_font().
+    """
+    if not sub_path.lower().endswith('.ass'):
+        return []
+
+    text = read_text(sub_path)
+    names, section, font_i = set(), '', 1
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('['):
+            section = line.lower()
+            continue
+        if section in ('[v4+ styles]', '[v4 styles]'):
+            if line.lower().startswith('format:'):
+                fields = [f.strip().lower() for f in line.split(':', 1)[1].split(',')]
+                if 'fontname' in fields:
+                    font_i = fields.index('fontname')
+            elif line.lower().startswith('style:'):
+                parts = line.split(':', 1)[1].split(',')
+                if len(parts) > font_i:
+                    names.add(parts[font_i].strip().lstrip('@'))
+        elif section == '[events]':
+            names.update(m.strip().lstrip('@') for m in fn_override_pattern.findall(line))
+    return sorted(n for n in names if n)
+
+def build_fontsdir(sub_path: str, job_id: str) -> tuple:
+    """
+    Create a temporary fonts folder holding (hard links to) only the fonts the
+    subtitle references, plus the fallback font. Returns (fontsdir,
+    missing_font_names).
+    """
+    fontsdir = os.path.join(Config.DOWNLOAD_DIR, f"{job_id}_fonts")
+    os.makedirs(fontsdir, exist_ok=True)
+    missing, files = [], set()
+    for family in referenced_fonts(sub_path):
+        found = lookup(family)
+        if not found:
+            missing.append(family)
+        files.update(found)
+    fallback = fallback_font()
+    if fallback:
+        files.update(lookup(fallback))
+    for fn in sorted(files):
+        src, dst = os.path.join(Config.FONTS_DIR, fn), os.path.join(fontsdir, fn)
+        if os.path.exists(dst):
+            continue
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+    return fontsdir, missing
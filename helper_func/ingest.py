@@ -0,0 +1,161 @@
+# helper_func/ingest.py
+
+import os, time, asyncio, logging
+from config import Config
+from helper_func.dbhelper import Database as Db
+from helper_func.progress_bar import progress_bar
+from helper_func import keyframes
+
+logger = logging.getLogger(__name__)
+
+db = Db()
+
+# first guesses (seconds per input byte) until we have observed real jobs
+DEFAULT_SEC_PER_BYTE = {
+    'soft':  1 / (150 * 1024 * 1024),
+    'remux': 1 / (150 * 1024 * 1024),
+    'trim':  1 / (150 * 1024 * 1024),
+    'hard':  1 / (3 * 1024 * 1024),
+    'nosub': 1 / (3 * 1024 * 1024),
+}
+
+
+class Ingestor:
+    """
+    Just-in-time downloads for lazily ingested Telegram videos.
+
+    With Config.LAZY_INGEST the upload handlers only record the Telegram
+    file_id. The scheduler walks the queue, predicts when each job will start
+    from observed per-mode throughput, and starts the download once that is
+    within Config.INGEST_LOOKAHEAD seconds. The worker awaits `ensure()` so a
+    job never starts before its input is on disk.
+    """
+
+    def __init__(self):
+        self.client = None
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._rates = dict(DEFAULT_SEC_PER_BYTE)
+        self._started: dict[str, float] = {}   # job_id -> start time of the running job
+        self.download_seconds: dict[str, float] = {}   # filename -> how long its download took (job traces)
+
+    def attach(self, client):
+        self.client = client
+
+    # ---------- estimates ----------
+
+    def observe(self, mode: str, size: int, seconds: float):
+        """Fold a finished job into the per-mode throughput (EWMA)."""
+        if size <= 0 or seconds <= 0:
+            return
+        old = self._rates.get(mode, DEFAULT_SEC_PER_BYTE['hard'])
+        self._rates[mode] = 0.7 * old + 0.3 * (seconds / size)
+
+    def estimate(self, mode: str, size: int) -> float:
+        return size * self._rates.get(mode, DEFAULT_SEC_PER_BYTE['hard'])
+
+    def job_started(self, job_id: str):
+        self._started[job_id] = time.time()
+
+    def remaining(self, job_id: str, mode: str, size: int) -> float:
+        """Predicted seconds left of a running job."""
+        return max(0.0, self.estimate(mode, size) - (time.time() - self._started.get(job_id, time.time())))
+
+    def job_resumed(self, job_id: str, paused_for: float):
+        # time spent paused is not progress
+        if job_id in self._started:
+            self._started[job_id] += paused_for
+
+    def job_finished(self, job_id: str):
+        self._started.pop(job_id, None)
+
+    async def input_size(self, filename: str) -> int:
+        path = os.path.join(Config.DOWNLOAD_DIR, filename)
+        if os.path.exists(path):
+            return os.path.getsize(path)
+        ref = await db.run(db.get_pending_ingest, filename)
+        return ref[2] if ref else 0
+
+    # ---------- downloads ----------
+
+    async def record(self, chat_id: int, filename: str, file_id: str, size: int):
+        await db.run(db.add_pending_ingest, filename, chat_id, file_id, size)
+
+    async def forget(self, filename: str):
+        task = self._tasks.pop(filename, None)
+        if task:
+            task.cancel()
+        await db.run(db.remove_pending_ingest, filename)
+
+    async def _download(self, filename: str, file_id: str, status=None, job_id: str = None):
+        path = os.path.join(Config.DOWNLOAD_DIR, filename)
+        t0 = time.time()
+        kwargs = {}
+        if status is not None:
+            kwargs = dict(progress=progress_bar, progress_args=('Fetching input…', status, t0, job_id))
+        got = await self.client.download_media(file_id, file_name=path + '.part', **kwargs)
+        if not got:
+            raise RuntimeError('download failed')
+        await asyncio.to_thread(os.replace, got, path)
+        keyframes.warm(path)
+        await db.run(db.remove_pending_ingest, filename)
+        self.download_seconds[filename] = time.time() - t0
+        logger.info("Ingested %s in %.1fs", filename, time.time() - t0)
+        return True
+
+    def _start(self, filename: str, file_id: str, status=None, job_id: str = None) -> asyncio.Task:
+        task = self._tasks.get(filename)
+        if task is None or (task.done() and not task.cancelled() and task.exception()):
+            task = asyncio.create_task(self._download(filename, file_id, status, job_id))
+            self._tasks[filename] = task
+        return task
+
+    async def ensure(self, filename: str, status=None, job_id: str = None) -> bool:
+        """Make sure `filename` is on disk, downloading it now if the prefetch has not."""
+        if not filename:
+            return True
+        ref = await db.run(db.get_pending_ingest, filename)
+        if not ref:
+            return os.path.exists(os.path.join(Config.DOWNLOAD_DIR, filename))
+        try:
+            await self._start(filename, ref[1], status, job_id)
+            return True
+        except Exception as e:
+            logger.warning("Ingest of %s failed: %s", filename, e)
+            return False
+        finally:
+            self._tasks.pop(filename, None)
+
+    # ---------- scheduler ----------
+
+    async def scheduler(self, job_queue, interval: float = 15):
+        """Prefetch inputs of jobs predicted to start within the lookahead window."""
+        while True:
+            try:
+                await self._tick(job_queue)
+            except Exception as e:
+                logger.warning("Ingest scheduler tick failed: %s", e)
+            await asyncio.sleep(interval)
+
+    async def _tick(self, job_queue):
+        # time until the worker is free again
+        eta = 0.0
+        for job_id, job in list(job_queue.running.items()):
+            eta += self.remaining(job_id, job.mode, await self.input_size(job.vid))
+
+        active = sum(1 for t in self._tasks.values() if not t.done())
+        for job_id in job_queue.live_order():
+            if eta > Config.INGEST_LOOKAHEAD:
+                break
+            job = job_queue.get_job(job_id)
+            if job is None:
+                continue
+            size = await self.input_size(job.vid)
+            ref  = await db.run(db.get_pending_ingest, job.vid)
+            if ref and job.vid not in self._tasks and active < Config.INGEST_MAX_PARALLEL:
+                logger.info("Prefetching %s for job %s (starts in ~%ds)", job.vid, job_id, eta)
+                self._start(job.vid, ref[1])
+                active += 1
+            eta += self.estimate(job.mode, size)
+
+
+ingestor = Ingestor()
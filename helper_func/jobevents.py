@@ -0,0 +1,81 @@
+# helper_func/jobevents.py
+"""
+Event feeds of watched jobs (the ones submitted through the HTTP API): state
+changes, status texts and progress ticks, kept in memory so clients can
+poll the latest one or follow them as a stream. Jobs nobody watches cost
+one dict lookup per event.
+"""
+
+import re, html, time, asyncio
+from collections import deque
+
+TAGS     = re.compile(r'<[^>]+>')
+FINAL    = ('done', 'failed', 'cancelled')
+KEEP     = 200            # events kept per job
+KEEP_FOR = 24 * 3600      # finished feeds are dropped after this long
+
+
+class Feed:
+    def __init__(self):
+        self.events  = deque(maxlen=KEEP)
+        self.seq     = 0
+        self.state   = 'queued'
+        self.last    = {}             # latest event of each kind
+        self.ended   = None           # when a final state arrived
+        self.changed = asyncio.Event()
+
+
+_feeds: dict[str, Feed] = {}
+
+
+def watch(job_id: str) -> Feed:
+    """Start recording events of `job_id`."""
+    _prune()
+    return _feeds.setdefault(job_id, Feed())
+
+def get(job_id: str):
+    return _feeds.get(job_id)
+
+def _prune():
+    cutoff = time.time() - KEEP_FOR
+    for job_id in [j for j, f in _feeds.items() if f.ended and f.ended < cutoff]:
+        del _feeds[job_id]
+
+
+def publish(job_id: str, event: str, /, **fields):
+    feed = _feeds.get(job_id)
+    if feed is None:
+        return
+    feed.seq += 1
+    ev = {'seq': feed.seq, 'ts': round(time.time(), 3), 'event': event, **fields}
+    feed.events.append(ev)
+    feed.last[event] = ev
+    if event == 'state':
+        feed.state = fields['state']
+        if feed.state in FINAL:
+            feed.ended = time.time()
+    # wake every follower, then arm the event again for the next one
+    feed.changed.set()
+    feed.changed = asyncio.Event()
+
+def status(job_id: str, text: str):
+    """A status message edit, as plain text."""
+    if job_id in _feeds:
+        plain = html.unescape(TAGS.sub('', text))
+        publish(job_id, 'status', text=' | '.join(l.strip() for l in plain.splitlines() if l.strip()))
+
+
+async def follow(job_id: str, after: int = 0):
+    """Yield the job's events with seq > `after`, live, until it reaches a final state."""
+    feed = _feeds.get(job_id)
+    if feed is None:
+        return
+    while True:
+        waiter = feed.changed
+        for ev in list(feed.events):
+            if ev['seq'] > after:
+                after = ev['seq']
+                yield ev
+        if feed.state in FINAL:
+            return
+        await waiter.wait()
@@ -0,0 +1,95 @@
+# helper_func/journal.py
+
+import os, json, time, logging
+from config import Config
+from pyrogram.enums import ParseMode
+from helper_func.dbhelper import Database as Db
+from helper_func.queue import Job, StatusMessage
+from helper_func.batch import batches, report as batch_report
+
+logger = logging.getLogger(__name__)
+
+db = Db()
+
+KEEP_FINISHED = 7 * 24 * 3600   # finished rows are pruned after a week
+
+
+def _changed(job: Job, state: str):
+    # queue hooks are sync; the single sqlite thread keeps the writes in order
+    Db._executor.submit(db.journal_job, job, state, time.time())
+
+def _reordered(job_ids: list):
+    Db._executor.submit(db.journal_reorder, job_ids)
+
+def attach(job_queue):
+    """Journal every state transition of `job_queue` into the job_journal table."""
+    job_queue.on_change  = _changed
+    job_queue.on_reorder = _reordered
+
+
+def _missing_inputs(job: Job, pending: set) -> list:
+    """Input files of `job` that are gone (lazily ingested ones still count as present)."""
+    names = [job.vid, job.sub, *(t[0] for t in job.subs)]
+    return [fn for fn in names
+            if fn and fn not in pending and not os.path.exists(os.path.join(Config.DOWNLOAD_DIR, fn))]
+
+
+async def restore(client, job_queue) -> int:
+    """
+    Re-queue the jobs that were queued or running when the bot stopped
+    (interrupted ones first, in their old order) and re-attach their status
+    messages. Inputs are still in DOWNLOAD_DIR, so nothing is downloaded
+    again; batches the jobs belong to get a fresh card. Call before the
+    worker starts. Returns the number of jobs restored.
+    """
+    await db.run(db.journal_prune, time.time() - KEEP_FINISHED)
+    restored = 0
+    rows = await db.run(db.journal_unfinished)
+    for row in rows:
+        job_id, state, mode, chat_id, vid, sub, final_name, msg_id, batch_id, subs, trim, cfg = row
+        job = Job(job_id, mode, chat_id, vid, sub, final_name, msg_id, batch_id,
+                  tuple(tuple(t) for t in json.loads(subs or '[]')), tuple(json.loads(trim or '[]')),
+                  json.loads(cfg) if cfg else None)
+        status = StatusMessage(client, chat_id, msg_id)
+
+        pending = {vid} if vid and await db.run(db.get_pending_ingest, vid) else set()
+        missing = _missing_inputs(job, pending)
+        if missing:
+            _changed(job, 'failed')
+            logger.warning("Not resuming job %s, inputs gone: %s", job_id, missing)
+            text = f"❌ Job <code>{job_id}</code> was lost in a restart (its files are gone), please send them again."
+        else:
+            job_queue.put_nowait(job)
+            restored += 1
+            what = 'restarted' if state == 'running' else 're-queued'
+            text = (f"♻️ The bot restarted, job <code>{job_id}</code> was {what} "
+                    f"at position {job_queue.position(job_id)}.")
+        try:
+            await status.edit(text, parse_mode=ParseMode.HTML)
+        except Exception:
+            pass
+    for batch_id in dict.fromkeys(row[8] for row in rows if row[8]):
+        await _restore_batch(client, batch_id)
+    if restored:
+        _reordered(job_queue.live_order())
+        logger.info("Restored %d job(s) from the journal", restored)
+    return restored
+
+
+async def _restore_batch(client, batch_id: str):
+    """Rebuild the in-memory record of a batch (for its card and /cancel) from its journalled jobs."""
+    rows = await db.run(db.journal_batch, batch_id)
+    if not rows:
+        return
+    b = dict(chat_id=rows[0][2], msg=None, jobs=[r[0] for r in rows], done=0, failed=0, cancelled=0)
+    for _, state, _ in rows:
+        if state in ('done', 'failed', 'cancelled'):
+            b[state] += 1
+    try:
+        b['msg'] = await client.send_message(
+            b['chat_id'], f"📦 Batch <code>{batch_id}</code> resumed after a restart…", parse_mode=ParseMode.HTML
+        )
+    except Exception:
+        pass
+    batches[batch_id] = b
+    await batch_report(batch_id)
@@ -0,0 +1,154 @@
+# helper_func/keyframes.py
+
+import os, json, time, asyncio, bisect, hashlib, logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = os.path.join(Config.DOWNLOAD_DIR, 'kf_cache')
+_VERSION  = 2     # bump when probe_keyframes() changes what it keeps, so old cache files are not reused
+_MAX_AGE  = 7 * 86400   # cache files of inputs deleted without a job (cancelled, crashed) go after this
+
+_index: dict[str, list] = {}                 # cache key -> sorted keyframe pts
+_building: dict[str, asyncio.Task] = {}      # cache key -> ffprobe run in flight
+
+
+async def probe_keyframes(vid_path: str) -> list:
+    """
+    Sorted pts (seconds) of the keyframes a stream copy can start on, read
+    from packet flags (no decoding). A keyframe followed, before the next
+    one, by a packet shown earlier than itself opens an open GOP (x265 CRA,
+    x264 --open-gop): those leading frames reference the previous GOP, so
+    such keyframes are left out and only IDR-like ones remain.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', '-i', vid_path,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    out, _ = await proc.communicate()
+    return clean_keyframes(out.decode(errors='ignore').splitlines())
+
+
+def clean_keyframes(packets: list) -> list:
+    """`pts_time,flags` lines in decode order -> sorted pts of the closed-GOP keyframes."""
+    kfs, last, leading = [], None, False
+    for line in packets:
+        parts = line.strip().split(',')
+        if len(parts) < 2:
+            continue
+        try:
+            pts = float(parts[0])
+        except ValueError:
+            continue
+        if 'K' in parts[1]:
+            if last is not None and not leading:
+                kfs.append(last)
+            last, leading = pts, False
+        elif last is not None and pts < last - 1e-6:
+            leading = True
+    if last is not None and not leading:
+        kfs.append(last)
+    return sorted(set(kfs))
+
+
+def _key(vid_path: str):
+    """Identity of the file's current content (path, size, mtime), or None if it is gone."""
+    try:
+        st = os.stat(vid_path)
+    except OSError:
+        return None
+    ident = f"{os.path.abspath(vid_path)}|{st.st_size}|{st.st_mtime_ns}|{_VERSION}"
+    return hashlib.sha1(ident.encode()).hexdigest()
+
+
+async def _build(key: str, vid_path: str) -> list:
+    path = os.path.join(CACHE_DIR, key + '.json')
+    try:
+        with open(path) as f:
+            kfs = json.load(f)
+    except (OSError, ValueError):
+        kfs = await probe_keyframes(vid_path)
+        if kfs:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            with open(path, 'w') as f:
+                json.dump(kfs, f)
+    if kfs:
+        _index[key] = kfs
+    return kfs
+
+
+async def index(vid_path: str) -> list:
+    """
+    Keyframe pts of `vid_path`, probed once per file content and cached in
+    memory and under DOWNLOAD_DIR/kf_cache; concurrent callers share one probe.
+    """
+    key = _key(vid_path)
+    if key is None:
+        return []
+    if key in _index:
+        return _index[key]
+    task = _building.get(key)
+    if task is None:
+        task = asyncio.create_task(_build(key, vid_path))
+        _building[key] = task
+        task.add_done_callback(lambda _: _building.pop(key, None))
+    return await asyncio.shield(task)
+
+
+def cached(vid_path: str) -> list:
+    """The index if it is already built, else [] (never probes)."""
+    key = _key(vid_path)
+    return _index.get(key, []) if key else []
+
+
+def warm(vid_path: str):
+    """Build the index in the background as soon as a video arrives."""
+    async def _warm():
+        try:
+            kfs = await index(vid_path)
+            logger.debug("Indexed %d keyframes of %s", len(kfs), os.path.basename(vid_path))
+        except Exception as e:
+            logger.warning("Keyframe index of %s failed: %s", vid_path, e)
+    return asyncio.create_task(_warm())
+
+
+def forget(vid_path: str):
+    """Drop the index of a file that is about to be deleted."""
+    key = _key(vid_path)
+    if key is None:
+        return
+    _index.pop(key, None)
+    try:
+        os.remove(os.path.join(CACHE_DIR, key + '.json'))
+    except OSError:
+        pass
+
+
+def prune(max_age: float = _MAX_AGE) -> int:
+    """Delete cache files not written for `max_age` seconds; returns how many went."""
+    cutoff, removed = time.time() - max_age, 0
+    try:
+        entries = list(os.scandir(CACHE_DIR))
+    except OSError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def before(kfs: list, t: float) -> float:
+    """Last keyframe at or before `t` (0.0 when there is none)."""
+    i = bisect.bisect_right(kfs, t + 1e-3) - 1
+    return kfs[i] if i >= 0 else 0.0
+
+
+def after(kfs: list, t: float):
+    """First keyframe at or after `t`, or None."""
+    i = bisect.bisect_left(kfs, t - 1e-3)
+    return kfs[i] if i < len(kfs) else None
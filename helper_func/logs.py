@@ -0,0 +1,138 @@
+# helper_func/logs.py
+
+import sys, json, time, queue, atexit, logging, contextvars, logging.handlers
+from config import Config
+
+# job id of the job the current task works on; copied into tasks it spawns
+current_job = contextvars.ContextVar('current_job', default=None)
+
+# LogRecord attributes that are not user fields (anything else passed via extra= is)
+_STD = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime', 'sample'}
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, job_id, msg and every extra= field."""
+
+    def format(self, record):
+        event = {
+            'ts':     round(record.created, 3),
+            'level':  record.levelname,
+            'logger': record.name,
+            'job_id': getattr(record, 'job_id', None),
+            'msg':    record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STD and key not in event:
+                event[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            event['exc'] = record.exc_text
+        return json.dumps(event, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__('%(asctime)s - %(name)s - %(levelname)s - %(job)s%(message)s')
+
+    def format(self, record):
+        record.job = f"[{record.job_id}] " if getattr(record, 'job_id', None) else ''
+        return super().format(record)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Tag records with the running job and drop sampled ones: a record logged
+    with extra={'sample': key} passes at most once per LOG_SAMPLE_INTERVAL
+    seconds per (key, job). Runs in the caller, so dropped records are never queued.
+    """
+
+    def __init__(self, interval: float):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+
+    def filter(self, record):
+        if getattr(record, 'job_id', None) is None:
+            record.job_id = current_job.get()
+        key = getattr(record, 'sample', None)
+        if key is None:
+            return True
+        slot = (key, record.job_id)
+        now  = time.monotonic()
+        if now - self._last.get(slot, 0.0) < self.interval:
+            return False
+        self._last[slot] = now
+        if len(self._last) > 1024:   # forget finished jobs
+            cutoff = now - 60 * self.interval
+            self._last = {k: t for k, t in self._last.items() if t > cutoff}
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # only merge the message here; formatting (JSON, tracebacks) happens on the listener thread
+        record = logging.makeLogRecord(vars(record))
+        record.msg, record.args = record.getMessage(), None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _parse_levels(spec: str) -> dict:
+    """'pyrogram=WARNING,helper_func.mux=DEBUG' -> {'pyrogram': 'WARNING', ...}"""
+    levels = {}
+    for item in (spec or '').split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def set_level(name: str, level: str):
+    """Change one subsystem's level at runtime ('root' or '' for the default). Raises ValueError."""
+    level = level.upper()
+    if not isinstance(logging.getLevelName(level), int):
+        raise ValueError(f"unknown level {level}")
+    logging.getLogger(None if name in ('', 'root') else name).setLevel(level)
+
+
+def levels() -> dict:
+    """{logger name: level} of the root logger and every logger with its own level."""
+    out = {'root': logging.getLevelName(logging.getLogger().level)}
+    for name, lg in sorted(logging.root.manager.loggerDict.items()):
+        if isinstance(lg, logging.Logger) and lg.level:
+            out[name] = logging.getLevelName(lg.level)
+    return out
+
+
+def setup(level: str = None, fmt: str = None, stream=None):
+    """
+    Route all logging through a queue drained by a background thread that
+    writes to `stream` (stderr). Levels come from LOG_LEVEL / LOG_LEVELS,
+    the line format from LOG_FORMAT ('json' or 'text'). Safe to call twice.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    out = logging.StreamHandler(stream or sys.stderr)
+    out.setFormatter(JsonFormatter() if (fmt or Config.LOG_FORMAT) == 'json' else TextFormatter())
+
+    q = queue.SimpleQueue()
+    handler = _QueueHandler(q)
+    handler.addFilter(ContextFilter(Config.LOG_SAMPLE_INTERVAL))
+
+    root = logging.getLogger()
+    for h in root.handlers[:]:
+        root.removeHandler(h)
+    root.addHandler(handler)
+    root.setLevel((level or Config.LOG_LEVEL).upper())
+    for name, lvl in _parse_levels(Config.LOG_LEVELS).items():
+        set_level(name, lvl)
+
+    _listener = logging.handlers.QueueListener(q, out, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)
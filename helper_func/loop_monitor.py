@@ -0,0 +1,84 @@
+# helper_func/loop_monitor.py
+
+import sys, json, time, asyncio, logging, threading, traceback
+from collections import deque
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class LoopMonitor:
+    """
+    Measures event-loop lag with a heartbeat coroutine. A watchdog thread
+    notices when the heartbeat is late, grabs the loop thread's stack (i.e. the
+    callback that is blocking it) and logs it; every stall is also appended to
+    Config.LOOP_STALL_LOG as one JSON line.
+    """
+
+    def __init__(self, interval: float = 0.1, threshold: float = None):
+        self.interval  = interval
+        self.threshold = threshold if threshold is not None else Config.LOOP_STALL_THRESHOLD
+        self.lags      = deque(maxlen=3000)   # last ~5 minutes of heartbeat lag (seconds)
+        self.stalls    = deque(maxlen=50)     # most recent stall records
+        self.stall_count = 0
+        self._last_beat  = time.monotonic()
+        self._loop_thread = None
+        self._pending     = None              # stall being observed right now
+        self._lock        = threading.Lock()
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        self._loop_thread = threading.get_ident()
+        self._last_beat   = time.monotonic()
+        loop.create_task(self._heartbeat())
+        threading.Thread(target=self._watchdog, name='loop-watchdog', daemon=True).start()
+
+    async def _heartbeat(self):
+        while True:
+            t0 = time.monotonic()
+            await asyncio.sleep(self.interval)
+            now = time.monotonic()
+            lag = max(0.0, now - t0 - self.interval)
+            self.lags.append(lag)
+            with self._lock:
+                self._last_beat = now
+                pending, self._pending = self._pending, None
+            if pending:
+                pending['duration'] = round(lag + self.interval, 3)
+                threading.Thread(target=self._export, args=(pending,), daemon=True).start()
+
+    def _watchdog(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                late = time.monotonic() - self._last_beat
+                if late < self.threshold or self._pending is not None:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = ''.join(traceback.format_stack(frame)) if frame else ''
+                self._pending = {'ts': time.time(), 'stack': stack}
+            logger.warning("Event loop blocked for >%.0f ms, loop thread is in:\n%s", late * 1000, stack)
+
+    def _export(self, stall: dict):
+        self.stall_count += 1
+        self.stalls.append(stall)
+        logger.warning("Event loop stall ended after %.0f ms", stall['duration'] * 1000)
+        try:
+            with open(Config.LOOP_STALL_LOG, 'a') as f:
+                f.write(json.dumps(stall) + '\n')
+        except OSError:
+            pass
+
+    def stats(self) -> dict:
+        lags = sorted(self.lags)
+        def pct(p):
+            return lags[min(len(lags) - 1, int(len(lags) * p))] if lags else 0.0
+        return {
+            'samples': len(lags),
+            'p50_ms': round(pct(0.50) * 1000, 1),
+            'p99_ms': round(pct(0.99) * 1000, 1),
+            'max_ms': round((lags[-1] if lags else 0.0) * 1000, 1),
+            'stalls': self.stall_count,
+        }
+
+
+monitor = LoopMonitor()
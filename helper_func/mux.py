@@ -1,10 +1,34 @@
-import os, time, re, uuid, asyncio, math
+import os, time, re, uuid, html, asyncio, math, glob, shutil, signal, logging
+from collections import deque
 from config import Config
 from helper_func.settings_manager import SettingsManager
+from helper_func.crf_search import search_crf, _ProcGroup
+from helper_func.subtitles import event_times, LANGUAGES
+from helper_func import smart_render, encoders, keyframes, preempt, storage, jobevents
+from helper_func.fonts import build_fontsdir, force_style
+from helper_func.resources import new_usage, track
+from helper_func.auto_mode import probe_streams, mp4_compatible
 from pyrogram.enums import ParseMode
 
 # Track running jobs so /cancel can kill ffmpeg
 running_jobs: dict[str, dict] = {}
+# CPU / memory / IO of every ffmpeg a job ran, summed per job_id (see helper_func/resources.py)
+job_usage: dict[str, dict] = {}
+# why a job's ffmpeg had to be re-run: [{'attempt', 'reason', 'fallback', 'ts'}] per job_id
+job_retries: dict[str, list] = {}
+# job_id -> reason, set when the supervisor (not /cancel) killed the job's ffmpeg
+_supervisor_kills: dict[str, str] = {}
+
+logger = logging.getLogger(__name__)
+
+# re-runs after a stalled/failed ffmpeg: (description, settings overrides, extra input flags)
+TOLERANT_INPUT = ['-err_detect', 'ignore_err', '-fflags', '+genpts+discardcorrupt']
+FALLBACKS = [
+    ('error-tolerant decoding and a faster preset',
+     {'preset': 'veryfast', 'smart_render': 'off'}, TOLERANT_INPUT),
+    ('safe H.264 settings and system fonts',
+     {'codec': 'libx264', 'preset': 'ultrafast', 'smart_render': 'off', 'fonts': 'system'}, TOLERANT_INPUT),
+]
 
 # Parse both classic ffmpeg stats AND -progress key/value output
 progress_pattern = re.compile(
@@ -73,20 +97,63 @@ async def _probe_duration(vid_path: str) -> float:
     except Exception:
         return 0.0
 
-async def read_stderr(start: float, msg, proc, job_id: str, total_dur: float, input_size: int):
+async def _probe_audio_bitrate(vid_path: str) -> int:
+    """
+    Return the bitrate (bits/s) of the first audio stream, which we always
+    stream-copy. Containers like MKV often leave bit_rate empty, so fall back
+    to summing the packet sizes (a quick demux-only pass). 0 if no audio.
+    """
+    proc = await asyncio.create_subprocess_exec(
+        'ffprobe', '-v', 'error', '-select_streams', 'a:0',
+        '-show_entries', 'stream=bit_rate:stream_tags=BPS,BPS-eng',
+        '-of', 'default=noprint_wrappers=1:nokey=1', '-i', vid_path,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    out, _ = await proc.communicate()
+    lines = [l.strip() for l in out.decode(errors='ignore').splitlines() if l.strip()]
+    if not lines:
+        return 0
+    for l in lines:
+        if l.isdigit() and int(l) > 0:
+            return int(l)
+
+    duration = await _probe_duration(vid_path)
+    if duration <= 0:
+        return 0
+    proc = await asyncio.create_subprocess_exec(
+        'ffprobe', '-v', 'error', '-select_streams', 'a:0',
+        '-show_entries', 'packet=size', '-of', 'csv=p=0', '-i', vid_path,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    out, _ = await proc.communicate()
+    total = 0
+    for l in out.decode(errors='ignore').splitlines():
+        l = l.strip().rstrip(',')
+        if l.isdigit():
+            total += int(l)
+    return int(total * 8 / duration)
+
+async def read_stderr(start: float, msg, proc, job_id: str, total_dur: float, input_size: int,
+                      label: str = 'Encoding', state: dict = None):
     """
     Tail ffmpeg stderr and render a rich progress card (Size / Speed / Elapsed / ETA / %)
-    with the Job ID visible.
+    with the Job ID visible. `state` (if given) gets the time of the last
+    out_time advance and the last non-progress lines, for the supervisor.
     """
     last_edit = 0.0
     curr_time = 0.0   # seconds processed
     curr_size = 0     # bytes written (from total_size)
     speed_x   = 0.0
+    # ffmpeg's own speed counts wall time, so it sags after a pause; pauses are taken out below
+    pause     = preempt.state(job_id)
+    proc_t0, pause_t0 = time.time(), pause.seconds()
 
     async for raw in readlines(proc.stderr):
         line = raw.decode(errors='ignore')
         prog = parse_progress(line)
         if not prog:
+            if state is not None and line.strip():
+                state['tail'].append(line.strip())
             continue
 
         # Pull fields
@@ -104,6 +171,10 @@ async def read_stderr(start: float, msg, proc, job_id: str, total_dur: float, in
             except Exception:
                 pass
 
+        if state is not None and curr_time > state['out_time']:
+            state['out_time'] = curr_time
+            state['at'] = time.time()
+
         if 'total_size' in prog:
             try:
                 curr_size = int(prog['total_size'])
@@ -122,6 +193,9 @@ async def read_stderr(start: float, msg, proc, job_id: str, total_dur: float, in
                 speed_x = float(prog['speed'].rstrip('x'))
             except Exception:
                 speed_x = 0.0
+        paused = pause.seconds() - pause_t0
+        if paused > 0 and curr_time > 0:
+            speed_x = curr_time / max(1e-3, time.time() - proc_t0 - paused)
 
         # Throttle UI updates (~once every 2s)
         now = time.time()
@@ -138,15 +212,31 @@ async def read_stderr(start: float, msg, proc, job_id: str, total_dur: float, in
                 eta_sec = max(0, int((total_dur - curr_time) / speed_x))
             elif curr_time > 0:
                 # fallback ETA from avg processing rate
-                speed_factor = curr_time / (now - start)  # (sec encoded) per wall sec
+                speed_factor = curr_time / max(1e-3, now - proc_t0 - paused)  # (sec encoded) per active sec
                 if speed_factor > 0:
                     eta_sec = max(0, int((total_dur - curr_time) / speed_factor))
 
-        elapsed = now - start
+        elapsed = now - start - pause.seconds()
         avg_bps = curr_size / elapsed if elapsed > 0 else 0.0
+        # sampled: at most one per LOG_SAMPLE_INTERVAL per job reaches the log
+        logger.debug("ffmpeg progress", extra={
+            'sample': 'progress', 'job_id': job_id, 'stage': label,
+            'pct': round(pct, 1), 'speed': speed_x, 'eta': eta_sec, 'size': curr_size,
+        })
+
+        numbers = {
+            'label': label, 'job_id': job_id, 'pct': round(pct, 1), 'out_time': round(curr_time, 2),
+            'size': curr_size, 'speed': speed_x, 'eta': eta_sec, 'elapsed': round(elapsed),
+        }
+        jobevents.publish(job_id, 'progress', **numbers)
+        # headless front-ends (muxcli.py) take the numbers instead of a rendered card
+        report = getattr(msg, 'progress', None)
+        if report is not None:
+            await report(numbers)
+            continue
 
         card = (
-            f"📽️ <b>Encoding</b> [<code>{job_id}</code>]\n\n"
+            f"📽️ <b>{label}</b> [<code>{job_id}</code>]\n\n"
             f"📊 <b>Size:</b> {_humanbytes(curr_size)}\n"
             f"⏱️ <b>Time:</b> {_fmt_hhmmss(curr_time)}\n"
             f"⚡ <b>Speed:</b> {f'{speed_x:.2f}x' if speed_x else 'N/A'}\n"
@@ -159,75 +249,483 @@ async def read_stderr(start: float, msg, proc, job_id: str, total_dur: float, in
             pass
 
 
-# ============ SOFT-MUX ============
+async def probe_video_info(path: str) -> dict:
+    """{'duration': int s, 'width': int, 'height': int} of a finished output (0 where unknown)."""
+    proc = await asyncio.create_subprocess_exec(
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height:format=duration',
+        '-of', 'default=noprint_wrappers=1', '-i', path,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    out, _ = await proc.communicate()
+    info = {'duration': 0, 'width': 0, 'height': 0}
+    for line in out.decode(errors='ignore').splitlines():
+        if '=' not in line:
+            continue
+        k, v = line.split('=', 1)
+        try:
+            info[k.strip()] = int(float(v))
+        except ValueError:
+            pass
+    return info
 
-async def softmux_vid(vid_filename: str, sub_filename: str, msg):
-    start    = time.time()
-    vid_path = os.path.join(Config.DOWNLOAD_DIR, vid_filename)
-    sub_path = os.path.join(Config.DOWNLOAD_DIR, sub_filename)
-    base     = os.path.splitext(vid_filename)[0]
-    output   = f"{base}_soft.mkv"
-    out_path = os.path.join(Config.DOWNLOAD_DIR, output)
-    sub_ext  = os.path.splitext(sub_filename)[1].lstrip('.')
+async def make_thumbnail(path: str, duration: float) -> str:
+    """Grab a frame ~10% in as a Telegram-sized JPEG. Returns its path or None."""
+    thumb = os.path.splitext(path)[0] + '_thumb.jpg'
+    proc = await asyncio.create_subprocess_exec(
+        'ffmpeg', '-hide_banner', '-v', 'error',
+        '-ss', str(max(0.0, duration * 0.1)), '-i', path,
+        '-frames:v', '1', '-vf', 'scale=320:-2', '-q:v', '5', '-y', thumb,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    await proc.communicate()
+    return thumb if proc.returncode == 0 and os.path.exists(thumb) else None
+
+def _faststart(out_path: str) -> list:
+    """Put the MP4 index up front so Telegram clients can start playback while downloading."""
+    return ['-movflags', '+faststart'] if out_path.endswith('.mp4') else []
 
-    total_dur  = await _probe_duration(vid_path)
-    input_size = os.path.getsize(vid_path) if os.path.exists(vid_path) else 0
 
+# ============ RATE CONTROL ============
+
+# Share of the target size we leave for container/muxing overhead
+MUX_OVERHEAD = 0.02
+# Below this a "fit to size" encode is unwatchable, refuse instead
+MIN_VIDEO_BITRATE = 150_000
+
+def _target_bytes(cfg: dict) -> int:
+    """Size the user asked us to hit with /targetsize (0 = plain CRF)."""
+    t = str(cfg.get('target_size', 'off')).lower()
+    if t == 'off':
+        return 0
+    if t == 'tg':
+        return Config.TG_MAX_FILE_SIZE
+    try:
+        return min(int(float(t) * 1024 * 1024), Config.TG_MAX_FILE_SIZE)
+    except ValueError:
+        return 0
+
+def _video_bitrate_for(target: int, duration: float, audio_bps: int) -> int:
+    """Video bitrate (bits/s) so that video + copied audio land just under `target` bytes."""
+    if duration <= 0:
+        return 0
+    usable = target * 8 * (1 - MUX_OVERHEAD)
+    return int(usable / duration - audio_bps)
+
+def _crf_cap_args(codec: str, cap_bps: int) -> list:
+    """
+    VBV ceiling for CRF encodes when Config.CRF_SIZE_CAP is on, so a plain
+    CRF run cannot outgrow Telegram's upload limit. `cap_bps` is an average
+    over the whole video, so it also limits the peaks of busy scenes.
+    """
+    if cap_bps <= 0:
+        return []
+    if codec in ('libx264', 'libx265', 'libsvtav1'):
+        # (libsvtav1 turns crf + maxrate into capped CRF)
+        return ['-maxrate', str(cap_bps), '-bufsize', str(cap_bps * 2)]
+    # vp9/av1: crf + b:v is "constrained quality", b:v acts as the ceiling
+    return ['-b:v', str(cap_bps)]
+
+def _pass_args(codec: str, n: int, logfile: str) -> list:
+    if codec == 'libx265':
+        return ['-x265-params', f'pass={n}:stats={logfile}.log']
+    return ['-pass', str(n), '-passlogfile', logfile]
+
+def _cleanup_passlogs(logfile: str):
+    for fn in glob.glob(logfile + '*'):
+        try:
+            os.remove(fn)
+        except OSError:
+            pass
+
+async def _watch(proc, state: dict, job_id: str, deadline: float):
+    """
+    Kill `proc` once out_time stops advancing for FFMPEG_STALL_TIMEOUT or it
+    outlives `deadline`. Time the job spends paused counts towards neither.
+    """
+    t0 = time.time()
+    pause = preempt.state(job_id)
+    seen  = pause.seconds()
+    while proc.returncode is None:
+        await asyncio.sleep(5)
+        if pause.paused:
+            continue
+        grown, seen = pause.seconds() - seen, pause.seconds()
+        state['at'] += grown
+        t0 += grown
+        now = time.time()
+        if now - state['at'] > Config.FFMPEG_STALL_TIMEOUT:
+            reason = f"no progress for {_fmt_time(now - state['at'])} at {_fmt_time(state['out_time'])}"
+        elif now - t0 > deadline:
+            reason = f"still running after the {_fmt_time(deadline)} deadline"
+        else:
+            continue
+        logger.warning("Killing ffmpeg of job %s: %s", job_id, reason)
+        _supervisor_kills[job_id] = reason
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+        return
+
+async def _run_ffmpeg(cmd: list, msg, job_id: str, start: float, total_dur: float,
+                      input_size: int, label: str = 'Encoding'):
+    """
+    Launch one ffmpeg process, keep it cancellable via running_jobs and wait
+    for it while the supervisor (_watch) kills it if it stalls or overruns.
+    A paused job (see pause_job) starts its next process only once resumed.
+    """
+    pause = preempt.state(job_id)
+    await pause.resumed.wait()
     proc = await asyncio.create_subprocess_exec(
-        'ffmpeg', '-hide_banner',
-        '-progress', 'pipe:2', '-nostats',
-        '-i', vid_path, '-i', sub_path,
-        '-map', '1:0', '-map', '0',
-        '-disposition:s:0', 'default',
-        '-c:v', 'copy', '-c:a', 'copy',
-        f'-c:s', sub_ext,
-        '-y', out_path,
+        *cmd,
         stdout=asyncio.subprocess.PIPE,
         stderr=asyncio.subprocess.PIPE
     )
-
-    job_id = uuid.uuid4().hex[:8]
-    reader = asyncio.create_task(read_stderr(start, msg, proc, job_id, total_dur, input_size))
+    state   = {'at': time.time(), 'out_time': 0.0, 'tail': deque(maxlen=20)}
+    sampler = asyncio.create_task(track(proc.pid, job_usage.setdefault(job_id, new_usage())))
+    reader = asyncio.create_task(read_stderr(start, msg, proc, job_id, total_dur, input_size, label, state))
     waiter = asyncio.create_task(proc.wait())
+    deadline = max(Config.FFMPEG_DEADLINE_MIN, total_dur * Config.FFMPEG_DEADLINE_FACTOR)
+    watcher  = asyncio.create_task(_watch(proc, state, job_id, deadline))
     running_jobs[job_id] = {'proc': proc, 'tasks': [reader, waiter]}
+    if pause.paused:   # paused while the process was being spawned
+        preempt.signal_procs(proc, signal.SIGSTOP)
+    await asyncio.wait([reader, waiter])
+    running_jobs.pop(job_id, None)
+    for t in (sampler, watcher):
+        t.cancel()
+    await asyncio.gather(sampler, watcher, return_exceptions=True)
+    proc.stderr_tail = list(state['tail'])
+    return proc
 
-    await msg.edit(
-        f"🔄 Soft-Mux job started: <code>{job_id}</code>\n"
-        f"Send <code>/cancel {job_id}</code> to abort",
-        parse_mode=ParseMode.HTML
-    )
+def pause_job(job_id: str) -> bool:
+    """
+    Suspend a running job (SIGSTOP) so another can use the CPU; it keeps its
+    progress. Only possible while one of its ffmpeg runs is registered:
+    downloads, uploads and the gaps between runs cannot be stopped.
+    """
+    entry = running_jobs.get(job_id)
+    if entry is None:
+        return False
+    return preempt.pause(job_id, entry['proc'])
 
-    await asyncio.wait([reader, waiter])
+def resume_job(job_id: str) -> float:
+    """Continue a paused job (SIGCONT). Returns how long it was paused."""
+    entry = running_jobs.get(job_id)
+    return preempt.resume(job_id, entry['proc'] if entry else None)
+
+async def _with_retries(run, msg, job_id: str):
+    """
+    `run(overrides, in_flags)` starts the job's ffmpeg work and returns its
+    process (or an error string). When the supervisor killed it or ffmpeg
+    failed, it is run again with the next FALLBACKS entry, noting why in
+    job_retries. A /cancel (killed, but not by the supervisor) ends it.
+    """
+    proc = await run({}, [])
+    for attempt, (name, overrides, in_flags) in enumerate(FALLBACKS[:Config.FFMPEG_RETRIES], 1):
+        if isinstance(proc, str) or proc.returncode == 0:
+            break
+        reason = _supervisor_kills.pop(job_id, None)
+        if reason is None:
+            if proc.returncode is None or proc.returncode < 0:
+                break
+            tail = getattr(proc, 'stderr_tail', None)
+            reason = f"ffmpeg exited with code {proc.returncode}" + (f": {tail[-1]}" if tail else '')
+        job_retries.setdefault(job_id, []).append(
+            {'attempt': attempt, 'reason': reason, 'fallback': name, 'ts': time.time()}
+        )
+        logger.warning("Retrying job %s (%s) with %s", job_id, reason, name)
+        try:
+            await msg.edit(
+                f"♻️ <code>{job_id}</code> attempt {attempt} failed: {html.escape(reason)}\n"
+                f"Retrying with {name}…",
+                parse_mode=ParseMode.HTML
+            )
+        except:
+            pass
+        proc = await run(overrides, in_flags)
+    _supervisor_kills.pop(job_id, None)
+    return proc
+
+async def _auto_crf(vid_path: str, sample_vf: list, codec: str, preset: str,
+                    total_dur: float, msg, job_id: str):
+    """Run the sampled CRF search as a cancellable job. Returns the CRF string or None if cancelled."""
+    procs = _ProcGroup(job_usage.setdefault(job_id, new_usage()), preempt.state(job_id))
+    task  = asyncio.create_task(search_crf(vid_path, sample_vf, codec, preset, total_dur, msg, job_id, procs))
+    running_jobs[job_id] = {'proc': procs, 'tasks': [task]}
+    await asyncio.wait([task])
     running_jobs.pop(job_id, None)
+    if task.cancelled():
+        return None
 
-    if proc.returncode == 0:
+    # the default CRF 27 (x264 scale) in the encoder's own scale
+    fallback = encoders.crf_value('libx264', codec, 27)
+    try:
+        crf, quality, metric = task.result()
+    except Exception as e:
+        # a crashed search must not take the worker down: report it and encode anyway
+        logger.exception("Auto-CRF search of %s failed", job_id)
+        crf  = fallback
+        note = f"search failed: {html.escape(str(e) or type(e).__name__)}, falling back to CRF {crf}"
+    else:
+        if crf is None:
+            crf  = fallback
+            note = f"sampling failed, falling back to CRF {crf}"
+        else:
+            note = f"{metric} {quality:.3f}" if metric == 'SSIM' else f"{metric} {quality:.1f}"
+    try:
         await msg.edit(
-            f"✅ Soft-Mux `<code>{job_id}</code>` completed in {round(time.time()-start)}s",
+            f"🎯 Auto-CRF picked <b>{crf}</b> for <code>{job_id}</code> ({note})",
             parse_mode=ParseMode.HTML
         )
-        await asyncio.sleep(2)
-        return output
+    except:
+        pass
+    return str(crf)
+
+async def _encode_video(vid_path: str, out_path: str, vf_args: list, cfg: dict,
+                        msg, job_id: str, start: float, total_dur: float, input_size: int,
+                        sample_vf: list = None, in_flags: list = ()):
+    """
+    Shared encoder for hard-mux / no-sub. Uses CRF by default (size-capped
+    only with CRF_SIZE_CAP), or two-pass ABR sized from the probed duration and audio when the
+    user set a target size. With CRF "auto" the CRF is searched on short samples
+    first (`sample_vf` = filters to apply to them, i.e. without subtitles).
+    Returns the finished process, or an error string.
+    """
+    family = cfg.get('codec','libx264')
+    crf    = cfg.get('crf','27')
+    preset = cfg.get('preset','faster')
+    target = _target_bytes(cfg)
+
+    # fastest installed implementation of the chosen family (one that can do 2-pass if sizing)
+    codec = encoders.resolve(family, two_pass=bool(target)) or encoders.resolve(family)
+    if codec is None:
+        return f"The {family} encoder is not available in this ffmpeg build, pick another codec in /settings."
+
+    head = ['ffmpeg', '-hide_banner', '-progress', 'pipe:2', '-nostats',
+            *in_flags, '-i', vid_path, *vf_args, '-c:v', codec, *encoders.preset_args(codec, preset)]
+    tail = ['-map', '0:v:0', '-map', '0:a:0?', '-c:a', 'copy', *_faststart(out_path), '-y', out_path]
+
+    audio_bps = await _probe_audio_bitrate(vid_path) if total_dur > 0 and (target or Config.CRF_SIZE_CAP) else 0
+
+    if not target:
+        if crf == 'auto':
+            crf = await _auto_crf(vid_path, sample_vf or [], codec, preset, total_dur, msg, job_id)
+            if crf is None:
+                return "Auto-CRF search was cancelled."
+        else:
+            crf = encoders.crf_value(family, codec, crf)
+        # uncapped by default: outputs over TG_MAX_FILE_SIZE are split into parts
+        cap = _video_bitrate_for(Config.TG_MAX_FILE_SIZE, total_dur, audio_bps) if Config.CRF_SIZE_CAP else 0
+        cmd = head + ['-crf', crf, *_crf_cap_args(codec, cap)] + tail
+        return await _run_ffmpeg(cmd, msg, job_id, start, total_dur, input_size)
+
+    if total_dur <= 0:
+        return "Could not probe the video duration, target size mode needs it."
+    v_bps = _video_bitrate_for(target, total_dur, audio_bps)
+    if v_bps < MIN_VIDEO_BITRATE:
+        return (f"Target size {_humanbytes(target)} is too small for "
+                f"{_fmt_time(total_dur)} of video (audio alone needs {_humanrate(audio_bps / 8)}).")
+
+    rate    = ['-b:v', str(v_bps), '-maxrate', str(int(v_bps * 1.5)), '-bufsize', str(v_bps * 2)]
+    if codec not in encoders.TWO_PASS:
+        # only a single-pass implementation is installed: one ABR pass
+        return await _run_ffmpeg(head + rate + tail, msg, job_id, start, total_dur, input_size)
+    logfile = os.path.join(Config.DOWNLOAD_DIR, f"{job_id}_2pass")
+    try:
+        pass1 = head + rate + _pass_args(codec, 1, logfile) + ['-an', '-f', 'null', '-y', os.devnull]
+        proc  = await _run_ffmpeg(pass1, msg, job_id, start, total_dur, input_size, 'Analysis pass 1/2')
+        if proc.returncode != 0:
+            return proc
+        pass2 = head + rate + _pass_args(codec, 2, logfile) + tail
+        return await _run_ffmpeg(pass2, msg, job_id, start, total_dur, input_size, 'Encoding pass 2/2')
+    finally:
+        _cleanup_passlogs(logfile)
+
+async def _smart_hardmux(vid_path: str, sub_path: str, fonts_dir: str, out_path: str, cfg: dict,
+                         msg, job_id: str, start: float, total_dur: float, input_size: int):
+    """
+    Burn subtitles only into the keyframe-aligned ranges that carry events,
+    stream-copy the rest and splice the pieces back together. Every piece
+    carries its own stretch of the first audio track, so the sound follows
+    the spliced timeline; burned pieces are encoded within the source's
+    profile / level / refs so they decode alongside the copied ones.
+    Returns None when the job is not a good fit (caller then falls back to
+    a full encode), else the final process or an error string.
+    """
+    family = cfg.get('codec','libx264')
+    preset = cfg.get('preset','faster')
+    codec  = encoders.resolve(family)
+
+    src = await smart_render.probe_video_stream(vid_path)
+    if total_dur <= 0 or codec is None or not smart_render.eligible(cfg, src, family):
+        return None
+    events = event_times(sub_path)
+    kfs    = await keyframes.index(vid_path)
+    plan   = smart_render.plan_segments(events, kfs, total_dur)
+    share  = smart_render.coverage(plan, total_dur)
+    if share > Config.SMART_RENDER_MAX_COVERAGE:
+        return None
+
+    crf = cfg.get('crf','27')
+    if crf == 'auto':
+        crf = await _auto_crf(vid_path, [], codec, preset, total_dur, msg, job_id)
+        if crf is None:
+            return "Auto-CRF search was cancelled."
     else:
-        err = await proc.stderr.read()
+        crf = encoders.crf_value(family, codec, crf)
+
+    fmt, ext = smart_render.SEGMENT_FORMAT[codec]
+    pix_fmt  = ['-pix_fmt', src['pix_fmt']] if src.get('pix_fmt') else []
+    match    = smart_render.match_args(codec, src)
+    # burned and copied ranges together add up to about the input
+    workdir  = await asyncio.to_thread(storage.workdir, f"{job_id}_smart", input_size)
+    sub_arg  = f"subtitles={sub_path}:fontsdir={fonts_dir}{force_style(sub_path)}"
+
+    try:
         await msg.edit(
-            "❌ Error during soft-mux!\n\n"
-            f"<pre>{err.decode(errors='ignore')}</pre>",
+            f"✂️ Smart-render <code>{job_id}</code>: re-encoding {share * 100:.1f}% of the video "
+            f"in {sum(1 for p in plan if p[2])} range(s), copying the rest.",
             parse_mode=ParseMode.HTML
         )
+        parts = []
+        for i, (s, e, burn) in enumerate(plan, 1):
+            seg = os.path.join(workdir, f"{i:04d}{ext}")
+            cmd = ['ffmpeg', '-hide_banner', '-progress', 'pipe:2', '-nostats',
+                   '-ss', f"{s:.3f}", '-i', vid_path, '-t', f"{e - s:.3f}", '-map', '0:v:0', '-map', '0:a:0?']
+            if burn:
+                # shift frames back onto the source timeline so subtitle timing lines up
+                vf = f"setpts=PTS+{s:.3f}/TB,{sub_arg},setpts=PTS-STARTPTS"
+                cmd += ['-vf', vf, '-c:v', codec, *encoders.preset_args(codec, preset), '-crf', crf,
+                        *pix_fmt, *match, '-c:a', 'copy']
+                label = f"Burning range {i}/{len(plan)}"
+            else:
+                cmd += ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+                label = f"Copying range {i}/{len(plan)}"
+            cmd += ['-f', fmt, '-y', seg]
+            proc = await _run_ffmpeg(cmd, msg, job_id, start, e - s, input_size, label)
+            if proc.returncode != 0:
+                return proc
+            parts.append(seg)
+
+        listfile = os.path.join(workdir, 'concat.txt')
+        with open(listfile, 'w') as f:
+            f.writelines(f"file '{os.path.abspath(p)}'\n" for p in parts)
+        cmd = ['ffmpeg', '-hide_banner', '-progress', 'pipe:2', '-nostats',
+               '-f', 'concat', '-safe', '0', '-i', listfile,
+               '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy', *_faststart(out_path), '-y', out_path]
+        return await _run_ffmpeg(cmd, msg, job_id, start, total_dur, input_size, 'Joining')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+async def _finish(proc, msg, job_id: str, start: float, what: str, output: str):
+    """Report the outcome of an encode and return the output name (or False)."""
+    if isinstance(proc, str):
+        await msg.edit(f"❌ {what} <code>{job_id}</code> not started!\n\n{proc}", parse_mode=ParseMode.HTML)
         return False
+    if proc.returncode == 0:
+        await msg.edit(
+            f"✅ {what} `<code>{job_id}</code>` completed in {round(time.time()-start)}s",
+            parse_mode=ParseMode.HTML
+        )
+        await asyncio.sleep(2)
+        return output
+    # read_stderr has drained the pipe already; it kept the last lines for us
+    err = "\n".join(getattr(proc, 'stderr_tail', None) or [])[-3500:] or f"ffmpeg exited with code {proc.returncode}"
+    await msg.edit(
+        f"❌ Error during {what.lower()}!\n\n"
+        f"<pre>{html.escape(err)}</pre>",
+        parse_mode=ParseMode.HTML
+    )
+    return False
+
+
+# ============ SOFT-MUX ============
+
+def _default_track(tracks: list, choice: str) -> int:
+    """Index of the subtitle track flagged default: 'first', 'none' or a language code."""
+    if choice == 'none':
+        return -1
+    choice = LANGUAGES[choice][0] if choice in LANGUAGES else choice
+    if choice not in ('first', ''):
+        for i, (_, lang, _) in enumerate(tracks):
+            if lang == choice:
+                return i
+    return 0
+
+async def softmux_vid(vid_filename: str, sub_filename: str, msg, job_id: str = None, subs: tuple = (),
+                      cfg: dict = None):
+    """
+    Stream-copy the video and add every subtitle track in one pass. `subs` is
+    ((filename, lang, title), …); without it `sub_filename` is the only track.
+    `msg` only needs `.edit()` (plus `.chat.id` when no `cfg` is passed), so
+    the engine also runs headless with a profile dict as `cfg`.
+    """
+    start    = time.time()
+    cfg      = cfg if cfg is not None else SettingsManager.get(msg.chat.id)
+    vid_path = os.path.join(Config.DOWNLOAD_DIR, vid_filename)
+    base     = os.path.splitext(vid_filename)[0]
+    output   = f"{base}_soft.mkv"
+    out_path = os.path.join(Config.DOWNLOAD_DIR, output)
+    tracks   = list(subs) or [(sub_filename, 'und', '')]
+
+    total_dur  = await _probe_duration(vid_path)
+    input_size = os.path.getsize(vid_path) if os.path.exists(vid_path) else 0
+    # stream copy: the output is about the input plus the subtitles, short clips fit on scratch
+    sub_bytes  = sum(os.path.getsize(os.path.join(Config.DOWNLOAD_DIR, fn)) for fn, _, _ in tracks)
+    await asyncio.to_thread(storage.place, out_path, input_size + sub_bytes, job_id)
+
+    inputs, maps, meta = ['-i', vid_path], [], []
+    for i, (fn, lang, title) in enumerate(tracks):
+        inputs += ['-i', os.path.join(Config.DOWNLOAD_DIR, fn)]
+        maps   += ['-map', f'{i + 1}:0']
+        meta   += [f'-c:s:{i}', os.path.splitext(fn)[1].lstrip('.')]
+        if lang and lang != 'und':
+            meta += [f'-metadata:s:s:{i}', f'language={lang}']
+        if title:
+            meta += [f'-metadata:s:s:{i}', f'title={title}']
+
+    # clear inherited defaults first; the last matching -disposition wins
+    default = _default_track(tracks, cfg.get('default_sub', 'first'))
+    disp = ['-disposition:s', '0']
+    if default >= 0:
+        disp += [f'-disposition:s:{default}', 'default']
+
+    def _cmd(in_flags):
+        return [
+            'ffmpeg', '-hide_banner',
+            '-progress', 'pipe:2', '-nostats',
+            *in_flags, *inputs,
+            *maps, '-map', '0',
+            *disp,
+            '-c:v', 'copy', '-c:a', 'copy',
+            *meta,
+            '-y', out_path,
+        ]
+
+    job_id = job_id or uuid.uuid4().hex[:8]
+    await msg.edit(
+        f"🔄 Soft-Mux job started: <code>{job_id}</code> ({len(tracks)} subtitle track(s))\n"
+        f"Send <code>/cancel {job_id}</code> to abort",
+        parse_mode=ParseMode.HTML
+    )
+
+    async def _run(overrides, in_flags):
+        return await _run_ffmpeg(_cmd(in_flags), msg, job_id, start, total_dur, input_size, 'Muxing')
+
+    proc = await _with_retries(_run, msg, job_id)
+    return await _finish(proc, msg, job_id, start, 'Soft-Mux', output)
 
 
 # ============ HARD-MUX ============
 
-async def hardmux_vid(vid_filename: str, sub_filename: str, msg):
+async def hardmux_vid(vid_filename: str, sub_filename: str, msg, job_id: str = None, cfg: dict = None):
     start    = time.time()
-    cfg      = SettingsManager.get(msg.chat.id)
+    cfg      = cfg if cfg is not None else SettingsManager.get(msg.chat.id)
 
     res    = cfg.get('resolution','1920:1080')
     fps    = cfg.get('fps','original')
-    codec  = cfg.get('codec','libx264')
-    crf    = cfg.get('crf','27')
-    preset = cfg.get('preset','faster')
 
     vid_path = os.path.join(Config.DOWNLOAD_DIR, vid_filename)
     sub_path = os.path.join(Config.DOWNLOAD_DIR, sub_filename)
@@ -235,72 +733,64 @@ async def hardmux_vid(vid_filename: str, sub_filename: str, msg):
     total_dur  = await _probe_duration(vid_path)
     input_size = os.path.getsize(vid_path) if os.path.exists(vid_path) else 0
 
-    vf = [f"subtitles={sub_path}:fontsdir={Config.FONTS_DIR}"]
+    job_id = job_id or uuid.uuid4().hex[:8]
+    if not encoders.has_filter('subtitles'):
+        await msg.edit(
+            f"❌ Hard-Mux <code>{job_id}</code> not started!\n\n"
+            "This ffmpeg build has no <code>subtitles</code> filter (libass).",
+            parse_mode=ParseMode.HTML
+        )
+        return False
+    # libass loads everything in fontsdir up front, so hand it only what this subtitle uses
+    fonts_dir, missing = await asyncio.to_thread(build_fontsdir, sub_path, job_id)
+
+    vf = []
     if res != 'original':
         vf.append(f"scale={res}")
     if fps != 'original':
         vf.append(f"fps={fps}")
-    vf_arg = ",".join(vf)
 
     base     = os.path.splitext(vid_filename)[0]
     output   = f"{base}_hard.mp4"
     out_path = os.path.join(Config.DOWNLOAD_DIR, output)
 
-    proc = await asyncio.create_subprocess_exec(
-        'ffmpeg','-hide_banner',
-        '-progress', 'pipe:2', '-nostats',
-        '-i', vid_path,
-        '-vf', vf_arg,
-        '-c:v', codec, '-preset', preset, '-crf', crf,
-        '-map','0:v:0','-map','0:a:0?',
-        '-c:a','copy',
-        '-y', out_path,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
-    )
-
-    job_id = uuid.uuid4().hex[:8]
-    reader = asyncio.create_task(read_stderr(start, msg, proc, job_id, total_dur, input_size))
-    waiter = asyncio.create_task(proc.wait())
-    running_jobs[job_id] = {'proc': proc, 'tasks': [reader, waiter]}
-
+    warn = ''
+    if missing:
+        warn = ("\n\n⚠️ Fonts not found, they will be substituted: "
+                + ", ".join(f"<code>{html.escape(m)}</code>" for m in missing))
     await msg.edit(
         f"🔄 Hard-Mux job started: <code>{job_id}</code>\n"
-        f"Send <code>/cancel {job_id}</code> to abort",
+        f"Send <code>/cancel {job_id}</code> to abort{warn}",
         parse_mode=ParseMode.HTML
     )
 
-    await asyncio.wait([reader, waiter])
-    running_jobs.pop(job_id, None)
+    async def _run(overrides, in_flags):
+        c = {**cfg, **overrides}
+        # last resort: let libass/fontconfig use the system fonts instead of our fontsdir
+        sub_arg = (f"subtitles={sub_path}" if c.get('fonts') == 'system'
+                   else f"subtitles={sub_path}:fontsdir={fonts_dir}{force_style(sub_path)}")
+        proc = await _smart_hardmux(vid_path, sub_path, fonts_dir, out_path, c, msg, job_id,
+                                    start, total_dur, input_size)
+        if proc is None:
+            proc = await _encode_video(vid_path, out_path, ['-vf', ",".join([sub_arg, *vf])], c, msg, job_id,
+                                       start, total_dur, input_size, sample_vf=vf, in_flags=in_flags)
+        return proc
 
-    if proc.returncode == 0:
-        await msg.edit(
-            f"✅ Hard-Mux `<code>{job_id}</code>` completed in {round(time.time()-start)}s",
-            parse_mode=ParseMode.HTML
-        )
-        await asyncio.sleep(2)
-        return output
-    else:
-        err = await proc.stderr.read()
-        await msg.edit(
-            "❌ Error during hard-mux!\n\n"
-            f"<pre>{err.decode(errors='ignore')}</pre>",
-            parse_mode=ParseMode.HTML
-        )
-        return False
+    try:
+        proc = await _with_retries(_run, msg, job_id)
+    finally:
+        shutil.rmtree(fonts_dir, ignore_errors=True)
+    return await _finish(proc, msg, job_id, start, 'Hard-Mux', output)
 
 
 # ============ NO-SUB (encode only) ============
 
-async def nosub_encode(vid_filename: str, msg):
+async def nosub_encode(vid_filename: str, msg, job_id: str = None, cfg: dict = None):
     start    = time.time()
-    cfg      = SettingsManager.get(msg.chat.id)
+    cfg      = cfg if cfg is not None else SettingsManager.get(msg.chat.id)
 
     res    = cfg.get('resolution','1920:1080')
     fps    = cfg.get('fps','original')
-    codec  = cfg.get('codec','libx264')
-    crf    = cfg.get('crf','27')
-    preset = cfg.get('preset','faster')
 
     vid_path = os.path.join(Config.DOWNLOAD_DIR, vid_filename)
     total_dur  = await _probe_duration(vid_path)
@@ -317,44 +807,227 @@ async def nosub_encode(vid_filename: str, msg):
     output   = f"{base}_enc.mp4"
     out_path = os.path.join(Config.DOWNLOAD_DIR, output)
 
-    proc = await asyncio.create_subprocess_exec(
-        'ffmpeg','-hide_banner',
-        '-progress','pipe:2','-nostats',
-        '-i', vid_path, *vf_args,
-        '-c:v', codec, '-preset', preset, '-crf', crf,
-        '-map','0:v:0','-map','0:a:0?',
-        '-c:a','copy',
-        '-y', out_path,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE
+    job_id = job_id or uuid.uuid4().hex[:8]
+    await msg.edit(
+        f"🔄 Encode (no-sub) job started: <code>{job_id}</code>\n"
+        f"Send <code>/cancel {job_id}</code> to abort",
+        parse_mode=ParseMode.HTML
     )
 
-    job_id = uuid.uuid4().hex[:8]
-    reader = asyncio.create_task(read_stderr(start, msg, proc, job_id, total_dur, input_size))
-    waiter = asyncio.create_task(proc.wait())
-    running_jobs[job_id] = {'proc': proc, 'tasks': [reader, waiter]}
+    async def _run(overrides, in_flags):
+        return await _encode_video(vid_path, out_path, vf_args, {**cfg, **overrides}, msg, job_id, start,
+                                   total_dur, input_size, sample_vf=vf, in_flags=in_flags)
+
+    proc = await _with_retries(_run, msg, job_id)
+    return await _finish(proc, msg, job_id, start, 'Encode', output)
+
+
+# ============ REMUX (container only) ============
+
+async def remux_vid(vid_filename: str, msg, job_id: str = None):
+    """Copy the streams into a new container: a faststart MP4 when the codecs allow it, else MKV."""
+    start    = time.time()
+    vid_path = os.path.join(Config.DOWNLOAD_DIR, vid_filename)
+    total_dur  = await _probe_duration(vid_path)
+    input_size = os.path.getsize(vid_path) if os.path.exists(vid_path) else 0
+    info       = await probe_streams(vid_path)
 
+    base = os.path.splitext(vid_filename)[0]
+    if mp4_compatible(info):
+        output = f"{base}_remux.mp4"
+        maps   = ['-map', '0:v:0', '-map', '0:a?']
+        # hvc1 is the HEVC tag Apple players insist on
+        maps  += ['-tag:v', 'hvc1'] if info.get('video') == 'hevc' else []
+    else:
+        output = f"{base}_remux.mkv"
+        maps   = ['-map', '0']
+    out_path = os.path.join(Config.DOWNLOAD_DIR, output)
+
+    job_id = job_id or uuid.uuid4().hex[:8]
     await msg.edit(
-        f"🔄 Encode (no-sub) job started: <code>{job_id}</code>\n"
+        f"🔄 Remux job started: <code>{job_id}</code> (no re-encoding)\n"
         f"Send <code>/cancel {job_id}</code> to abort",
         parse_mode=ParseMode.HTML
     )
 
-    await asyncio.wait([reader, waiter])
-    running_jobs.pop(job_id, None)
+    async def _run(overrides, in_flags):
+        cmd = ['ffmpeg', '-hide_banner', '-progress', 'pipe:2', '-nostats',
+               *in_flags, '-i', vid_path, *maps, '-c', 'copy', *_faststart(out_path), '-y', out_path]
+        return await _run_ffmpeg(cmd, msg, job_id, start, total_dur, input_size, 'Remuxing')
 
-    if proc.returncode == 0:
+    proc = await _with_retries(_run, msg, job_id)
+    return await _finish(proc, msg, job_id, start, 'Remux', output)
+
+
+# ============ TRIM ============
+
+async def trim_vid(vid_filename: str, msg, job_id: str = None, start_at: float = 0.0, end_at: float = None,
+                   exact: bool = False):
+    """
+    Cut [start_at, end_at) out of the video without a full encode. By default
+    the start snaps back to the keyframe at or before it and everything is
+    stream-copied (seconds, no quality loss). With `exact` only the partial
+    GOPs at both edges are re-encoded (within the source's profile / level /
+    refs) and spliced to the copied middle, so the clip starts and ends on
+    the requested frames; each piece carries its own audio.
+    """
+    start    = time.time()
+    vid_path = os.path.join(Config.DOWNLOAD_DIR, vid_filename)
+    total_dur  = await _probe_duration(vid_path)
+    input_size = os.path.getsize(vid_path) if os.path.exists(vid_path) else 0
+    info       = await probe_streams(vid_path)
+    job_id     = job_id or uuid.uuid4().hex[:8]
+
+    end_at = min(end_at or total_dur, total_dur) if total_dur > 0 else end_at
+    if not end_at or start_at >= end_at:
+        await msg.edit(f"❌ Trim <code>{job_id}</code>: the range is outside the video "
+                       f"(it is {_fmt_hhmmss(total_dur)} long).", parse_mode=ParseMode.HTML)
+        return False
+
+    base   = os.path.splitext(vid_filename)[0]
+    output = f"{base}_trim.mp4" if mp4_compatible(info) else f"{base}_trim.mkv"
+    maps   = ['-tag:v', 'hvc1'] if output.endswith('.mp4') and info.get('video') == 'hevc' else []
+    out_path = os.path.join(Config.DOWNLOAD_DIR, output)
+
+    kfs = await keyframes.index(vid_path)
+    src = await smart_render.probe_video_stream(vid_path)
+    family = smart_render.ENCODER_FOR_CODEC.get(src.get('codec_name'))
+    codec  = encoders.resolve(family) if family else None
+    if exact and (codec is None or not kfs):
+        exact = False
+        note = "\n⚠️ Frame-accurate edges are not possible for this codec, cutting on keyframes."
+    else:
+        note = ''
+
+    if not exact:
+        cut = keyframes.before(kfs, start_at) if kfs else start_at
         await msg.edit(
-            f"✅ Encode `<code>{job_id}</code>` completed in {round(time.time()-start)}s",
+            f"✂️ Trim job started: <code>{job_id}</code> (stream copy)\n"
+            f"{_fmt_hhmmss(cut)} → {_fmt_hhmmss(end_at)}"
+            + (f", start moved back to the keyframe at {cut:.2f}s" if cut < start_at - 0.01 else '')
+            + f"{note}\nSend <code>/cancel {job_id}</code> to abort",
             parse_mode=ParseMode.HTML
         )
-        await asyncio.sleep(2)
-        return output
+
+        async def _run(overrides, in_flags):
+            cmd = ['ffmpeg', '-hide_banner', '-progress', 'pipe:2', '-nostats',
+                   *in_flags, '-ss', f"{cut:.3f}", '-i', vid_path, '-t', f"{end_at - cut:.3f}",
+                   '-map', '0:v:0', '-map', '0:a?', *maps, '-c', 'copy', '-avoid_negative_ts', 'make_zero',
+                   *_faststart(out_path), '-y', out_path]
+            return await _run_ffmpeg(cmd, msg, job_id, start, end_at - cut, input_size, 'Cutting')
+
+        proc = await _with_retries(_run, msg, job_id)
+        return await _finish(proc, msg, job_id, start, 'Trim', output)
+
+    # frame-accurate: [start_at, k1) encoded, [k1, k2) copied, [k2, end_at) encoded
+    k1 = keyframes.after(kfs, start_at)
+    k2 = keyframes.before(kfs, end_at)
+    if k1 is None or k1 >= k2:
+        ranges = [(start_at, end_at, True)]   # inside a single GOP: just encode it
     else:
-        err = await proc.stderr.read()
+        ranges = [(s, e, enc) for s, e, enc in ((start_at, k1, True), (k1, k2, False), (k2, end_at, True))
+                  if e - s > 0.001]
+    encoded = sum(e - s for s, e, enc in ranges if enc)
+    await msg.edit(
+        f"✂️ Trim job started: <code>{job_id}</code> (frame-accurate)\n"
+        f"{_fmt_hhmmss(start_at)} → {_fmt_hhmmss(end_at)}, re-encoding {encoded:.1f}s at the edges\n"
+        f"Send <code>/cancel {job_id}</code> to abort",
+        parse_mode=ParseMode.HTML
+    )
+
+    fmt, ext = smart_render.SEGMENT_FORMAT[codec]
+    pix_fmt  = ['-pix_fmt', src['pix_fmt']] if src.get('pix_fmt') else []
+    match    = smart_render.match_args(codec, src)
+    crf      = encoders.crf_value('libx264', codec, 18)   # edges must not stand out next to the copied middle
+    workdir  = await asyncio.to_thread(storage.workdir, f"{job_id}_trim",
+                                       int(input_size * (end_at - start_at) / max(total_dur, 1e-3)))
+    try:
+        parts = []
+        for i, (s, e, enc) in enumerate(ranges, 1):
+            seg = os.path.join(workdir, f"{i:04d}{ext}")
+            cmd = ['ffmpeg', '-hide_banner', '-progress', 'pipe:2', '-nostats',
+                   '-ss', f"{s:.3f}", '-i', vid_path, '-t', f"{e - s:.3f}", '-map', '0:v:0', '-map', '0:a?']
+            if enc:
+                cmd += ['-c:v', codec, *encoders.preset_args(codec, 'medium'), '-crf', crf,
+                        *pix_fmt, *match, '-c:a', 'copy']
+                label = f"Encoding edge {i}/{len(ranges)}"
+            else:
+                cmd += ['-c', 'copy', '-avoid_negative_ts', 'make_zero']
+                label = f"Copying {i}/{len(ranges)}"
+            cmd += ['-f', fmt, '-y', seg]
+            proc = await _run_ffmpeg(cmd, msg, job_id, start, e - s, input_size, label)
+            if proc.returncode != 0:
+                return await _finish(proc, msg, job_id, start, 'Trim', output)
+            parts.append(seg)
+
+        listfile = os.path.join(workdir, 'concat.txt')
+        with open(listfile, 'w') as f:
+            f.writelines(f"file '{os.path.abspath(p)}'\n" for p in parts)
+        cmd = ['ffmpeg', '-hide_banner', '-progress', 'pipe:2', '-nostats',
+               '-f', 'concat', '-safe', '0', '-i', listfile,
+               '-map', '0:v:0', '-map', '0:a?', *maps, '-c', 'copy', *_faststart(out_path), '-y', out_path]
+        proc = await _run_ffmpeg(cmd, msg, job_id, start, end_at - start_at, input_size, 'Joining')
+        return await _finish(proc, msg, job_id, start, 'Trim', output)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+# ============ SPLIT ============
+
+def split_points(keyframes_: list, duration: float, per_part: float) -> list:
+    """Keyframe times to cut at so no part runs much longer than `per_part` seconds."""
+    cuts, target = [], per_part
+    while target < duration - 1:
+        cut = keyframes.before(keyframes_, target) if keyframes_ else target
+        if (cuts and cut <= cuts[-1]) or cut <= 0:
+            # a GOP longer than a part: cut at the next keyframe instead
+            cut = keyframes.after(keyframes_, (cuts[-1] if cuts else 0) + 0.01)
+            if cut is None or cut >= duration:
+                break
+        cuts.append(cut)
+        target = cut + per_part
+    return cuts
+
+async def split_vid(out_filename: str, msg, job_id: str, limit: int = None) -> list:
+    """
+    Cut a finished output that is over `limit` bytes (Telegram's upload limit)
+    into stream-copied parts with ffmpeg's segment muxer, cutting on
+    keyframes sized from the average bitrate. Parts that still come out too
+    big (bitrate peaks) are redone with more headroom. Returns the part file
+    names in order, or [] if it could not be split.
+    """
+    start    = time.time()
+    limit    = limit or Config.TG_MAX_FILE_SIZE
+    path     = os.path.join(Config.DOWNLOAD_DIR, out_filename)
+    size     = os.path.getsize(path)
+    total_dur = await _probe_duration(path)
+    if total_dur <= 0:
+        return []
+    kfs = await keyframes.index(path)
+    base, ext = os.path.splitext(out_filename)
+    fmt_args  = ['-segment_format', 'mp4', '-segment_format_options', 'movflags=+faststart'] \
+        if ext == '.mp4' else ['-segment_format', 'matroska']
+    pattern   = os.path.join(Config.DOWNLOAD_DIR, f"{base}.part%02d{ext}")
+
+    for headroom in (0.95, 0.85, 0.7):
+        cuts = split_points(kfs, total_dur, total_dur * limit * headroom / size)
         await msg.edit(
-            "❌ Error during encode!\n\n"
-            f"<pre>{err.decode(errors='ignore')}</pre>",
+            f"✂️ <code>{job_id}</code>: the output is {_humanbytes(size)}, over the upload limit. "
+            f"Splitting it into {len(cuts) + 1} parts (no re-encoding)…",
             parse_mode=ParseMode.HTML
         )
-        return False
+        cmd = ['ffmpeg', '-hide_banner', '-progress', 'pipe:2', '-nostats', '-i', path,
+               '-map', '0', '-c', 'copy', '-f', 'segment', *fmt_args,
+               '-segment_times', ','.join(f"{c:.3f}" for c in cuts),
+               '-segment_start_number', '1', '-reset_timestamps', '1', '-y', pattern]
+        proc  = await _run_ffmpeg(cmd, msg, job_id, start, total_dur, size, 'Splitting')
+        parts = sorted(glob.glob(os.path.join(Config.DOWNLOAD_DIR, glob.escape(base) + '.part[0-9][0-9]' + ext)))
+        if proc.returncode == 0 and parts and all(os.path.getsize(p) <= limit for p in parts):
+            keyframes.forget(path)
+            return [os.path.basename(p) for p in parts]
+        for p in parts:
+            os.remove(p)
+        if proc.returncode != 0:
+            break
+    keyframes.forget(path)
+    return []
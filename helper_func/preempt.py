@@ -0,0 +1,65 @@
+# helper_func/preempt.py
+
+import time, signal, asyncio
+
+
+class PauseState:
+    """Pause bookkeeping of one job; `resumed` is set whenever the job may run."""
+
+    def __init__(self):
+        self.since   = None     # start of the current pause
+        self.total   = 0.0      # seconds spent in earlier pauses
+        self.resumed = asyncio.Event()
+        self.resumed.set()
+
+    @property
+    def paused(self) -> bool:
+        return self.since is not None
+
+    def seconds(self) -> float:
+        """Time the job has spent paused so far, the current pause included."""
+        return self.total + (time.time() - self.since if self.since is not None else 0.0)
+
+
+# job_id -> PauseState, for jobs that were paused at least once
+job_pauses: dict[str, PauseState] = {}
+
+
+def state(job_id: str) -> PauseState:
+    return job_pauses.setdefault(job_id, PauseState())
+
+
+def signal_procs(target, sig: int):
+    """Send `sig` to a process or to every live process of a list (crf_search._ProcGroup)."""
+    for proc in (target if isinstance(target, list) else [target]):
+        if proc.returncode is None:
+            try:
+                proc.send_signal(sig)
+            except ProcessLookupError:
+                pass
+
+
+def pause(job_id: str, target=None) -> bool:
+    """SIGSTOP the job's ffmpeg (`target`, if one is running) and hold back the ones it starts next."""
+    st = state(job_id)
+    if st.paused:
+        return False
+    st.since = time.time()
+    st.resumed.clear()
+    if target is not None:
+        signal_procs(target, signal.SIGSTOP)
+    return True
+
+
+def resume(job_id: str, target=None) -> float:
+    """SIGCONT the job again. Returns how long this pause lasted."""
+    st = job_pauses.get(job_id)
+    if st is None or not st.paused:
+        return 0.0
+    paused_for = time.time() - st.since
+    st.total  += paused_for
+    st.since   = None
+    if target is not None:
+        signal_procs(target, signal.SIGCONT)
+    st.resumed.set()
+    return paused_for
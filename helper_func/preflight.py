@@ -0,0 +1,261 @@
+# helper_func/preflight.py
+
+import os, re, json, shutil, hashlib, unicodedata
+from config import Config
+from helper_func.subtitles import srt_time_pattern, _srt_ts, ass_ts, event_times
+from helper_func.fonts import fallback_font
+
+try:
+    from charset_normalizer import from_bytes   # installed alongside requests
+except ImportError:
+    from_bytes = None
+
+CACHE_DIR = os.path.join(Config.DOWNLOAD_DIR, 'sub_cache')
+MAX_BYTES = 10 * 1024 * 1024     # anything bigger is not a subtitle file
+MIN_CUE   = 0.5                  # seconds given to cues whose end is before their start
+
+ass_dialogue_pattern = re.compile(r'^(Dialogue:[^,]*,)([^,]*),([^,]*)(,.*)$', re.IGNORECASE)
+
+# {font}: the shipped fallback font, so converted subtitles never ask for one we lack
+ASS_HEADER = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 1920
+PlayResY: 1080
+WrapStyle: 0
+ScaledBorderAndShadow: yes
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,{font},64,&H00FFFFFF,&H000000FF,&H00000000,&H80000000,0,0,0,0,100,100,0,0,1,3,1,2,60,60,50,1
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+"""
+
+
+class SubtitleError(Exception):
+    """The file cannot be used as a subtitle; the message says why."""
+
+
+# ---------- decoding ----------
+
+def _mojibake(text: str) -> int:
+    """Control / replacement characters a wrong guess typically produces."""
+    return sum(1 for ch in text if ch == '�' or (unicodedata.category(ch) == 'Cc' and ch not in '\r\n\t'))
+
+def decode(raw: bytes) -> tuple:
+    """(text, encoding). BOMs, BOM-less UTF-16 and valid UTF-8 first, then charset detection, then cp1252."""
+    for bom, enc in ((b'\xef\xbb\xbf', 'utf-8-sig'), (b'\xff\xfe', 'utf-16'), (b'\xfe\xff', 'utf-16')):
+        if raw.startswith(bom):
+            return raw.decode(enc), enc
+    # BOM-less UTF-16 before UTF-8: mostly-ASCII UTF-16 is valid UTF-8 full of NULs
+    if raw[1::2].count(0) > len(raw) // 4:
+        try:
+            return raw.decode('utf-16-le'), 'utf-16-le'
+        except UnicodeDecodeError:
+            pass
+    try:
+        return raw.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        pass
+    if from_bytes is not None:
+        best = from_bytes(raw).best()
+        if best is not None:
+            return str(best), best.encoding
+    text = raw.decode('cp1252', errors='replace')
+    if _mojibake(text) > len(text) // 100:
+        raise SubtitleError("unknown text encoding")
+    # Cyrillic read as cp1252 is almost all À-ÿ letters, western text mostly ASCII ones
+    high = sum(1 for ch in text if '\u00c0' <= ch <= '\u00ff')
+    if high > sum(1 for ch in text if ch.isascii() and ch.isalpha()):
+        return raw.decode('cp1251', errors='replace'), 'cp1251'
+    return text, 'cp1252'
+
+
+# ---------- timing ----------
+
+def _fmt_srt(t: float) -> str:
+    ms = int(round(max(0.0, t) * 1000))
+    return f"{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d},{ms % 1000:03d}"
+
+def _fmt_ass(t: float) -> str:
+    cs = int(round(max(0.0, t) * 100))
+    return f"{cs // 360000}:{cs // 6000 % 60:02d}:{cs // 100 % 60:02d}.{cs % 100:02d}"
+
+def _fix_times(start: float, end: float, repairs: list) -> tuple:
+    if start < 0 or end < 0:
+        repairs.append('negative time')
+        start, end = max(0.0, start), max(0.0, end)
+    if end <= start:
+        repairs.append('end before start')
+        end = start + MIN_CUE
+    return start, end
+
+def parse_srt(text: str, repairs: list) -> list:
+    """[(start, end, text)] sorted by start; broken cues are repaired or dropped (noted in `repairs`)."""
+    cues = []
+    for block in re.split(r'\n\s*\n', text.replace('\r\n', '\n').replace('\r', '\n')):
+        lines = [l for l in block.strip().split('\n')]
+        for i, line in enumerate(lines[:3]):
+            m = srt_time_pattern.search(line)
+            if m:
+                break
+        else:
+            if block.strip():
+                repairs.append('unreadable cue dropped')
+            continue
+        body = '\n'.join(l.rstrip() for l in lines[i + 1:]).strip()
+        if not body:
+            repairs.append('empty cue dropped')
+            continue
+        g = m.groups()
+        start, end = _fix_times(_srt_ts(*g[:4]), _srt_ts(*g[4:]), repairs)
+        cues.append((start, end, body))
+    if any(cues[i][0] > cues[i + 1][0] for i in range(len(cues) - 1)):
+        repairs.append('cues out of order')
+        cues.sort(key=lambda c: c[0])
+    return cues
+
+def write_srt(cues: list) -> str:
+    return ''.join(f"{n}\n{_fmt_srt(s)} --> {_fmt_srt(e)}\n{body}\n\n" for n, (s, e, body) in enumerate(cues, 1))
+
+def repair_ass(text: str, repairs: list) -> str:
+    """Fix Dialogue lines whose timestamps are unreadable (dropped) or reversed; the rest is untouched."""
+    if '[events]' not in text.lower():
+        raise SubtitleError("ASS file has no [Events] section")
+    out = []
+    for line in text.replace('\r\n', '\n').replace('\r', '\n').split('\n'):
+        m = ass_dialogue_pattern.match(line.strip())
+        if m:
+            try:
+                start, end = ass_ts(m.group(2)), ass_ts(m.group(3))
+            except ValueError:
+                repairs.append('unreadable cue dropped')
+                continue
+            fixed = _fix_times(start, end, repairs)
+            if fixed != (start, end):
+                line = f"{m.group(1)}{_fmt_ass(fixed[0])},{_fmt_ass(fixed[1])}{m.group(4)}"
+        out.append(line)
+    return '\n'.join(out)
+
+
+# ---------- SRT -> ASS ----------
+
+def _srt_markup_to_ass(body: str) -> str:
+    def color(m):
+        rgb = m.group(1)
+        return '{\\c&H%s%s%s&}' % (rgb[4:6], rgb[2:4], rgb[0:2])
+    body = body.replace('{', '(').replace('}', ')')
+    for tag, code in (('i', 'i'), ('b', 'b'), ('u', 'u'), ('s', 's')):
+        body = re.sub(rf'<{tag}>', f'{{\\\\{code}1}}', body, flags=re.IGNORECASE)
+        body = re.sub(rf'</{tag}>', f'{{\\\\{code}0}}', body, flags=re.IGNORECASE)
+    body = re.sub(r'<font[^>]*color="?#?([0-9a-fA-F]{6})"?[^>]*>', color, body, flags=re.IGNORECASE)
+    body = re.sub(r'</font>', '{\\\\c}', body, flags=re.IGNORECASE)
+    body = re.sub(r'<[^>]+>', '', body)
+    return body.replace('\n', '\\N')
+
+def _style_font() -> str:
+    return fallback_font() or Config.SUB_FALLBACK_FONT
+
+def srt_to_ass(cues: list) -> str:
+    lines = [f"Dialogue: 0,{_fmt_ass(s)},{_fmt_ass(e)},Default,,0,0,0,,{_srt_markup_to_ass(body)}"
+             for s, e, body in cues]
+    return ASS_HEADER.format(font=_style_font()) + '\n'.join(lines) + '\n'
+
+
+# ---------- entry points ----------
+
+def preflight(path: str, to_ass: bool = False) -> dict:
+    """
+    Check and normalise the subtitle at `path`: decode to UTF-8, repair
+    timings and (with `to_ass`) turn SRT into styled ASS. The result replaces
+    the upload (an SRT converted to ASS gets a new '.ass' path) and is cached
+    by content hash, so a re-sent file costs one copy. Raises SubtitleError.
+    Returns {'path', 'encoding', 'events', 'repairs', 'first', 'last', 'cached'}.
+    """
+    if os.path.getsize(path) > MAX_BYTES:
+        raise SubtitleError("file is too large to be a subtitle")
+    with open(path, 'rb') as f:
+        raw = f.read()
+    base, ext = os.path.splitext(path)
+    ext = ext.lower()
+    # conversions made with another style font are not reused
+    key = hashlib.sha1(raw + (f'|ass|{_style_font()}'.encode() if to_ass else b'')).hexdigest()
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    meta_path = os.path.join(CACHE_DIR, key + '.json')
+
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            info = json.load(f)
+        cached_path = os.path.join(CACHE_DIR, key + info['ext'])
+        if os.path.exists(cached_path):
+            if info.get('error'):
+                raise SubtitleError(info['error'])
+            out = base + info['ext']
+            shutil.copyfile(cached_path, out)
+            if out != path:
+                os.remove(path)
+            return {**info, 'path': out, 'cached': True}
+
+    repairs = []
+    try:
+        text, encoding = decode(raw)
+        if ext == '.ass' or '[events]' in text.lower():
+            out_ext, body = '.ass', repair_ass(text, repairs)
+        else:
+            cues = parse_srt(text, repairs)
+            if not cues:
+                raise SubtitleError("no readable subtitle lines")
+            out_ext, body = ('.ass', srt_to_ass(cues)) if to_ass else ('.srt', write_srt(cues))
+    except SubtitleError as e:
+        with open(meta_path, 'w') as f:
+            json.dump({'ext': ext, 'error': str(e)}, f)
+        shutil.copyfile(path, os.path.join(CACHE_DIR, key + ext))
+        raise
+
+    out = base + out_ext
+    with open(out, 'w', encoding='utf-8') as f:
+        f.write(body)
+    if out != path:
+        os.remove(path)
+    events = event_times(out)
+    if not events:
+        raise SubtitleError("no readable subtitle lines")
+
+    info = {
+        'ext': out_ext, 'encoding': encoding, 'events': len(events),
+        'repairs': sorted(set(repairs)), 'first': events[0][0], 'last': max(e for _, e in events),
+    }
+    shutil.copyfile(out, os.path.join(CACHE_DIR, key + out_ext))
+    with open(meta_path, 'w') as f:
+        json.dump(info, f)
+    return {**info, 'path': out, 'cached': False}
+
+def coverage(path: str, duration: float) -> tuple:
+    """
+    (share of the video's runtime with a subtitle on screen, problem or None).
+    The problem is set when the subtitle clearly belongs to a different video.
+    """
+    events = event_times(path)
+    if not events:
+        return 0.0, "it has no readable subtitle lines"
+    if duration <= 0:
+        return 0.0, None
+    covered, cur_s, cur_e = 0.0, None, None
+    for s, e in events:
+        s, e = min(s, duration), min(e, duration)
+        if cur_e is None or s > cur_e:
+            if cur_e is not None:
+                covered += cur_e - cur_s
+            cur_s, cur_e = s, e
+        else:
+            cur_e = max(cur_e, e)
+    covered += cur_e - cur_s
+    share = covered / duration
+
+    late = sum(1 for s, _ in events if s >= duration)
+    if late == len(events):
+        return share, "every line starts after the video ends"
+    if late > 2 and late / len(events) > 0.2:
+        return share, f"{late} of {len(events)} lines start after the video ends (wrong episode or frame rate?)"
+    return share, None
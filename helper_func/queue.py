@@ -1,17 +1,183 @@
 # helper_func/queue.py
 
+import time
 import asyncio
 import uuid
+from collections import deque
+from types import SimpleNamespace
 from typing import NamedTuple
-from pyrogram.types import Message
+from helper_func import jobevents
 
 class Job(NamedTuple):
     job_id: str         # unique short ID
-    mode: str           # "soft" or "hard"
+    mode: str           # "soft", "hard", "nosub", "remux" or "trim"
     chat_id: int
     vid: str            # input video filename
     sub: str            # input subtitle filename
     final_name: str     # the filename to rename→upload
-    status_msg: Message # the message we’ll keep editing for progress
+    status_msg_id: int  # id of the message we’ll keep editing for progress
+    batch_id: str = None  # set when the job belongs to a /batch
+    subs: tuple = ()      # soft-mux: ((filename, lang, title), …) when several tracks were sent
+    trim: tuple = ()      # trim: (start, end, exact)
+    cfg: dict = None      # settings given with the job (HTTP API); None = the user's /settings
 
-job_queue: asyncio.Queue[Job] = asyncio.Queue()
+
+class StatusMessage:
+    """
+    Stand-in for a pyrogram Message that only knows (chat_id, message_id).
+    Queued jobs keep just the ids; the worker wraps them in this to get the
+    `.edit()` / `.chat.id` the mux helpers and progress_bar expect.
+    """
+    def __init__(self, client, chat_id: int, message_id: int, job_id: str = None):
+        self._client = client
+        self.chat = SimpleNamespace(id=chat_id)
+        self.id = message_id
+        self.job_id = job_id
+
+    async def edit(self, text: str, **kwargs):
+        if self.job_id:
+            jobevents.status(self.job_id, text)
+        return await self._client.edit_message_text(self.chat.id, self.id, text, **kwargs)
+
+    edit_text = edit
+
+
+class JobQueue:
+    """
+    FIFO of Jobs indexed by job_id and chat_id.
+
+    Cancelling only drops the job from the indexes (O(1)); its id stays in the
+    run order as a tombstone and is skipped when the worker reaches it.
+    """
+    def __init__(self):
+        self._order = deque()                 # job ids in run order, may hold tombstones
+        self._jobs: dict[str, Job] = {}       # live queued jobs
+        self._by_chat: dict[int, set] = {}
+        self.running: dict[str, Job] = {}     # jobs the worker has picked up
+        self.queued_at: dict[str, float] = {} # job_id -> time it entered the queue (for job traces)
+        self.urgent: set = set()              # queued job ids an admin marked with /urgent
+        self._wakeup = None
+        # journal hooks: on_change(job, state) on every transition, on_reorder(job_ids) after /move
+        self.on_change = None
+        self.on_reorder = None
+
+    def _event(self) -> asyncio.Event:
+        if self._wakeup is None:
+            self._wakeup = asyncio.Event()
+        return self._wakeup
+
+    def _changed(self, job: Job, state: str):
+        jobevents.publish(job.job_id, 'state', state=state)
+        if self.on_change:
+            self.on_change(job, state)
+
+    def qsize(self) -> int:
+        return len(self._jobs)
+
+    def empty(self) -> bool:
+        return not self._jobs
+
+    def put_nowait(self, job: Job):
+        self._jobs[job.job_id] = job
+        self._by_chat.setdefault(job.chat_id, set()).add(job.job_id)
+        self._order.append(job.job_id)
+        self.queued_at[job.job_id] = time.time()
+        self._changed(job, 'queued')
+        self._event().set()
+
+    async def put(self, job: Job):
+        self.put_nowait(job)
+
+    def _pop_live(self):
+        while self._order:
+            job_id = self._order.popleft()
+            job = self._jobs.pop(job_id, None)
+            if job:
+                self._by_chat.get(job.chat_id, set()).discard(job_id)
+                return job
+        return None
+
+    async def get(self) -> Job:
+        """Wait for the next live job and mark it running."""
+        while True:
+            job = self._pop_live()
+            if job:
+                self.running[job.job_id] = job
+                self._changed(job, 'running')
+                return job
+            self._event().clear()
+            await self._event().wait()
+
+    def take(self, job_id: str):
+        """Start a specific queued job out of order (preemption). Returns the Job or None."""
+        job = self._jobs.pop(job_id, None)
+        if job:
+            self._by_chat.get(job.chat_id, set()).discard(job_id)
+            self.urgent.discard(job_id)
+            self.running[job_id] = job
+            self._changed(job, 'running')
+        return job
+
+    def mark_urgent(self, job_id: str) -> bool:
+        """Let a queued job preempt the running one (and go first otherwise)."""
+        if not self.move(job_id, 1):
+            return False
+        self.urgent.add(job_id)
+        self._event().set()
+        return True
+
+    async def wait_new(self):
+        """Return once a job is queued (the worker uses it to look for preemption candidates)."""
+        await self._event().wait()
+        self._event().clear()
+
+    def done(self, job_id: str, outcome: str = 'done'):
+        """The worker finished a job; outcome is 'done', 'failed' or 'cancelled'."""
+        job = self.running.pop(job_id, None)
+        self.queued_at.pop(job_id, None)
+        if job:
+            self._changed(job, outcome)
+
+    def get_job(self, job_id: str):
+        return self._jobs.get(job_id) or self.running.get(job_id)
+
+    def cancel(self, job_id: str):
+        """Drop a queued job (O(1)). Returns the Job, or None if it is not queued."""
+        job = self._jobs.pop(job_id, None)
+        if job:
+            self._by_chat.get(job.chat_id, set()).discard(job_id)
+            self.queued_at.pop(job_id, None)
+            self.urgent.discard(job_id)
+            self._changed(job, 'cancelled')
+        return job
+
+    def live_order(self) -> list:
+        """Queued job ids in run order (drops tombstones while at it)."""
+        self._order = deque(i for i in self._order if i in self._jobs)
+        return list(self._order)
+
+    def position(self, job_id: str) -> int:
+        """1-based queue position, 0 if the job is not queued."""
+        if job_id not in self._jobs:
+            return 0
+        return self.live_order().index(job_id) + 1
+
+    def jobs_for(self, chat_id: int) -> list:
+        """[(position, Job)] of a chat's queued jobs, in run order."""
+        mine = self._by_chat.get(chat_id, set())
+        return [(pos, self._jobs[i]) for pos, i in enumerate(self.live_order(), 1) if i in mine]
+
+    def move(self, job_id: str, position: int) -> bool:
+        """Put a queued job at `position` (1 = next to run)."""
+        if job_id not in self._jobs:
+            return False
+        order = self.live_order()
+        order.remove(job_id)
+        order.insert(max(0, min(position - 1, len(order))), job_id)
+        self._order = deque(order)
+        if self.on_reorder:
+            self.on_reorder(order)
+        return True
+
+
+job_queue = JobQueue()
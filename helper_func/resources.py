@@ -0,0 +1,79 @@
+# helper_func/resources.py
+
+import os, asyncio
+
+_CLK_TCK = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+USAGE_FIELDS = ('cpu_user', 'cpu_sys', 'peak_rss', 'read_bytes', 'write_bytes', 'wall')
+
+
+def new_usage() -> dict:
+    return {k: 0 for k in USAGE_FIELDS}
+
+
+def sample(pid: int) -> dict:
+    """
+    One /proc snapshot of a child: CPU seconds (user/sys), peak RSS (bytes)
+    and storage bytes read/written. Missing files (process gone, non-Linux)
+    just leave fields out.
+    """
+    snap = {}
+    try:
+        with open(f'/proc/{pid}/stat') as f:
+            # comm may contain spaces, fields resume after the closing ')'
+            fields = f.read().rsplit(')', 1)[1].split()
+        snap['cpu_user'] = int(fields[11]) / _CLK_TCK
+        snap['cpu_sys']  = int(fields[12]) / _CLK_TCK
+    except (OSError, IndexError, ValueError):
+        return snap
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    snap['peak_rss'] = int(line.split()[1]) * 1024
+                    break
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(f'/proc/{pid}/io') as f:
+            for line in f:
+                k, _, v = line.partition(':')
+                if k in ('read_bytes', 'write_bytes'):
+                    snap[k] = int(v)
+    except (OSError, ValueError):
+        pass
+    return snap
+
+
+async def track(pid: int, usage: dict, interval: float = 0.5):
+    """
+    Sample `pid` until it exits (or the task is cancelled) and fold the last
+    reading into `usage`. asyncio reaps children itself, so wait4() rusage is
+    not available to us; the final reading may miss the last `interval`.
+    """
+    last = {}
+    loop_start = asyncio.get_running_loop().time()
+    try:
+        while True:
+            snap = sample(pid)
+            if not snap:
+                break
+            last = snap
+            await asyncio.sleep(interval)
+    finally:
+        add(usage, {**last, 'wall': asyncio.get_running_loop().time() - loop_start})
+
+
+def add(total: dict, part: dict):
+    """Sum `part` into `total` (peak RSS is a max, not a sum)."""
+    for k in USAGE_FIELDS:
+        v = part.get(k, 0) or 0
+        if k == 'peak_rss':
+            total[k] = max(total.get(k, 0), v)
+        else:
+            total[k] = total.get(k, 0) + v
+    return total
+
+
+def cpu_seconds(usage: dict) -> float:
+    return (usage.get('cpu_user', 0) or 0) + (usage.get('cpu_sys', 0) or 0)
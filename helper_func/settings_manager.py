@@ -1,31 +1,51 @@
 import json
 import os
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from config import Config
 
 class SettingsManager:
     """Simple per-user JSON storage for encoding settings."""
     STORAGE = os.path.join(Config.DOWNLOAD_DIR, 'user_settings.json')
 
+    # kept in memory after the first read; writes go to disk off the event loop
+    _cache = None
+    _write_lock = threading.Lock()
+    # one writer thread, so snapshots reach the disk in the order they were taken
+    _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='settings')
+
     @classmethod
     def _load_all(cls):
-        if not os.path.exists(cls.STORAGE):
-            return {}
-        with open(cls.STORAGE, 'r') as f:
-            return json.load(f)
+        if cls._cache is None:
+            if not os.path.exists(cls.STORAGE):
+                cls._cache = {}
+            else:
+                with open(cls.STORAGE, 'r') as f:
+                    cls._cache = json.load(f)
+        return cls._cache
 
     @classmethod
     def _save_all(cls, data):
-        with open(cls.STORAGE, 'w') as f:
-            json.dump(data, f, indent=2)
+        with cls._write_lock:
+            tmp = cls.STORAGE + '.tmp'
+            with open(tmp, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp, cls.STORAGE)
 
     @classmethod
     def get(cls, user_id):
         """Return dict or {}."""
-        return cls._load_all().get(str(user_id), {})
+        return dict(cls._load_all().get(str(user_id), {}))
 
     @classmethod
     def set(cls, user_id, key, value):
         all_data = cls._load_all()
         user_data = all_data.setdefault(str(user_id), {})
         user_data[key] = value
-        cls._save_all(all_data)
+        snapshot = json.loads(json.dumps(all_data))
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return cls._save_all(snapshot)
+        loop.run_in_executor(cls._writer, cls._save_all, snapshot)
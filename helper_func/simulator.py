@@ -0,0 +1,258 @@
+# helper_func/simulator.py
+"""
+Replay recorded jobs (the job_trace table the queue worker fills, or a
+JSON-lines export of it) against other queue policies and worker / host
+counts, offline.
+
+  python -m helper_func.simulator --workers 1,2,4 --policy fifo,fair,sjf
+  python -m helper_func.simulator --trace week.jsonl --hosts 1,2 --workers 2 --cores 4
+  python -m helper_func.simulator --days 7 --export week.jsonl
+
+Every job arrives when it was queued and then holds a worker for its recorded
+fetch (lazy-ingest download) + encode + upload time. Uploads and downloads
+before the queue are assumed not to contend for bandwidth. Encodes were
+recorded with one worker per host; with --cores, running more workers than
+cores on a host stretches every encode by workers / cores.
+"""
+
+import sys, json, time, heapq, argparse, itertools
+from collections import deque, defaultdict
+from typing import NamedTuple
+
+
+class TraceJob(NamedTuple):
+    job_id: str
+    user_id: int
+    mode: str
+    size: int
+    arrival: float      # when it was queued
+    fetch: float        # worker time spent waiting for a lazily ingested input
+    encode: float       # ffmpeg work incl. splitting
+    upload: float
+    wait: float         # recorded queue wait (for comparing with the fifo / 1 worker replay)
+
+    @property
+    def service(self) -> float:
+        return self.fetch + self.encode + self.upload
+
+
+# ---------- traces ----------
+
+def _job(row: dict) -> TraceJob:
+    return TraceJob(row['job_id'], row['user_id'], row['mode'], row['size'] or 0, row['queued_at'],
+                    row['fetch_s'] or 0.0, row['encode_s'] or 0.0, row['upload_s'] or 0.0, row['wait_s'] or 0.0)
+
+FIELDS = ('job_id', 'user_id', 'mode', 'size', 'queued_at', 'download_s', 'wait_s', 'fetch_s', 'encode_s',
+          'upload_s', 'outcome', 'finished_at')
+
+def load_db(since: float = 0) -> list:
+    from helper_func.dbhelper import Database as Db
+    db = Db()
+    db.setup()
+    return [dict(zip(FIELDS, row)) for row in db.trace_rows(since)]
+
+def load_jsonl(path: str) -> list:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ---------- policies ----------
+
+class Fifo:
+    """What JobQueue does today: strict arrival order."""
+
+    def __init__(self):
+        self._q = deque()
+
+    def push(self, job: TraceJob, now: float):
+        self._q.append(job)
+
+    def pop(self, now: float) -> TraceJob:
+        return self._q.popleft()
+
+    def observe(self, job: TraceJob, service: float):
+        pass
+
+    def __len__(self):
+        return len(self._q)
+
+
+class ShortestFirst(Fifo):
+    """
+    Shortest predicted job first. Predictions come from per-mode seconds per
+    byte learned from finished jobs (the ingest scheduler's EWMA), never from
+    the job's own recorded duration.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._seq  = itertools.count()
+        self._rate = {}
+
+    def _predict(self, job: TraceJob) -> float:
+        return job.size * self._rate.get(job.mode, self._rate.get('hard', 1e-6))
+
+    def push(self, job, now):
+        heapq.heappush(self._heap, (self._predict(job), next(self._seq), job))
+
+    def pop(self, now):
+        return heapq.heappop(self._heap)[2]
+
+    def observe(self, job, service):
+        if job.size > 0:
+            old = self._rate.get(job.mode, service / job.size)
+            self._rate[job.mode] = 0.7 * old + 0.3 * service / job.size
+
+    def __len__(self):
+        return len(self._heap)
+
+
+class FairShare(Fifo):
+    """Per-user queues; the waiting user who got the least worker time so far goes next."""
+
+    def __init__(self):
+        self._queues = defaultdict(deque)
+        self._served = defaultdict(float)
+        self._count  = 0
+
+    def push(self, job, now):
+        self._queues[job.user_id].append(job)
+        self._count += 1
+
+    def pop(self, now):
+        user = min((u for u, q in self._queues.items() if q), key=lambda u: self._served[u])
+        self._count -= 1
+        return self._queues[user].popleft()
+
+    def observe(self, job, service):
+        self._served[job.user_id] += service
+
+    def __len__(self):
+        return self._count
+
+
+POLICIES = {'fifo': Fifo, 'sjf': ShortestFirst, 'fair': FairShare}
+
+
+# ---------- simulation ----------
+
+def simulate(jobs: list, policy, workers: int = 1, hosts: int = 1, cores: int = None) -> list:
+    """Discrete-event replay. Returns [(job, wait, service)] in completion order."""
+    stretch = max(1.0, workers / cores) if cores else 1.0
+    events  = [(j.arrival, 0, next_id, 'arrive', j) for next_id, j in enumerate(jobs)]
+    heapq.heapify(events)
+    seq, free, done = itertools.count(len(jobs)), workers * hosts, []
+
+    while events:
+        now, _, _, kind, job = heapq.heappop(events)
+        if kind == 'arrive':
+            policy.push(job, now)
+        else:
+            free += 1
+            policy.observe(job[0], job[2])
+            done.append(job)
+        while free and len(policy):
+            nxt     = policy.pop(now)
+            service = nxt.fetch + nxt.encode * stretch + nxt.upload
+            free   -= 1
+            # finishes sort before arrivals at the same instant, like a worker freeing up first
+            heapq.heappush(events, (now + service, -1, next(seq), 'finish', (nxt, now - nxt.arrival, service)))
+    return done
+
+
+def _pct(values: list, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+def jain(values: list) -> float:
+    """Jain's fairness index: 1.0 when everyone gets the same, 1/n when one user gets everything."""
+    if not values or not any(values):
+        return 1.0
+    return sum(values) ** 2 / (len(values) * sum(v * v for v in values))
+
+def summarize(done: list, slots: int) -> dict:
+    """Throughput, wait per mode and per-user fairness of one simulate() run."""
+    if not done:
+        return {'jobs': 0}
+    first = min(j.arrival for j, _, _ in done)
+    last  = max(j.arrival + w + s for j, w, s in done)
+    span  = max(last - first, 1e-9)
+
+    by_mode, by_user = defaultdict(list), defaultdict(list)
+    for job, wait, service in done:
+        by_mode[job.mode].append(wait)
+        # slowdown: time in the system over time actually worked on
+        by_user[job.user_id].append((wait + service) / max(service, 1.0))
+    slowdown = {u: sum(v) / len(v) for u, v in by_user.items()}
+    return {
+        'jobs': len(done),
+        'throughput_per_h': round(len(done) / span * 3600, 2),
+        'utilization': round(sum(s for _, _, s in done) / (slots * span), 3),
+        'wait': {m: {'jobs': len(w), 'mean_s': round(sum(w) / len(w), 1), 'p95_s': round(_pct(w, 0.95), 1)}
+                 for m, w in sorted(by_mode.items())},
+        'fairness': round(jain(list(slowdown.values())), 3),
+        'worst_user': max(slowdown.items(), key=lambda kv: kv[1])[0],
+        'worst_slowdown': round(max(slowdown.values()), 2),
+    }
+
+def recorded(jobs: list) -> dict:
+    """Wait per mode as it actually happened, to check the fifo / 1 worker replay against."""
+    by_mode = defaultdict(list)
+    for j in jobs:
+        by_mode[j.mode].append(j.wait)
+    return {m: {'jobs': len(w), 'mean_s': round(sum(w) / len(w), 1), 'p95_s': round(_pct(w, 0.95), 1)}
+            for m, w in sorted(by_mode.items())}
+
+
+# ---------- CLI ----------
+
+def _ints(text: str) -> list:
+    return [int(x) for x in text.split(',') if x.strip()]
+
+def _print(label: str, st: dict):
+    print(f"\n{label}")
+    if not st.get('jobs'):
+        print("  no jobs")
+        return
+    if 'throughput_per_h' in st:
+        print(f"  {st['jobs']} jobs, {st['throughput_per_h']} jobs/h, utilization {st['utilization'] * 100:.0f}%, "
+              f"fairness {st['fairness']} (worst: user {st['worst_user']}, slowdown {st['worst_slowdown']}x)")
+    for mode, w in st['wait'].items():
+        print(f"  {mode:6s} {w['jobs']:5d} jobs  wait mean {w['mean_s']:8.1f}s  p95 {w['p95_s']:8.1f}s")
+
+def main():
+    ap = argparse.ArgumentParser(description="Replay recorded job traces against other schedulers.")
+    ap.add_argument('--trace', help="JSON-lines trace (default: the job_trace table)")
+    ap.add_argument('--days', type=float, help="only jobs queued in the last N days")
+    ap.add_argument('--export', metavar='PATH', help="write the selected trace as JSON lines and exit")
+    ap.add_argument('--policy', default='fifo,fair,sjf', help=f"comma separated: {', '.join(POLICIES)}")
+    ap.add_argument('--workers', default='1,2,4', help="workers per host, comma separated")
+    ap.add_argument('--hosts', default='1', help="host counts, comma separated")
+    ap.add_argument('--cores', type=int, help="CPU cores per host (encodes stretch above this many workers)")
+    ap.add_argument('--json', action='store_true', help="print one JSON object per run")
+    args = ap.parse_args()
+
+    since = time.time() - args.days * 86400 if args.days else 0
+    rows  = load_jsonl(args.trace) if args.trace else load_db(since)
+    rows  = [r for r in rows if r['queued_at'] >= since]
+    if args.export:
+        with open(args.export, 'w') as f:
+            f.writelines(json.dumps(r) + '\n' for r in rows)
+        print(f"{len(rows)} jobs written to {args.export}", file=sys.stderr)
+        return
+    jobs = sorted((_job(r) for r in rows), key=lambda j: j.arrival)
+    if not jobs:
+        sys.exit("No recorded jobs to replay.")
+
+    if not args.json:
+        _print(f"Recorded ({len(jobs)} jobs)", {'jobs': len(jobs), 'wait': recorded(jobs)})
+    for name, hosts, workers in itertools.product(args.policy.split(','), _ints(args.hosts), _ints(args.workers)):
+        st = summarize(simulate(jobs, POLICIES[name](), workers, hosts, args.cores), workers * hosts)
+        if args.json:
+            print(json.dumps({'policy': name, 'hosts': hosts, 'workers': workers, **st}))
+        else:
+            _print(f"{name}: {hosts} host(s) x {workers} worker(s)", st)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+# helper_func/smart_render.py
+
+import re
+import asyncio
+import bisect
+
+# source codec (ffprobe codec_name) each encoder can be spliced into
+ENCODER_FOR_CODEC = {
+    'h264': 'libx264',
+    'hevc': 'libx265',
+    'vp9':  'libvpx-vp9',
+    'av1':  'libaom-av1',
+}
+
+# annex-b codecs carry SPS/PPS in-band in MPEG-TS, which keeps the splice decodable
+SEGMENT_FORMAT = {
+    'libx264':    ('mpegts', '.ts'),
+    'libx265':    ('mpegts', '.ts'),
+    'libvpx-vp9': ('matroska', '.mkv'),
+    'libaom-av1': ('matroska', '.mkv'),
+    'libsvtav1':  ('matroska', '.mkv'),
+}
+
+# ffprobe profile names -> the encoder's -profile:v value
+X264_PROFILES = {
+    'Constrained Baseline': 'baseline', 'Baseline': 'baseline', 'Main': 'main', 'High': 'high',
+    'High 10': 'high10', 'High 4:2:2': 'high422', 'High 4:4:4 Predictive': 'high444',
+}
+X265_PROFILES = {'Main': 'main', 'Main 10': 'main10', 'Main Still Picture': 'mainstillpicture'}
+
+async def probe_video_stream(vid_path: str) -> dict:
+    """codec_name / pix_fmt / profile / level / refs of the first video stream ({} if unknown)."""
+    proc = await asyncio.create_subprocess_exec(
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=codec_name,pix_fmt,profile,level,refs',
+        '-of', 'default=noprint_wrappers=1', '-i', vid_path,
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    out, _ = await proc.communicate()
+    info = {}
+    for line in out.decode(errors='ignore').splitlines():
+        if '=' in line:
+            k, v = line.split('=', 1)
+            info[k.strip()] = v.strip()
+    return info
+
+def match_args(codec: str, src: dict) -> list:
+    """
+    Encoder options that keep re-encoded ranges within the source's profile,
+    level and reference count, so the decoder the copied ranges set up (and
+    the container headers taken from the first piece) can play them too.
+    """
+    args    = []
+    profile = src.get('profile', '')
+    level   = src.get('level', '')
+    level   = int(level) if level.lstrip('-').isdigit() and int(level) > 0 else 0
+    if codec == 'libx264':
+        if profile in X264_PROFILES:
+            args += ['-profile:v', X264_PROFILES[profile]]
+        if level:
+            args += ['-level', f"{level / 10:.1f}"]
+        if src.get('refs', '').isdigit() and int(src['refs']) > 0:
+            args += ['-refs', src['refs']]
+    elif codec == 'libx265':
+        if profile in X265_PROFILES:
+            args += ['-profile:v', X265_PROFILES[profile]]
+        if level:
+            args += ['-x265-params', f"level-idc={level / 30:.1f}"]
+    elif codec == 'libvpx-vp9':
+        m = re.match(r'Profile (\d)', profile)
+        if m:
+            args += ['-profile:v', m.group(1)]
+    return args
+
+def plan_segments(events: list, keyframes: list, duration: float, min_copy: float = 2.0) -> list:
+    """
+    Turn subtitle events into keyframe-aligned ranges.
+
+    Returns [(start, end, burn)] covering 0..duration, where `burn` ranges
+    contain every event and start/end on keyframes so the copy ranges around
+    them can be stream-copied. Copy gaps shorter than `min_copy` seconds are
+    folded into the neighbouring burn range (not worth an extra splice).
+    """
+    if not keyframes or duration <= 0:
+        return [(0.0, duration, True)]
+    if keyframes[0] > 0:
+        keyframes = [0.0] + keyframes
+
+    burn = []
+    for s, e in events:
+        if s >= duration:
+            continue
+        i  = bisect.bisect_right(keyframes, s) - 1
+        j  = bisect.bisect_left(keyframes, min(e, duration))
+        ks = keyframes[max(i, 0)]
+        ke = keyframes[j] if j < len(keyframes) else duration
+        if burn and ks - burn[-1][1] < min_copy:
+            burn[-1][1] = max(burn[-1][1], ke)
+        else:
+            burn.append([ks, ke])
+
+    plan, pos = [], 0.0
+    for s, e in burn:
+        if s - pos >= min_copy:
+            plan.append((pos, s, False))
+        else:
+            s = pos
+        plan.append((s, e, True))
+        pos = e
+    if duration - pos > 0:
+        if duration - pos >= min_copy or not plan:
+            plan.append((pos, duration, False))
+        else:
+            s, _, _ = plan.pop()
+            plan.append((s, duration, True))
+    return plan
+
+def coverage(plan: list, duration: float) -> float:
+    """Share of the runtime that has to be re-encoded."""
+    if duration <= 0:
+        return 1.0
+    return sum(e - s for s, e, burn in plan if burn) / duration
+
+def eligible(cfg: dict, src: dict, family: str) -> bool:
+    """Smart-render only splices cleanly when the output keeps the source geometry and codec."""
+    return (
+        cfg.get('smart_render', 'off') == 'on'
+        and cfg.get('resolution', '1920:1080') == 'original'
+        and cfg.get('fps', 'original') == 'original'
+        and str(cfg.get('target_size', 'off')) == 'off'
+        and ENCODER_FOR_CODEC.get(src.get('codec_name')) == family
+    )
@@ -0,0 +1,195 @@
+# helper_func/storage.py
+"""
+Storage tiers. Short-lived per-job files (soft-mux outputs of short clips,
+segment and sample folders) live on a RAM-backed scratch directory
+(SCRATCH_DIR, a tmpfs) while they fit in SCRATCH_BUDGET; inputs of queued
+jobs and large outputs stay in DOWNLOAD_DIR on disk, since a queued job has
+to survive a reboot (journal.restore) and tmpfs does not.
+
+A scratch file keeps its DOWNLOAD_DIR name: a symlink there points into
+SCRATCH_DIR/files, so jobs, the journal and cleanup keep working with plain
+file names and renaming or deleting the link is all they ever do. The
+janitor reaps scratch files no link points to any more, and promotes a file
+back to disk (in place of its link) once it has stopped changing and either
+grew past SCRATCH_MAX_FILE or scratch is over budget. Files of a job that
+is still running are left alone: an ffmpeg paused with SIGSTOP writes
+nothing for a while but is not done. Job folders are sized up front and
+are not promoted.
+"""
+
+import os, time, uuid, shutil, asyncio, logging
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+_IDLE        = 60      # seconds without writes before a file may be reaped or promoted
+_SWEEP_EVERY = 30
+
+_reserved: dict[str, int] = {}   # scratch job folder -> bytes expected in it
+_owners: dict[str, str] = {}     # scratch file -> id of the job writing it
+
+
+def enabled() -> bool:
+    return bool(Config.SCRATCH_DIR) and Config.SCRATCH_BUDGET > 0
+
+def _files_dir() -> str:
+    return os.path.join(os.path.abspath(Config.SCRATCH_DIR), 'files')
+
+def _work_dir() -> str:
+    return os.path.join(os.path.abspath(Config.SCRATCH_DIR), 'work')
+
+
+def _tree_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for fn in files:
+            try:
+                st = os.lstat(os.path.join(root, fn))
+            except OSError:
+                continue
+            if not os.path.islink(os.path.join(root, fn)):
+                total += st.st_size
+    return total
+
+def used() -> int:
+    """Bytes currently on scratch."""
+    return _tree_size(Config.SCRATCH_DIR) if enabled() else 0
+
+def _fits(size: int, single_file: bool = True) -> bool:
+    if not enabled() or size > (Config.SCRATCH_MAX_FILE if single_file else Config.SCRATCH_BUDGET):
+        return False
+    try:
+        free = shutil.disk_usage(Config.SCRATCH_DIR).free
+    except OSError:
+        return False
+    # room still promised to job folders that have not filled up yet
+    pending = sum(max(0, size_ - _tree_size(d)) for d, size_ in list(_reserved.items()))
+    return used() + pending + size <= Config.SCRATCH_BUDGET and pending + size < free
+
+
+def place(path: str, size: int, job_id: str = None) -> str:
+    """
+    Put the file job `job_id` is about to write at `path` (in DOWNLOAD_DIR)
+    on scratch if `size`, the bytes expected, fits: `path` becomes a link to
+    it. Returns `path` either way, so writers just open it.
+    """
+    if os.path.islink(path) or not _fits(size):
+        return path
+    target = os.path.join(_files_dir(), f"{uuid.uuid4().hex[:8]}_{os.path.basename(path)}")
+    os.makedirs(_files_dir(), exist_ok=True)
+    open(target, 'wb').close()
+    if job_id:
+        _owners[target] = job_id
+    tmp = path + '.scratch'
+    os.symlink(target, tmp)
+    os.replace(tmp, path)
+    return path
+
+def workdir(name: str, size: int) -> str:
+    """A fresh folder for a job's intermediates: on scratch if `size` bytes fit, else in DOWNLOAD_DIR."""
+    if _fits(size, single_file=False):
+        path = os.path.join(_work_dir(), name)
+        _reserved[path] = size
+    else:
+        path = os.path.join(Config.DOWNLOAD_DIR, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def remove(path: str):
+    """Delete a file in DOWNLOAD_DIR, and its scratch copy if it is a link to one."""
+    if os.path.islink(path) and os.readlink(path).startswith(_files_dir()):
+        try:
+            os.remove(os.readlink(path))
+        except OSError:
+            pass
+    os.remove(path)
+
+
+def _links() -> dict:
+    """{scratch file: the DOWNLOAD_DIR link pointing to it}; links whose file is gone are dropped."""
+    links, prefix = {}, _files_dir() + os.sep
+    with os.scandir(Config.DOWNLOAD_DIR) as it:
+        for entry in it:
+            if not entry.is_symlink():
+                continue
+            target = os.readlink(entry.path)
+            if not target.startswith(prefix):
+                continue
+            if os.path.exists(target):
+                links[target] = entry.path
+            else:
+                # scratch was wiped (reboot): the file is lost either way
+                os.remove(entry.path)
+    return links
+
+def promote(target: str, link: str) -> bool:
+    """Copy a scratch file back to disk in place of its link."""
+    tmp = link + '.promote'
+    shutil.copyfile(target, tmp)
+    if not os.path.islink(link) or os.readlink(link) != target:
+        os.remove(tmp)   # renamed or deleted meanwhile
+        return False
+    os.replace(tmp, link)
+    os.remove(target)
+    return True
+
+def sweep(busy: set = frozenset()) -> dict:
+    """
+    One janitor pass (blocking): reap orphaned scratch files, promote outgrown
+    ones. Files of the jobs in `busy` (running or paused) are skipped.
+    """
+    if not enabled() or not os.path.isdir(_files_dir()):
+        return {'reaped': 0, 'promoted': 0}
+    for d in list(_reserved):
+        if not os.path.isdir(d):
+            _reserved.pop(d, None)
+    for target in [t for t in _owners if not os.path.exists(t)]:
+        _owners.pop(target, None)
+    links, now = _links(), time.time()
+    reaped, idle = 0, []
+    with os.scandir(_files_dir()) as it:
+        for entry in it:
+            st = entry.stat(follow_symlinks=False)
+            if now - st.st_mtime < _IDLE or _owners.get(entry.path) in busy:
+                continue
+            if entry.path in links:
+                idle.append((st.st_size, entry.path))
+            else:
+                os.remove(entry.path)
+                reaped += 1
+
+    promoted, over = 0, used() - Config.SCRATCH_BUDGET
+    for size, target in sorted(idle, reverse=True):
+        if size <= Config.SCRATCH_MAX_FILE and over <= 0:
+            break
+        if promote(target, links[target]):
+            logger.info("Promoted %s to disk (%d bytes)", os.path.basename(links[target]), size)
+            promoted += 1
+            over -= size
+    return {'reaped': reaped, 'promoted': promoted}
+
+
+def setup():
+    """
+    Create the scratch tree, drop job folders a previous run left behind and
+    move any file still linked from DOWNLOAD_DIR back to disk (nothing runs
+    yet, and whatever the journal re-queues must not depend on tmpfs).
+    """
+    if not enabled():
+        return
+    os.makedirs(_files_dir(), exist_ok=True)
+    shutil.rmtree(_work_dir(), ignore_errors=True)
+    os.makedirs(_work_dir(), exist_ok=True)
+    for target, link in _links().items():
+        promote(target, link)
+
+async def janitor(busy=None):
+    """Background loop running sweep() off the event loop; `busy()` returns the ids of unfinished jobs."""
+    while enabled():
+        try:
+            st = await asyncio.to_thread(sweep, set(busy()) if busy else set())
+            if st['reaped'] or st['promoted']:
+                logger.debug("Scratch sweep", extra={**st, 'used': used()})
+        except Exception:
+            logger.exception("Scratch sweep failed")
+        await asyncio.sleep(_SWEEP_EVERY)
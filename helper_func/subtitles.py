@@ -0,0 +1,113 @@
+# helper_func/subtitles.py
+
+import os
+import re
+
+srt_time_pattern = re.compile(
+    r'(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})\s*-->\s*(\d+):(\d{1,2}):(\d{1,2})[,.](\d{1,3})'
+)
+
+def _srt_ts(h, m, s, ms) -> float:
+    return int(h) * 3600 + int(m) * 60 + int(s) + int(ms.ljust(3, '0')) / 1000.0
+
+def ass_ts(t: str) -> float:
+    """'0:01:02.50' -> 62.5"""
+    h, m, s = t.strip().split(':')
+    return int(h) * 3600 + int(m) * 60 + float(s)
+
+def read_text(path: str) -> str:
+    with open(path, 'rb') as f:
+        raw = f.read()
+    for enc in ('utf-8-sig', 'utf-16'):
+        try:
+            return raw.decode(enc)
+        except UnicodeDecodeError:
+            continue
+    return raw.decode('latin-1')
+
+def srt_events(text: str) -> list:
+    return [
+        (_srt_ts(*m.groups()[:4]), _srt_ts(*m.groups()[4:]))
+        for m in srt_time_pattern.finditer(text)
+    ]
+
+def ass_events(text: str) -> list:
+    """(start, end) of every Dialogue line in [Events], honouring its Format line."""
+    events, in_events = [], False
+    start_i, end_i = 1, 2
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('['):
+            in_events = line.lower() == '[events]'
+            continue
+        if not in_events:
+            continue
+        if line.lower().startswith('format:'):
+            fields = [f.strip().lower() for f in line.split(':', 1)[1].split(',')]
+            if 'start' in fields and 'end' in fields:
+                start_i, end_i = fields.index('start'), fields.index('end')
+        elif line.lower().startswith('dialogue:'):
+            parts = line.split(':', 1)[1].split(',', max(start_i, end_i) + 1)
+            try:
+                events.append((ass_ts(parts[start_i]), ass_ts(parts[end_i])))
+            except (ValueError, IndexError):
+                continue
+    return events
+
+def event_times(path: str) -> list:
+    """Sorted (start, end) seconds of all subtitle events in an .srt/.ass file."""
+    text = read_text(path)
+    if path.lower().endswith('.ass') or '[events]' in text.lower():
+        events = ass_events(text)
+    else:
+        events = srt_events(text)
+    return sorted((s, e) for s, e in events if e > s)
+
+
+# ISO 639 codes / names we recognise in subtitle filenames -> (ISO 639-2 code MKV expects, title)
+LANGUAGES = {
+    'en': ('eng', 'English'), 'eng': ('eng', 'English'), 'english': ('eng', 'English'),
+    'es': ('spa', 'Español'), 'spa': ('spa', 'Español'), 'spanish': ('spa', 'Español'),
+    'pt': ('por', 'Português'), 'por': ('por', 'Português'), 'portuguese': ('por', 'Português'),
+    'ptbr': ('por', 'Português (Brasil)'), 'pt-br': ('por', 'Português (Brasil)'),
+    'fr': ('fre', 'Français'), 'fre': ('fre', 'Français'), 'fra': ('fre', 'Français'), 'french': ('fre', 'Français'),
+    'de': ('ger', 'Deutsch'), 'ger': ('ger', 'Deutsch'), 'deu': ('ger', 'Deutsch'), 'german': ('ger', 'Deutsch'),
+    'it': ('ita', 'Italiano'), 'ita': ('ita', 'Italiano'), 'italian': ('ita', 'Italiano'),
+    'ru': ('rus', 'Русский'), 'rus': ('rus', 'Русский'), 'russian': ('rus', 'Русский'),
+    'ar': ('ara', 'العربية'), 'ara': ('ara', 'العربية'), 'arabic': ('ara', 'العربية'),
+    'hi': ('hin', 'हिन्दी'), 'hin': ('hin', 'हिन्दी'), 'hindi': ('hin', 'हिन्दी'),
+    'id': ('ind', 'Bahasa Indonesia'), 'ind': ('ind', 'Bahasa Indonesia'), 'indonesian': ('ind', 'Bahasa Indonesia'),
+    'vi': ('vie', 'Tiếng Việt'), 'vie': ('vie', 'Tiếng Việt'), 'vietnamese': ('vie', 'Tiếng Việt'),
+    'th': ('tha', 'ไทย'), 'tha': ('tha', 'ไทย'), 'thai': ('tha', 'ไทย'),
+    'ja': ('jpn', '日本語'), 'jpn': ('jpn', '日本語'), 'japanese': ('jpn', '日本語'),
+    'ko': ('kor', '한국어'), 'kor': ('kor', '한국어'), 'korean': ('kor', '한국어'),
+    'zh': ('chi', '中文'), 'chi': ('chi', '中文'), 'zho': ('chi', '中文'), 'chinese': ('chi', '中文'),
+}
+
+def guess_language(filename: str, caption: str = None) -> tuple:
+    """
+    (lang, title) for a subtitle track. A "lang|title" caption wins, else a
+    language tag in the filename ("ep01.en.srt", "ep01 [Spanish].ass").
+    Unknown -> ('und', '').
+    """
+    if caption:
+        lang, sep, title = caption.strip().partition('|')
+        lang  = lang.strip().lower()
+        known = LANGUAGES.get(lang)
+        if known:
+            return known[0], title.strip() or known[1]
+        if sep and len(lang) == 3 and lang.isalpha():
+            return lang, title.strip()
+
+    stem = os.path.splitext(os.path.basename(filename))[0].lower()
+    tail = stem.rsplit('.', 1)[-1]
+    if tail in LANGUAGES:
+        return LANGUAGES[tail]
+    # short codes only count as a dot suffix or in brackets, full names anywhere
+    for tok in reversed(re.findall(r'[\[(]([^\])]+)[\])]', stem)):
+        if tok.strip() in LANGUAGES:
+            return LANGUAGES[tok.strip()]
+    for tok in reversed(re.split(r'[\s._\[\]()\-]+', stem)):
+        if len(tok) > 3 and tok in LANGUAGES:
+            return LANGUAGES[tok]
+    return 'und', ''
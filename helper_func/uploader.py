@@ -0,0 +1,216 @@
+# helper_func/uploader.py
+
+import os, sys, time, random, asyncio, logging, mimetypes
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+PART_SIZE = 512 * 1024          # largest part Telegram accepts
+BIG_FILE  = 10 * 1024 * 1024    # files above this must go through SaveBigFilePart
+
+
+class TelegramTransport:
+    """One extra media session on the bot's DC, the kind pyrogram's own save_file opens."""
+
+    def __init__(self, client):
+        self.client  = client
+        self.session = None
+
+    async def open(self):
+        # pyrogram is only needed for the real transport; upload_parts runs (and is tested) without it
+        from pyrogram.session import Session
+        c = self.client
+        self.session = Session(
+            c, await c.storage.dc_id(), await c.storage.auth_key(),
+            await c.storage.test_mode(), is_media=True
+        )
+        await self.session.start()
+
+    async def send_part(self, file_id: int, index: int, total: int, data: bytes):
+        from pyrogram import raw
+        ok = await self.session.invoke(raw.functions.upload.SaveBigFilePart(
+            file_id=file_id, file_part=index, file_total_parts=total, bytes=data
+        ))
+        if not ok:
+            raise IOError(f"part {index} was rejected")
+
+    async def close(self):
+        if self.session:
+            await self.session.stop()
+
+
+class ThrottledTransport:
+    """
+    Local stand-in for a connection: capped at `bandwidth` bytes/s and failing
+    a part with probability `fail_rate`. Parts land in the shared `parts` dict
+    so the reassembled file can be compared with the source.
+    """
+
+    def __init__(self, bandwidth: float, fail_rate: float = 0.0, parts: dict = None):
+        self.bandwidth = bandwidth
+        self.fail_rate = fail_rate
+        self.parts = parts if parts is not None else {}
+
+    async def open(self):
+        pass
+
+    async def send_part(self, file_id: int, index: int, total: int, data: bytes):
+        await asyncio.sleep(len(data) / self.bandwidth)
+        if random.random() < self.fail_rate:
+            raise ConnectionError(f"part {index} dropped")
+        self.parts[index] = data
+
+    async def close(self):
+        pass
+
+
+async def upload_parts(path: str, transports: list, progress=None, progress_args=(),
+                       retries: int = None, part_size: int = PART_SIZE):
+    """
+    Push the file's parts through all `transports` at once, one worker per
+    transport pulling from a shared queue. A failed part goes back on the queue
+    (so another connection may pick it up) until it failed `retries` times.
+    `progress(current, total, *progress_args)` sees the aggregate byte count,
+    at most once a second. Returns (file_id, part_count).
+    """
+    retries = Config.UPLOAD_PART_RETRIES if retries is None else retries
+    size    = os.path.getsize(path)
+    total   = max(1, -(-size // part_size))
+    file_id = random.getrandbits(63)
+    todo    = asyncio.Queue()
+    for i in range(total):
+        todo.put_nowait(i)
+    attempts = {}
+    sent = 0
+    last_report = 0.0
+
+    async def _report(force=False):
+        nonlocal last_report
+        now = time.time()
+        if progress and (force or now - last_report >= 1):
+            last_report = now
+            await progress(sent, size, *progress_args)
+
+    fd    = os.open(path, os.O_RDONLY)
+    loop  = asyncio.get_running_loop()
+    reads = set()   # pread calls in flight: cancelling a worker does not stop its thread
+
+    async def _read(i):
+        fut = loop.run_in_executor(None, os.pread, fd, part_size, i * part_size)
+        reads.add(fut)
+        fut.add_done_callback(reads.discard)
+        return await asyncio.shield(fut)
+
+    async def _worker(transport):
+        nonlocal sent
+        while True:
+            try:
+                i = todo.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            data = await _read(i)
+            try:
+                await transport.send_part(file_id, i, total, data)
+            except Exception as e:
+                attempts[i] = attempts.get(i, 0) + 1
+                if attempts[i] > retries:
+                    raise IOError(f"part {i} failed {attempts[i]} times: {e}")
+                logger.warning("Upload part %d/%d failed (%s), retrying", i + 1, total, e)
+                todo.put_nowait(i)
+                await asyncio.sleep(min(2 ** attempts[i], 10))
+                continue
+            sent += len(data)
+            await _report()
+
+    workers = [asyncio.create_task(_worker(t)) for t in transports]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        # one part gave up: stop the other workers before the fd (and the caller's sessions) go away
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        raise
+    finally:
+        await asyncio.gather(*reads, return_exceptions=True)
+        os.close(fd)
+    await _report(force=True)
+    return file_id, total
+
+
+async def save_parallel(client, path: str, file_name: str, progress=None, progress_args=()):
+    """
+    Upload `path` over Config.UPLOAD_SESSIONS media sessions without sending
+    it; returns the InputFileBig that send_uploaded() sends.
+    """
+    from pyrogram import raw
+    transports = [TelegramTransport(client) for _ in range(max(1, Config.UPLOAD_SESSIONS))]
+    try:
+        await asyncio.gather(*(t.open() for t in transports))
+        file_id, parts = await upload_parts(path, transports, progress, progress_args)
+    finally:
+        await asyncio.gather(*(t.close() for t in transports), return_exceptions=True)
+    return raw.types.InputFileBig(id=file_id, parts=parts, name=file_name)
+
+
+async def send_uploaded(client, chat_id: int, file, file_name: str, caption: str = '',
+                        video: dict = None, thumb: str = None):
+    """
+    Send a file already uploaded (by save_parallel or client.save_file) as a
+    document, or as a streamable video when `video` ({duration, width,
+    height}) is given.
+    """
+    from pyrogram import raw
+    attributes = [raw.types.DocumentAttributeFilename(file_name=file_name)]
+    if video:
+        mime = 'video/mp4'
+        attributes.append(raw.types.DocumentAttributeVideo(
+            duration=video['duration'], w=video['width'], h=video['height'],
+            supports_streaming=True
+        ))
+    else:
+        mime = mimetypes.guess_type(file_name)[0] or 'application/octet-stream'
+    media = raw.types.InputMediaUploadedDocument(
+        mime_type=mime,
+        file=file,
+        thumb=await client.save_file(thumb) if thumb else None,
+        attributes=attributes,
+        force_file=None if video else True
+    )
+    return await client.invoke(raw.functions.messages.SendMedia(
+        peer=await client.resolve_peer(chat_id),
+        media=media,
+        message=caption,
+        random_id=client.rnd_id()
+    ))
+
+
+async def send_parallel(client, chat_id: int, path: str, file_name: str, caption: str = '',
+                        progress=None, progress_args=(), video: dict = None, thumb: str = None):
+    """Upload `path` over parallel media sessions and send it (see send_uploaded)."""
+    file = await save_parallel(client, path, file_name, progress, progress_args)
+    return await send_uploaded(client, chat_id, file, file_name, caption, video=video, thumb=thumb)
+
+
+async def _bench(path: str, sessions: int, bandwidth: float, fail_rate: float):
+    parts = {}
+    transports = [ThrottledTransport(bandwidth, fail_rate, parts) for _ in range(sessions)]
+    t0 = time.time()
+    _, total = await upload_parts(path, transports, retries=10)
+    took = time.time() - t0
+    with open(path, 'rb') as f:
+        intact = b''.join(parts[i] for i in range(total)) == f.read()
+    size = os.path.getsize(path)
+    print(f"{sessions} sessions: {size / took / 1024 / 1024:.1f} MiB/s in {took:.1f}s, "
+          f"{'intact' if intact else 'CORRUPT'}")
+
+
+if __name__ == '__main__':
+    # python -m helper_func.uploader FILE [sessions] [MiB/s per session] [fail rate]
+    args = sys.argv[1:]
+    asyncio.run(_bench(
+        args[0],
+        int(args[1]) if len(args) > 1 else 4,
+        float(args[2]) * 1024 * 1024 if len(args) > 2 else 2 * 1024 * 1024,
+        float(args[3]) if len(args) > 3 else 0.0
+    ))
@@ -1,22 +1,49 @@
-import logging, os
+import logging, os, asyncio
 from config import Config
 from helper_func.dbhelper import Database as Db
+from helper_func.fonts import load_index
+from helper_func import encoders
+from helper_func.loop_monitor import monitor
+from helper_func.ingest import ingestor
+from helper_func.queue import job_queue
+from helper_func import journal
+from helper_func import logs
+from helper_func import storage
+from helper_func import keyframes
+from helper_func import api
 from plugins.muxer import queue_worker
 
-logging.basicConfig(level=logging.DEBUG,
-                    format="%(asctime)s - %(name)s - %(message)s")
-logging.getLogger('pyrogram').setLevel(logging.WARNING)
+# JSON lines through a queue, written by a background thread (LOG_* settings in config.py)
+logs.setup()
 
 db = Db().setup()
 if not os.path.isdir(Config.DOWNLOAD_DIR):
     os.mkdir(Config.DOWNLOAD_DIR)
+storage.setup()
+# keyframe indexes of inputs that were deleted without going through a job
+keyframes.prune()
 
 from pyrogram import Client
 class QueueBot(Client):
     async def start(self):
         await super().start()
+        monitor.start(self.loop)
+        # index FONTS_DIR once so hard-mux jobs only link the fonts they need
+        await asyncio.to_thread(load_index)
+        # which encoders/filters this ffmpeg has, cached for the settings keyboard and jobs
+        await asyncio.to_thread(encoders.probe)
+        # put back whatever was queued or running before a crash / deploy
+        journal.attach(job_queue)
+        await journal.restore(self, job_queue)
         # launch our single background worker
         self.loop.create_task(queue_worker(self))
+        # just-in-time downloads for lazily ingested videos
+        ingestor.attach(self)
+        self.loop.create_task(ingestor.scheduler(job_queue))
+        # reap and promote files on the RAM scratch tier (SCRATCH_* in config.py)
+        self.loop.create_task(storage.janitor(lambda: job_queue.running))
+        # local job API for pipelines (API_* in config.py), same queue and uploads as the commands
+        self.api = await api.start(self)
 
 app = QueueBot(
     "SubtitleMuxer",
@@ -0,0 +1,250 @@
+# muxcli.py
+"""
+Run the mux engine without Telegram, over files/directories or a watch folder.
+
+  python muxcli.py run hard ~/shows/S01 --out ~/out --profile anime -j 2
+  python muxcli.py run nosub a.mkv b.mkv --set crf=24 --set preset=slow
+  python muxcli.py watch ~/inbox --mode soft --out ~/out --progress json
+
+Settings come from a profile (a JSON file with the same keys /settings stores,
+looked up as-is or in Config.PROFILES_DIR) plus --set overrides.
+"""
+
+import os, re, sys, json, html, time, uuid, shutil, asyncio, argparse
+from types import SimpleNamespace
+from config import Config
+from helper_func import encoders, logs, preempt, storage
+from helper_func.batch import pair_files, VIDEO_EXTS, SUB_EXTS
+from helper_func.preflight import preflight, SubtitleError
+from helper_func.mux import softmux_vid, hardmux_vid, nosub_encode, remux_vid, job_usage, job_retries
+
+TAGS = re.compile(r'<[^>]+>')
+MODES = ('soft', 'hard', 'nosub', 'remux')
+
+
+class ConsoleReporter:
+    """Stand-in for the Telegram status message: prints status and progress as text or JSON lines."""
+
+    def __init__(self, name: str, fmt: str):
+        self.name = name
+        self.fmt  = fmt
+        self.chat = SimpleNamespace(id=None)
+
+    def _emit(self, event: str, **fields):
+        if self.fmt == 'json':
+            print(json.dumps({'ts': round(time.time(), 3), 'file': self.name, 'event': event, **fields}),
+                  flush=True)
+        elif event == 'progress':
+            print(f"[{self.name}] {fields['label']}: {fields['pct']:5.1f}%  "
+                  f"{fields['speed'] or 0:.2f}x  ETA {fields['eta']}s", flush=True)
+        else:
+            print(f"[{self.name}] {fields['text']}", flush=True)
+
+    async def edit(self, text: str, **kwargs):
+        plain = html.unescape(TAGS.sub('', text))
+        self._emit('status', text=' | '.join(l.strip() for l in plain.splitlines() if l.strip()))
+
+    edit_text = edit
+
+    async def progress(self, p: dict):
+        self._emit('progress', **p)
+
+
+def load_profile(name: str, overrides: list) -> dict:
+    cfg = {}
+    if name:
+        path = name if os.path.exists(name) else os.path.join(Config.PROFILES_DIR, name + '.json')
+        with open(path) as f:
+            cfg = json.load(f)
+    for item in overrides or []:
+        key, _, value = item.partition('=')
+        cfg[key.strip()] = value.strip()
+    return cfg
+
+
+def _split(paths: list) -> tuple:
+    """([(path, name)] videos, [(path, name)] subtitles) of the given files and directories."""
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files += [os.path.join(p, f) for f in sorted(os.listdir(p))]
+        else:
+            files.append(p)
+    videos, subs = [], []
+    for f in files:
+        ext = f.rsplit('.', 1)[-1].lower()
+        if ext in VIDEO_EXTS:
+            videos.append((os.path.abspath(f), os.path.basename(f)))
+        elif ext in SUB_EXTS:
+            subs.append((os.path.abspath(f), os.path.basename(f)))
+    return videos, subs
+
+
+def plan(mode: str, videos: list, subs: list) -> tuple:
+    """([(video_path, sub_path_or_None)], unmatched) for `mode`."""
+    if mode in ('nosub', 'remux'):
+        return [(v[0], None) for v in videos], []
+    pairs, _ = pair_files(videos, subs)
+    return [(v[0], s[0]) for v, s in pairs if s], [v[1] for v, s in pairs if not s]
+
+
+async def run_one(mode: str, vid: str, sub: str, cfg: dict, out_dir: str, fmt: str) -> bool:
+    """Run one job inside DOWNLOAD_DIR (sources are linked in, never modified) and move the result to out_dir."""
+    job_id = uuid.uuid4().hex[:8]
+    logs.current_job.set(job_id)
+    rep    = ConsoleReporter(os.path.basename(vid), fmt)
+    stem   = os.path.splitext(os.path.basename(vid))[0]
+    work   = []
+
+    def _stage(src: str, name: str, copy: bool = False) -> str:
+        dst = os.path.join(Config.DOWNLOAD_DIR, name)
+        if copy:
+            shutil.copyfile(src, dst)
+        else:
+            try:
+                os.symlink(src, dst)
+            except OSError:
+                shutil.copyfile(src, dst)
+        work.append(dst)
+        return name
+
+    try:
+        vid_name = _stage(vid, f"{job_id}_{stem}{os.path.splitext(vid)[1]}")
+        sub_name = None
+        if sub:
+            # pre-flight rewrites the file, so it works on a copy
+            sub_name = _stage(sub, f"{job_id}{os.path.splitext(sub)[1].lower()}", copy=True)
+            to_ass = cfg.get('srt_to_ass', 'off') == 'on'
+            try:
+                info = await asyncio.to_thread(preflight, os.path.join(Config.DOWNLOAD_DIR, sub_name), to_ass)
+            except SubtitleError as e:
+                await rep.edit(f"❌ Subtitle rejected: {e}")
+                return False
+            sub_name = os.path.basename(info['path'])
+            work.append(info['path'])
+
+        if mode == 'soft':
+            out = await softmux_vid(vid_name, sub_name, rep, job_id, cfg=cfg)
+        elif mode == 'hard':
+            out = await hardmux_vid(vid_name, sub_name, rep, job_id, cfg=cfg)
+        elif mode == 'remux':
+            out = await remux_vid(vid_name, rep, job_id)
+        else:
+            out = await nosub_encode(vid_name, rep, job_id, cfg=cfg)
+        job_usage.pop(job_id, None)
+        job_retries.pop(job_id, None)
+        preempt.job_pauses.pop(job_id, None)
+        if not out:
+            return False
+
+        dest = os.path.join(out_dir, out[len(job_id) + 1:])
+        out_path = os.path.join(Config.DOWNLOAD_DIR, out)
+        work.append(out_path)
+        # move the file itself, not the link to it when it was written on scratch
+        await asyncio.to_thread(shutil.move, os.path.realpath(out_path), dest)
+        await rep.edit(f"✅ Written {dest}")
+        return True
+    finally:
+        for path in work:
+            try:
+                storage.remove(path)
+            except OSError:
+                pass
+
+
+async def run(args, cfg: dict) -> int:
+    videos, subs = _split(args.paths)
+    jobs, unmatched = plan(args.mode, videos, subs)
+    for name in unmatched:
+        print(f"[{name}] skipped: no matching subtitle", file=sys.stderr)
+    sem = asyncio.Semaphore(args.jobs)
+
+    async def _limited(vid, sub):
+        async with sem:
+            return await run_one(args.mode, vid, sub, cfg, args.out, args.progress)
+
+    results = await asyncio.gather(*(_limited(v, s) for v, s in jobs))
+    failed = results.count(False)
+    print(f"{len(results) - failed} done, {failed} failed, {len(unmatched)} skipped", file=sys.stderr)
+    return 1 if failed else 0
+
+
+async def watch(args, cfg: dict):
+    """
+    Poll args.dir; a file is picked up once its size stopped changing between
+    two polls. Processed inputs are remembered in .muxcli_done.json there.
+    """
+    state_path = os.path.join(args.dir, '.muxcli_done.json')
+    done = set()
+    if os.path.exists(state_path):
+        with open(state_path) as f:
+            done = set(json.load(f))
+    sizes, busy, failed = {}, set(), set()   # failures are retried on the next start only
+    sem = asyncio.Semaphore(args.jobs)
+
+    async def _job(vid, sub):
+        ok = False
+        try:
+            async with sem:
+                ok = await run_one(args.mode, vid, sub, cfg, args.out, args.progress)
+        except Exception as e:
+            print(f"[{os.path.basename(vid)}] failed: {e!r}", file=sys.stderr)
+        finally:
+            busy.difference_update({vid, sub})
+            if not ok:
+                failed.update(p for p in (vid, sub) if p)
+        if ok:
+            done.update(p for p in (vid, sub) if p)
+            with open(state_path, 'w') as f:
+                json.dump(sorted(done), f)
+
+    while True:
+        videos, subs = _split([args.dir])
+        ready = []
+        for path, name in videos + subs:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue   # removed or renamed since the listing
+            if path not in done | busy | failed and sizes.get(path) == size:
+                ready.append((path, name))
+            sizes[path] = size
+        jobs, _ = plan(args.mode, [r for r in ready if r in videos], [r for r in ready if r in subs])
+        for vid, sub in jobs:
+            busy.update(p for p in (vid, sub) if p)
+            asyncio.create_task(_job(vid, sub))
+        await asyncio.sleep(args.interval)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Soft/hard-mux and encode files without Telegram.")
+    sub = ap.add_subparsers(dest='cmd', required=True)
+    for name in ('run', 'watch'):
+        p = sub.add_parser(name)
+        if name == 'run':
+            p.add_argument('mode', choices=MODES)
+            p.add_argument('paths', nargs='+', help="video/subtitle files or directories")
+        else:
+            p.add_argument('dir')
+            p.add_argument('--mode', choices=MODES, required=True)
+            p.add_argument('--interval', type=float, default=10, help="seconds between scans")
+        p.add_argument('--out', required=True, help="directory for the results")
+        p.add_argument('--profile', help="settings profile name or JSON path")
+        p.add_argument('--set', action='append', metavar='KEY=VALUE', help="override one setting")
+        p.add_argument('-j', '--jobs', type=int, default=1, help="parallel jobs")
+        p.add_argument('--progress', choices=('text', 'json'), default='text')
+        p.add_argument('--log-level', default='WARNING', help="log level on stderr")
+    args = ap.parse_args()
+
+    logs.setup(args.log_level, 'json' if args.progress == 'json' else 'text')
+    cfg = load_profile(args.profile, args.set)
+    os.makedirs(Config.DOWNLOAD_DIR, exist_ok=True)
+    os.makedirs(args.out, exist_ok=True)
+    encoders.probe()
+    if args.cmd == 'run':
+        sys.exit(asyncio.run(run(args, cfg)))
+    asyncio.run(watch(args, cfg))
+
+
+if __name__ == '__main__':
+    main()
@@ -3,16 +3,12 @@
 
 #Logging
 import logging
-logging.basicConfig(level=logging.DEBUG,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
 logger = logging.getLogger(__name__)
 
 import os
 import pyrogram
 from chat import Chat
 from config import Config
-logging.getLogger('pyrogram').setLevel(logging.WARNING)
 
 
 @pyrogram.Client.on_message(pyrogram.filters.command(['help']))
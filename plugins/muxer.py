@@ -1,18 +1,36 @@
 from pyrogram import Client, filters
 from pyrogram.enums import ParseMode
-from helper_func.queue import Job, job_queue
-from helper_func.mux   import softmux_vid, hardmux_vid, nosub_encode, running_jobs
-from helper_func.progress_bar import progress_bar
+from helper_func.queue import Job, job_queue, StatusMessage
+from helper_func.mux   import softmux_vid, hardmux_vid, nosub_encode, remux_vid, trim_vid, split_vid, running_jobs, _probe_duration, \
+    pause_job, resume_job, probe_video_info, make_thumbnail, job_usage, job_retries, _target_bytes, _fmt_time
+from helper_func.auto_mode import probe_streams, decide, MODE_NAMES
+from helper_func.resources import cpu_seconds
+from helper_func.ingest import ingestor
+from helper_func.logs import current_job
+from helper_func import keyframes, preempt, storage
+from helper_func.uploader import send_parallel, save_parallel, send_uploaded, BIG_FILE
+from helper_func.preflight import coverage
+from helper_func.settings_manager import SettingsManager
+from helper_func.batch import batches, pair_files, report as batch_report, job_finished as batch_job_finished
+from helper_func.progress_bar import progress_bar, humanbytes
 from helper_func.dbhelper       import Database as Db
 from config import Config
-import uuid, time, os, asyncio
+import uuid, time, os, html, math, asyncio, logging
 
 db = Db()
+logger = logging.getLogger(__name__)
+
+# job ids killed via /cancel while running (so batches count them as cancelled, not failed)
+_cancelled: set = set()
 
 async def _check_user(filt, client, message):
     return str(message.from_user.id) in Config.ALLOWED_USERS
 check_user = filters.create(_check_user)
 
+async def _check_admin(filt, client, message):
+    return str(message.from_user.id) in Config.ADMINS
+check_admin = filters.create(_check_admin)
+
 async def _ask_for_name(client, chat_id, mode, vid, sub, default_name):
     status = await client.send_message(
         chat_id,
@@ -24,20 +42,63 @@ async def _ask_for_name(client, chat_id, mode, vid, sub, default_name):
         mode=mode, vid=vid, sub=sub, default_name=default_name, status_msg=status
     )
 
+async def _quota_exceeded(chat_id):
+    """Refusal text when the user burnt through CPU_QUOTA_SECONDS in the window, else None."""
+    if not Config.CPU_QUOTA_SECONDS or str(chat_id) in Config.ADMINS:
+        return None
+    used = await db.run(db.cpu_used_since, chat_id, time.time() - Config.CPU_QUOTA_WINDOW)
+    if used < Config.CPU_QUOTA_SECONDS:
+        return None
+    return (f"⛔ CPU quota reached: {round(used)}s of {round(Config.CPU_QUOTA_SECONDS)}s used "
+            f"in the last {round(Config.CPU_QUOTA_WINDOW / 3600)}h. Try again later.")
+
+async def _misfit_subtitle(vid, subs):
+    """
+    Refusal text when a subtitle clearly belongs to another video (checked
+    against the probed duration, so it fails now instead of after an encode).
+    """
+    vid_path = os.path.join(Config.DOWNLOAD_DIR, vid)
+    if not os.path.exists(vid_path):   # lazily ingested, not downloaded yet
+        return None
+    duration = await _probe_duration(vid_path)
+    for fn in subs:
+        _, problem = await asyncio.to_thread(coverage, os.path.join(Config.DOWNLOAD_DIR, fn), duration)
+        if problem:
+            return f"❌ The subtitle does not fit this video: {problem}.\nSend the right subtitle and try again."
+    return None
+
+async def _drop_unused_subs(chat_id, keep: tuple = ()):
+    """Delete the collected subtitle files a job does not take along (nothing would clean them up later)."""
+    sub    = await db.run(db.get_sub_filename, chat_id)
+    tracks = await db.run(db.get_sub_tracks, chat_id)
+    for fn in {sub, *(t[0] for t in tracks)} - {None, False, *keep}:
+        try:
+            await asyncio.to_thread(storage.remove, os.path.join(Config.DOWNLOAD_DIR, fn))
+        except OSError:
+            pass
+
 # --------------------- COMMANDS ---------------------
 
 @Client.on_message(filters.command('softmux') & check_user & filters.private)
 async def enqueue_soft(client, message):
     chat_id = message.from_user.id
-    vid     = db.get_vid_filename(chat_id)
-    sub     = db.get_sub_filename(chat_id)
+    refusal = await _quota_exceeded(chat_id)
+    if refusal:
+        return await client.send_message(chat_id, refusal)
+    vid     = await db.run(db.get_vid_filename, chat_id)
+    sub     = await db.run(db.get_sub_filename, chat_id)
     if not vid or not sub:
         text = ''
         if not vid: text += 'First send a Video File\n'
         if not sub: text += 'Send a Subtitle File!'
         return await client.send_message(chat_id, text, parse_mode=ParseMode.HTML)
 
-    final_name = db.get_filename(chat_id)
+    tracks  = tuple(await db.run(db.get_sub_tracks, chat_id))
+    refusal = await _misfit_subtitle(vid, [t[0] for t in tracks] or [sub])
+    if refusal:
+        return await client.send_message(chat_id, refusal)
+
+    final_name = await db.run(db.get_filename, chat_id)
     job_id     = uuid.uuid4().hex[:8]
     status     = await client.send_message(
         chat_id,
@@ -45,21 +106,28 @@ async def enqueue_soft(client, message):
         parse_mode=ParseMode.HTML
     )
 
-    await job_queue.put(Job(job_id, 'soft', chat_id, vid, sub, final_name, status))
-    db.erase(chat_id)
+    await job_queue.put(Job(job_id, 'soft', chat_id, vid, sub, final_name, status.id, subs=tracks))
+    await db.run(db.erase, chat_id)
 
 @Client.on_message(filters.command('hardmux') & check_user & filters.private)
 async def enqueue_hard(client, message):
     chat_id = message.from_user.id
-    vid     = db.get_vid_filename(chat_id)
-    sub     = db.get_sub_filename(chat_id)
+    refusal = await _quota_exceeded(chat_id)
+    if refusal:
+        return await client.send_message(chat_id, refusal)
+    vid     = await db.run(db.get_vid_filename, chat_id)
+    sub     = await db.run(db.get_sub_filename, chat_id)
     if not vid or not sub:
         text = ''
         if not vid: text += 'First send a Video File\n'
         if not sub: text += 'Send a Subtitle File!'
         return await client.send_message(chat_id, text, parse_mode=ParseMode.HTML)
 
-    final_name = db.get_filename(chat_id)
+    refusal = await _misfit_subtitle(vid, [sub])
+    if refusal:
+        return await client.send_message(chat_id, refusal)
+
+    final_name = await db.run(db.get_filename, chat_id)
     job_id     = uuid.uuid4().hex[:8]
     status     = await client.send_message(
         chat_id,
@@ -67,17 +135,73 @@ async def enqueue_hard(client, message):
         parse_mode=ParseMode.HTML
     )
 
-    await job_queue.put(Job(job_id, 'hard', chat_id, vid, sub, final_name, status))
-    db.erase(chat_id)
+    await job_queue.put(Job(job_id, 'hard', chat_id, vid, sub, final_name, status.id))
+    await _drop_unused_subs(chat_id, keep=(sub,))
+    await db.run(db.erase, chat_id)
 
 @Client.on_message(filters.command('nosub') & check_user & filters.private)
 async def enqueue_nosub(client, message):
     chat_id = message.from_user.id
-    vid     = db.get_vid_filename(chat_id)
+    refusal = await _quota_exceeded(chat_id)
+    if refusal:
+        return await client.send_message(chat_id, refusal)
+    vid     = await db.run(db.get_vid_filename, chat_id)
+    if not vid:
+        return await client.send_message(chat_id, 'First send a Video File', parse_mode=ParseMode.HTML)
+
+    final_name = await db.run(db.get_filename, chat_id)
+    job_id     = uuid.uuid4().hex[:8]
+    status     = await client.send_message(
+        chat_id,
+        f"🧾 Job <code>{job_id}</code> enqueued at position {job_queue.qsize() + 1}",
+        parse_mode=ParseMode.HTML
+    )
+
+    await job_queue.put(Job(job_id, 'nosub', chat_id, vid, None, final_name, status.id))
+    await _drop_unused_subs(chat_id)
+    await db.run(db.erase, chat_id)
+
+def _parse_ts(text: str) -> float:
+    """'90', '1:30' or '01:01:30.5' -> seconds. Raises ValueError."""
+    parts = [float(p) for p in text.split(':')]
+    # every component non-negative and finite, minutes / seconds below 60
+    if (len(parts) > 3 or any(p < 0 or not math.isfinite(p) for p in parts)
+            or any(p >= 60 for p in parts[1:])):
+        raise ValueError(text)
+    secs = 0.0
+    for part in parts:
+        secs = secs * 60 + part
+    return secs
+
+@Client.on_message(filters.command('trim') & check_user & filters.private)
+async def enqueue_trim(client, message):
+    """
+    /trim <start> <end> [exact] – cut a clip without re-encoding the video.
+    Times are seconds or [hh:]mm:ss; the start snaps to the keyframe before
+    it unless `exact` is given (then only the edges are re-encoded).
+    """
+    chat_id = message.from_user.id
+    args    = message.command[1:]
+    exact   = bool(args) and args[-1].lower() == 'exact'
+    if exact:
+        args = args[:-1]
+    try:
+        start_at, end_at = (_parse_ts(a) for a in args)
+    except ValueError:
+        return await message.reply_text(
+            "Usage: <code>/trim start end [exact]</code>, e.g. <code>/trim 1:30 4:05</code>",
+            parse_mode=ParseMode.HTML
+        )
+    if end_at <= start_at:
+        return await message.reply_text("❌ The end has to come after the start.")
+    refusal = await _quota_exceeded(chat_id)
+    if refusal:
+        return await client.send_message(chat_id, refusal)
+    vid     = await db.run(db.get_vid_filename, chat_id)
     if not vid:
         return await client.send_message(chat_id, 'First send a Video File', parse_mode=ParseMode.HTML)
 
-    final_name = db.get_filename(chat_id)
+    final_name = await db.run(db.get_filename, chat_id)
     job_id     = uuid.uuid4().hex[:8]
     status     = await client.send_message(
         chat_id,
@@ -85,90 +209,629 @@ async def enqueue_nosub(client, message):
         parse_mode=ParseMode.HTML
     )
 
-    await job_queue.put(Job(job_id, 'nosub', chat_id, vid, None, final_name, status))
-    db.erase(chat_id)
+    await job_queue.put(Job(job_id, 'trim', chat_id, vid, None, final_name, status.id, trim=(start_at, end_at, exact)))
+    await _drop_unused_subs(chat_id)
+    await db.run(db.erase, chat_id)
+
+@Client.on_message(filters.command('auto') & check_user & filters.private)
+async def enqueue_auto(client, message):
+    """Queue the cheapest mode that still honours the settings, with the reasons and predicted cost."""
+    chat_id = message.from_user.id
+    refusal = await _quota_exceeded(chat_id)
+    if refusal:
+        return await client.send_message(chat_id, refusal)
+    vid     = await db.run(db.get_vid_filename, chat_id)
+    sub     = await db.run(db.get_sub_filename, chat_id)
+    if not vid:
+        return await client.send_message(chat_id, 'First send a Video File', parse_mode=ParseMode.HTML)
+
+    cfg      = SettingsManager.get(chat_id)
+    vid_path = os.path.join(Config.DOWNLOAD_DIR, vid)
+    note     = ''
+    if os.path.exists(vid_path):
+        info = await probe_streams(vid_path)
+        size = os.path.getsize(vid_path)
+    else:
+        # lazily ingested: only the size Telegram reported is known yet
+        ref  = await db.run(db.get_pending_ingest, vid)
+        info = {}
+        size = ref[2] if ref else 0
+        note = "\n<i>(video not downloaded yet, decided from its size and your settings)</i>"
+    mode, reasons, alt = decide(info, cfg, sub, size, _target_bytes(cfg))
+
+    tracks = tuple(await db.run(db.get_sub_tracks, chat_id)) if mode == 'soft' else ()
+    if sub:
+        refusal = await _misfit_subtitle(vid, [t[0] for t in tracks] or [sub])
+        if refusal:
+            return await client.send_message(chat_id, refusal)
+
+    final_name = await db.run(db.get_filename, chat_id)
+    job_id     = uuid.uuid4().hex[:8]
+    status     = await client.send_message(
+        chat_id,
+        f"🤖 <b>Auto:</b> {MODE_NAMES[mode]}\n"
+        + "".join(f"• {r}\n" for r in reasons)
+        + f"\n⏱️ Predicted ~{_fmt_time(ingestor.estimate(mode, size))}, "
+          f"{MODE_NAMES[alt]} would take ~{_fmt_time(ingestor.estimate(alt, size))}{note}\n\n"
+          f"🧾 Job <code>{job_id}</code> enqueued at position {job_queue.qsize() + 1}",
+        parse_mode=ParseMode.HTML
+    )
+
+    kept = sub if mode in ('soft', 'hard') else None
+    await job_queue.put(Job(job_id, mode, chat_id, vid, kept, final_name, status.id, subs=tracks))
+    await _drop_unused_subs(chat_id, keep=(kept, *(t[0] for t in tracks)))
+    await db.run(db.erase, chat_id)
+
+@Client.on_message(filters.command('batch') & check_user & filters.private)
+async def batch_cmd(client, message):
+    """
+    /batch               – start collecting videos/subtitles (or .zip archives)
+    /batch soft|hard|nosub – pair everything by filename/episode and enqueue it
+    /batch cancel        – drop the collected files
+    """
+    chat_id = message.from_user.id
+    arg = message.command[1].lower() if len(message.command) > 1 else ''
+
+    if not arg:
+        await db.run(db.start_batch, chat_id)
+        return await message.reply_text(
+            "📦 <b>Batch mode on.</b>\n\n"
+            "Send all videos and subtitles (or a <code>.zip</code> with them). "
+            "They are paired by filename / episode number.\n"
+            "Then send <code>/batch soft</code>, <code>/batch hard</code> or <code>/batch nosub</code>.\n"
+            "<code>/batch cancel</code> drops everything collected.",
+            parse_mode=ParseMode.HTML
+        )
+
+    if arg == 'cancel':
+        for kind in ('video', 'sub'):
+            for stored, _ in await db.run(db.get_batch_items, chat_id, kind):
+                try:
+                    await asyncio.to_thread(os.remove, os.path.join(Config.DOWNLOAD_DIR, stored))
+                except OSError:
+                    pass
+        await db.run(db.end_batch, chat_id)
+        return await message.reply_text("🗑 Batch discarded.")
+
+    if arg not in ('soft', 'hard', 'nosub'):
+        return await message.reply_text("Usage: /batch [soft|hard|nosub|cancel]")
+    refusal = await _quota_exceeded(chat_id)
+    if refusal:
+        return await message.reply_text(refusal)
+
+    videos = await db.run(db.get_batch_items, chat_id, 'video')
+    subs   = await db.run(db.get_batch_items, chat_id, 'sub')
+    if not videos:
+        return await message.reply_text("No videos collected yet. Send /batch and then your files.")
+
+    pairs, leftover = pair_files(videos, subs if arg != 'nosub' else [])
+    notes = []
+    if arg != 'nosub':
+        for (_, og), sub in pairs:
+            if sub is None:
+                notes.append(f"⚠️ No subtitle for <code>{og}</code>, skipped")
+        pairs = [p for p in pairs if p[1] is not None]
+    for _, og in leftover:
+        notes.append(f"⚠️ Subtitle <code>{og}</code> matched no video")
+
+    # probe all inputs at once; unreadable videos are dropped before they hit the queue
+    durations = await asyncio.gather(*(
+        _probe_duration(os.path.join(Config.DOWNLOAD_DIR, vid[0])) for vid, _ in pairs
+    ))
+    good = []
+    for (vid, sub), dur in zip(pairs, durations):
+        if dur > 0:
+            good.append((vid, sub))
+        else:
+            notes.append(f"⚠️ <code>{vid[1]}</code> is not a readable video, skipped")
+
+    await db.run(db.end_batch, chat_id)
+    if not good:
+        return await message.reply_text("Nothing to do.\n\n" + "\n".join(notes), parse_mode=ParseMode.HTML)
+
+    batch_id = uuid.uuid4().hex[:8]
+    card = await client.send_message(chat_id, f"📦 Batch <code>{batch_id}</code> queued…", parse_mode=ParseMode.HTML)
+    batches[batch_id] = dict(chat_id=chat_id, msg=card, jobs=[], done=0, failed=0, cancelled=0)
+
+    for (vid, og), sub in good:
+        job_id = uuid.uuid4().hex[:8]
+        status = await client.send_message(
+            chat_id,
+            f"🧾 Job <code>{job_id}</code> (<code>{og}</code>) enqueued at position {job_queue.qsize() + 1}",
+            parse_mode=ParseMode.HTML,
+            disable_notification=True
+        )
+        batches[batch_id]['jobs'].append(job_id)
+        await job_queue.put(Job(job_id, arg, chat_id, vid, sub[0] if sub else None, og, status.id, batch_id))
+
+    if notes:
+        await client.send_message(chat_id, "\n".join(notes), parse_mode=ParseMode.HTML)
+    await batch_report(batch_id)
+
+async def cancel_jobs(client, ids) -> tuple:
+    """Cancel queued jobs and kill running ones (used by /cancel and the HTTP API). Returns (removed, killed)."""
+    # Drop from the pending queue if not started (O(1) per job, skipped lazily by the worker)
+    removed = False
+    for jid in ids:
+        job = job_queue.cancel(jid)
+        if not job:
+            continue
+        removed = True
+        await ingestor.forget(job.vid)
+        try:
+            await client.edit_message_text(
+                job.chat_id, job.status_msg_id,
+                f"❌ Job <code>{jid}</code> cancelled before start.", parse_mode=ParseMode.HTML
+            )
+        except:
+            pass
+        if job.batch_id:
+            await batch_job_finished(job.batch_id, 'cancelled')
+
+    # If running, kill ffmpeg
+    killed = False
+    for jid in ids:
+        entry = running_jobs.get(jid)
+        if not entry:
+            continue
+        _cancelled.add(jid)
+        resume_job(jid)   # a paused job would otherwise wait forever for its next process
+        entry['proc'].kill()
+        for t in entry['tasks']:
+            t.cancel()
+        running_jobs.pop(jid, None)
+        killed = True
+    return removed, killed
 
 @Client.on_message(filters.command('cancel') & check_user & filters.private)
 async def cancel_job(client, message):
     if len(message.command) != 2:
-        return await message.reply_text("Usage: /cancel <job_id>", parse_mode=ParseMode.HTML)
+        return await message.reply_text("Usage: /cancel <job_id|batch_id>", parse_mode=ParseMode.HTML)
     target = message.command[1]
+    batch  = batches.get(target)
+    ids    = set(batch['jobs']) if batch else {target}
 
-    # Remove from pending queue if not started
-    removed = False
-    temp_q  = asyncio.Queue()
-    while not job_queue.empty():
-        job = await job_queue.get()
-        if job.job_id == target:
-            removed = True
-            await job.status_msg.edit(f"❌ Job <code>{target}</code> cancelled before start.", parse_mode=ParseMode.HTML)
-        else:
-            await temp_q.put(job)
-        job_queue.task_done()
-    while not temp_q.empty():
-        await job_queue.put(await temp_q.get())
+    removed, killed = await cancel_jobs(client, ids)
+    if killed:
+        await message.reply_text(f"🛑 Job `<code>{target}</code>` aborted.", parse_mode=ParseMode.HTML)
+    elif not removed:
+        await message.reply_text(f"No job `<code>{target}</code>` found.", parse_mode=ParseMode.HTML)
 
-    if removed:
-        return
+@Client.on_message(filters.command('queue') & check_user & filters.private)
+async def show_queue(client, message):
+    """Your running and queued jobs with their positions (admins see the whole queue)."""
+    chat_id  = message.from_user.id
+    is_admin = str(chat_id) in Config.ADMINS
+    lines = []
+    for job in job_queue.running.values():
+        if is_admin or job.chat_id == chat_id:
+            lines.append(f"▶️ <code>{job.job_id}</code> {job.mode} – running")
+    if is_admin:
+        queued = [(pos, job_queue.get_job(jid)) for pos, jid in enumerate(job_queue.live_order(), 1)]
+    else:
+        queued = job_queue.jobs_for(chat_id)
+    for pos, job in queued[:50]:
+        owner = f" (user <code>{job.chat_id}</code>)" if is_admin else ""
+        lines.append(f"#{pos} <code>{job.job_id}</code> {job.mode}{owner}")
+    if len(queued) > 50:
+        lines.append(f"… and {len(queued) - 50} more")
 
-    # If running, kill ffmpeg
-    entry = running_jobs.get(target)
-    if not entry:
-        return await message.reply_text(f"No job `<code>{target}</code>` found.", parse_mode=ParseMode.HTML)
+    text = "\n".join(lines) if lines else "No jobs queued."
+    await message.reply_text(
+        f"📋 <b>Queue</b> ({job_queue.qsize()} waiting)\n\n{text}", parse_mode=ParseMode.HTML
+    )
+
+@Client.on_message(filters.command(['move', 'top']) & check_admin & filters.private)
+async def move_job(client, message):
+    """/move <job_id> <position>, /top <job_id>"""
+    args = message.command
+    if args[0] == 'top' and len(args) == 2:
+        target, pos = args[1], 1
+    elif args[0] == 'move' and len(args) == 3 and args[2].isdigit():
+        target, pos = args[1], int(args[2])
+    else:
+        return await message.reply_text("Usage: /move <job_id> <position> or /top <job_id>")
 
-    entry['proc'].kill()
-    for t in entry['tasks']:
-        t.cancel()
-    running_jobs.pop(target, None)
-    await message.reply_text(f"🛑 Job `<code>{target}</code>` aborted.", parse_mode=ParseMode.HTML)
+    if not job_queue.move(target, pos):
+        return await message.reply_text(f"No queued job <code>{target}</code>.", parse_mode=ParseMode.HTML)
+    await message.reply_text(
+        f"↕️ Job <code>{target}</code> is now at position {job_queue.position(target)}.",
+        parse_mode=ParseMode.HTML
+    )
+
+@Client.on_message(filters.command('urgent') & check_admin & filters.private)
+async def urgent_job(client, message):
+    """/urgent <job_id> – run a queued job now, pausing the running one until it is done."""
+    if len(message.command) != 2:
+        return await message.reply_text("Usage: /urgent <job_id>")
+    target = message.command[1]
+    if not job_queue.mark_urgent(target):
+        return await message.reply_text(f"No queued job <code>{target}</code>.", parse_mode=ParseMode.HTML)
+    await message.reply_text(
+        f"⚡ Job <code>{target}</code> starts next, the running job is paused meanwhile.",
+        parse_mode=ParseMode.HTML
+    )
 
 # --------------------- WORKER ---------------------
 
-async def queue_worker(client: Client):
-    while True:
-        job = await job_queue.get()
+def _renamed(job) -> str:
+    """File name the output gets in DOWNLOAD_DIR before upload; it is sent as job.final_name."""
+    return f"{job.job_id}_{os.path.basename(job.final_name)}"
+
+def _as_video(job, out_file: str) -> bool:
+    """/uploadas video applies to MP4 outputs; API jobs carry their own settings."""
+    cfg = job.cfg or SettingsManager.get(job.chat_id)
+    return cfg.get('upload_as', 'document') == 'video' and out_file.endswith('.mp4')
+
+async def _upload(client, job, status, path: str, out_file: str, file_name: str = None, caption: str = None,
+                  progress=progress_bar, progress_args: tuple = None):
+    """
+    Send the result. MP4 outputs go out as streamable videos (with probed
+    duration/size and a thumbnail) when the user chose /uploadas video,
+    everything else as a document.
+    """
+    t0 = time.time()
+    file_name = file_name or job.final_name
+    caption   = caption or file_name
+    own_bar   = progress_args is None
+    if own_bar:
+        progress_args = ('Uploading…', status, t0, job.job_id)
+    as_video = _as_video(job, out_file)
+    if Config.UPLOAD_SESSIONS > 1 and os.path.getsize(path) >= max(Config.UPLOAD_PARALLEL_MIN, BIG_FILE):
+        info  = await probe_video_info(path) if as_video else None
+        thumb = await make_thumbnail(path, info['duration']) if as_video else None
+        try:
+            return await send_parallel(
+                client, job.chat_id, path, file_name,
+                caption=caption,
+                progress=progress,
+                progress_args=progress_args,
+                video=info, thumb=thumb
+            )
+        except Exception as e:
+            logger.warning("Parallel upload of %s failed (%s), using the bot session", job.job_id, e)
+            if own_bar:
+                # the retry starts from zero: don't let its speed/ETA count the failed attempt
+                t0 = time.time()
+                progress_args = ('Uploading…', status, t0, job.job_id)
+        finally:
+            if thumb:
+                try:
+                    await asyncio.to_thread(os.remove, thumb)
+                except OSError:
+                    pass
 
-        await job.status_msg.edit(
+    if not as_video:
+        return await client.send_document(
+            job.chat_id,
+            document=path,
+            caption=caption,
+            file_name=file_name,   # keep nice filename
+            progress=progress,
+            progress_args=progress_args
+        )
+
+    info  = await probe_video_info(path)
+    thumb = await make_thumbnail(path, info['duration'])
+    try:
+        return await client.send_video(
+            job.chat_id,
+            video=path,
+            caption=caption,
+            file_name=file_name,
+            duration=info['duration'],
+            width=info['width'],
+            height=info['height'],
+            thumb=thumb,
+            supports_streaming=True,
+            progress=progress,
+            progress_args=progress_args
+        )
+    finally:
+        if thumb:
+            try:
+                await asyncio.to_thread(os.remove, thumb)
+            except OSError:
+                pass
+
+async def _upload_parts(client, job, status, parts: list):
+    """
+    Send the parts of a split output as a labelled series. Their bytes go up
+    SPLIT_UPLOAD_PARALLEL at a time with one progress bar over all of them,
+    then the messages are sent one by one so the chat shows them in order.
+    If one part fails, the uploads still running are stopped, the parts are
+    deleted and the error goes on the status message. Returns True once all
+    parts are sent.
+    """
+    stem, ext = os.path.splitext(job.final_name)
+    paths = [os.path.join(Config.DOWNLOAD_DIR, p) for p in parts]
+    names = [f"{stem}.part{i + 1:02d}{ext}" for i in range(len(paths))]
+    total = sum(os.path.getsize(p) for p in paths)
+    sent  = [0] * len(paths)
+    t0    = time.time()
+    sem   = asyncio.Semaphore(Config.SPLIT_UPLOAD_PARALLEL)
+
+    async def _save(i, path):
+        async def _progress(current, _total):
+            sent[i] = current
+            await progress_bar(sum(sent), total, f'Uploading {len(paths)} parts…', status, t0, job.job_id)
+        async with sem:
+            if Config.UPLOAD_SESSIONS > 1 and os.path.getsize(path) >= max(Config.UPLOAD_PARALLEL_MIN, BIG_FILE):
+                try:
+                    return await save_parallel(client, path, names[i], _progress)
+                except Exception as e:
+                    logger.warning("Parallel upload of %s part %d failed (%s), using the bot session",
+                                   job.job_id, i + 1, e)
+                    sent[i] = 0
+            return await client.save_file(path, progress=_progress)
+
+    tasks = [asyncio.create_task(_save(i, p)) for i, p in enumerate(paths)]
+    try:
+        files = await asyncio.gather(*tasks)
+        as_video = _as_video(job, parts[0])
+        for i, (path, file) in enumerate(zip(paths, files)):
+            info  = await probe_video_info(path) if as_video else None
+            thumb = await make_thumbnail(path, info['duration']) if as_video else None
+            try:
+                await send_uploaded(client, job.chat_id, file, names[i],
+                                    caption=f"{job.final_name} – part {i + 1}/{len(paths)}",
+                                    video=info, thumb=thumb)
+            finally:
+                if thumb:
+                    try:
+                        await asyncio.to_thread(os.remove, thumb)
+                    except OSError:
+                        pass
+        return True
+    except Exception as e:
+        logger.exception("Uploading the parts of %s failed", job.job_id)
+        try:
+            await status.edit(f"❌ Job <code>{job.job_id}</code>: uploading the parts failed: "
+                              f"<code>{html.escape(str(e) or type(e).__name__)}</code>", parse_mode=ParseMode.HTML)
+        except Exception:
+            pass
+    finally:
+        # a failed (or cancelled) part stops the others before their files go away
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    for path in paths:
+        try:
+            await asyncio.to_thread(storage.remove, path)
+        except OSError:
+            pass
+    return False
+
+async def _run_job(client: Client, job: Job):
+    """
+    Everything the worker does for one job: fetch, mux/encode, split, upload,
+    report. Whatever goes wrong inside, the job is recorded as failed and the
+    worker carries on with the next one.
+    """
+    status = StatusMessage(client, job.chat_id, job.status_msg_id, job.job_id)
+    # every record logged while this job runs (ffmpeg, upload, ingest) carries its id
+    current_job.set(job.job_id)
+    logger.info("Job started", extra={'mode': job.mode, 'user_id': job.chat_id, 'vid': job.vid})
+
+    # phase timestamps for the job trace, filled in as the job gets there
+    times = {'start': time.time(), 'in_size': 0}
+    outcome = 'failed'
+    try:
+        outcome = await _process(client, job, status, times)
+    except Exception as e:
+        logger.exception("Job crashed")
+        try:
+            await status.edit(f"❌ Job <code>{job.job_id}</code> failed: "
+                              f"<code>{html.escape(str(e) or type(e).__name__)}</code>", parse_mode=ParseMode.HTML)
+        except Exception:
+            pass
+    finally:
+        await _job_ended(job, outcome, times)
+
+async def _process(client: Client, job: Job, status, times: dict) -> str:
+    """The steps of _run_job; returns the outcome ('done', 'failed' or 'cancelled')."""
+    try:
+        await status.edit(
             f"▶️ Starting <code>{job.job_id}</code> ({job.mode})…  "
             f"Use <code>/cancel {job.job_id}</code> to abort.",
             parse_mode=ParseMode.HTML
         )
+    except:
+        pass
 
+    # lazily ingested inputs: normally prefetched already, else fetched now
+    ingestor.job_started(job.job_id)
+    fetched = await ingestor.ensure(job.vid, status, job.job_id)
+    times['fetched'] = time.time()
+    if not fetched:
+        out_file = False
+        try:
+            await status.edit(f"❌ Could not fetch the input of <code>{job.job_id}</code>.", parse_mode=ParseMode.HTML)
+        except:
+            pass
+    else:
+        times['in_size'] = os.path.getsize(os.path.join(Config.DOWNLOAD_DIR, job.vid))
         if job.mode == 'soft':
-            out_file = await softmux_vid(job.vid, job.sub, msg=job.status_msg)
+            out_file = await softmux_vid(job.vid, job.sub, msg=status, job_id=job.job_id, subs=job.subs, cfg=job.cfg)
         elif job.mode == 'hard':
-            out_file = await hardmux_vid(job.vid, job.sub, msg=job.status_msg)
+            out_file = await hardmux_vid(job.vid, job.sub, msg=status, job_id=job.job_id, cfg=job.cfg)
+        elif job.mode == 'remux':
+            out_file = await remux_vid(job.vid, msg=status, job_id=job.job_id)
+        elif job.mode == 'trim':
+            start_at, end_at, exact = job.trim
+            out_file = await trim_vid(job.vid, status, job.job_id, start_at, end_at, exact)
         else:  # nosub
-            out_file = await nosub_encode(job.vid, msg=job.status_msg)
+            out_file = await nosub_encode(job.vid, msg=status, job_id=job.job_id, cfg=job.cfg)
+    ingestor.job_finished(job.job_id)
+    if out_file:
+        ingestor.observe(job.mode, times['in_size'], time.time() - times['start'])
 
-        if out_file:
-            # rename to desired final name
-            src = os.path.join(Config.DOWNLOAD_DIR, out_file)
-            dst = os.path.join(Config.DOWNLOAD_DIR, job.final_name)
+    # over Telegram's limit: cut into stream-copied parts instead of failing the upload
+    parts = []
+    if out_file and os.path.getsize(os.path.join(Config.DOWNLOAD_DIR, out_file)) > Config.TG_MAX_FILE_SIZE:
+        parts = await split_vid(out_file, status, job.job_id)
+        if not parts:
             try:
-                os.rename(src, dst)
+                await status.edit(f"❌ Job <code>{job.job_id}</code>: the output is over the upload limit "
+                                  f"and could not be split.", parse_mode=ParseMode.HTML)
             except Exception:
-                dst = src  # fallback
-
-            # upload with progress UI
-            t0 = time.time()
-            await client.send_document(
-                job.chat_id,
-                document=dst,
-                caption=job.final_name,
-                file_name=job.final_name,   # keep nice filename
-                progress=progress_bar,
-                progress_args=('Uploading…', job.status_msg, t0, job.job_id)
-            )
+                pass
+            try:
+                await asyncio.to_thread(os.remove, os.path.join(Config.DOWNLOAD_DIR, out_file))
+            except OSError:
+                pass
+            out_file = False
+
+    times['upload'] = time.time()
+    if out_file and parts:
+        if not await _upload_parts(client, job, status, parts):
+            try:
+                await asyncio.to_thread(storage.remove, os.path.join(Config.DOWNLOAD_DIR, out_file))
+            except OSError:
+                pass
+            out_file = False
+    elif out_file:
+        # rename to desired final name (on disk under the job id, so no name can hit another file)
+        src = os.path.join(Config.DOWNLOAD_DIR, out_file)
+        dst = os.path.join(Config.DOWNLOAD_DIR, _renamed(job))
+        try:
+            await asyncio.to_thread(os.rename, src, dst)
+        except Exception:
+            dst = src  # fallback
+
+        # upload with progress UI
+        await _upload(client, job, status, dst, out_file)
+    times['uploaded'] = time.time()
+
+    if not out_file:
+        return 'cancelled' if job.job_id in _cancelled else 'failed'
 
-            await job.status_msg.edit(f"✅ Job <code>{job.job_id}</code> done.", parse_mode=ParseMode.HTML)
+    usage, retries = job_usage.get(job.job_id), job_retries.get(job.job_id)
+    spent = f"\n✂️ Sent in {len(parts)} parts (over the upload limit)" if parts else ''
+    if usage:
+        spent += (f"\n⚙️ CPU {round(cpu_seconds(usage))}s · "
+                  f"peak RAM {humanbytes(usage['peak_rss'])}")
+    if retries:
+        spent += f"\n♻️ Retried {len(retries)}× ({retries[-1]['reason']})"
+    await status.edit(f"✅ Job <code>{job.job_id}</code> done.{spent}", parse_mode=ParseMode.HTML)
 
-            # cleanup best-effort
-            for fn in (job.vid, job.sub, job.final_name):
+    # cleanup best-effort
+    split = [out_file, *parts] if parts else []
+    for fn in {job.vid, job.sub, _renamed(job), *(t[0] for t in job.subs), *split}:
+        try:
+            if fn:
+                await asyncio.to_thread(storage.remove, os.path.join(Config.DOWNLOAD_DIR, fn))
+        except:
+            pass
+    return 'done'
+
+async def _job_ended(job: Job, outcome: str, times: dict):
+    """Bookkeeping every job gets however it ended: usage, batch card, trace, journal state."""
+    ingestor.job_finished(job.job_id)
+    # whatever the outcome, this input's keyframe index is not needed any more
+    keyframes.forget(os.path.join(Config.DOWNLOAD_DIR, job.vid))
+    _cancelled.discard(job.job_id)
+    usage   = job_usage.pop(job.job_id, None)
+    retries = job_retries.pop(job.job_id, None)
+    pause   = preempt.job_pauses.pop(job.job_id, None)
+    now     = time.time()
+    try:
+        if usage:
+            await db.run(db.record_usage, job.job_id, job.chat_id, job.mode, usage, now)
+        if retries:
+            await db.run(db.record_retries, job.job_id, job.chat_id, retries)
+        if job.batch_id:
+            await batch_job_finished(job.batch_id, outcome)
+
+        # phases of this job for the scheduler simulator (python -m helper_func.simulator)
+        start     = times['start']
+        fetched   = times.get('fetched', now)
+        upload    = times.get('upload', now)
+        queued_at = job_queue.queued_at.get(job.job_id, start)
+        paused    = pause.seconds() if pause else 0.0
+        await db.run(db.record_trace, (
+            job.job_id, job.chat_id, job.mode, times['in_size'], queued_at,
+            ingestor.download_seconds.pop(job.vid, None), start - queued_at, fetched - start,
+            max(0.0, upload - fetched - paused), times.get('uploaded', now) - upload, outcome, now,
+        ))
+    except Exception:
+        logger.exception("Recording the end of the job failed")
+    finally:
+        job_queue.done(job.job_id, outcome)
+        logger.info("Job finished", extra={'outcome': outcome, 'seconds': round(time.time() - times['start'], 1)})
+        current_job.set(None)
+
+
+async def _urgent_job(running: Job, remaining: float):
+    """
+    A queued job that should pause `running`: one an admin marked /urgent, or
+    a short one while `running` still has a long way to go and has not been
+    held back for PREEMPT_MAX_PAUSE seconds yet (so a steady trickle of short
+    jobs cannot starve it).
+    """
+    order = job_queue.live_order()
+    for job_id in order:
+        if job_id in job_queue.urgent:
+            return job_queue.get_job(job_id)
+    if not Config.PREEMPT_SHORT_SECONDS or remaining < Config.PREEMPT_MIN_REMAINING:
+        return None
+    pause  = preempt.job_pauses.get(running.job_id)
+    budget = Config.PREEMPT_MAX_PAUSE - (pause.seconds() if pause else 0.0)
+    for job_id in order:
+        job = job_queue.get_job(job_id)
+        est = ingestor.estimate(job.mode, await ingestor.input_size(job.vid))
+        if est <= min(Config.PREEMPT_SHORT_SECONDS, budget):
+            return job
+    return None
+
+async def _preempt(client: Client, running: Job):
+    """Pause `running`, run the urgent / short jobs that are waiting, then resume it."""
+    # frozen while paused, so a long pause does not make the job look nearly done
+    remaining = ingestor.remaining(running.job_id, running.mode, await ingestor.input_size(running.vid))
+    urgent = await _urgent_job(running, remaining)
+    if urgent is None or not pause_job(running.job_id):
+        return
+    status = StatusMessage(client, running.chat_id, running.status_msg_id)
+    logger.info("Pausing job %s for %s", running.job_id, urgent.job_id)
+    try:
+        while urgent is not None:
+            try:
+                await status.edit(f"⏸️ Job <code>{running.job_id}</code> paused while the quicker job "
+                                  f"<code>{urgent.job_id}</code> runs; it keeps its progress.", parse_mode=ParseMode.HTML)
+            except Exception:
+                pass
+            job = job_queue.take(urgent.job_id)
+            if job is not None:
                 try:
-                    if fn:
-                        os.remove(os.path.join(Config.DOWNLOAD_DIR, fn))
-                except:
-                    pass
+                    await _run_job(client, job)
+                except Exception:
+                    # _run_job records its own failures; this is only a last line of defence
+                    logger.exception("Urgent job %s crashed", job.job_id)
+                    job_queue.done(job.job_id, 'failed')
+            urgent = await _urgent_job(running, remaining)
+    finally:
+        # whatever happened meanwhile, the paused job must get its SIGCONT
+        paused_for = resume_job(running.job_id)
+    ingestor.job_resumed(running.job_id, paused_for)
+    logger.info("Resumed job %s after %.0fs", running.job_id, paused_for)
+    try:
+        await status.edit(f"▶️ Job <code>{running.job_id}</code> resumed after {_fmt_time(paused_for)}.",
+                          parse_mode=ParseMode.HTML)
+    except Exception:
+        pass
 
-        job_queue.task_done()
+async def queue_worker(client: Client):
+    while True:
+        job = await job_queue.get()
+        current = asyncio.create_task(_run_job(client, job))
+        # while it runs, every newly queued job is a chance to preempt it
+        while not current.done():
+            arrival = asyncio.create_task(job_queue.wait_new())
+            await asyncio.wait([current, arrival], return_when=asyncio.FIRST_COMPLETED)
+            arrival.cancel()
+            if not current.done():
+                try:
+                    await _preempt(client, job)
+                except Exception:
+                    logger.exception("Preempting job %s failed", job.job_id)
+        await current
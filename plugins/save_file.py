@@ -1,14 +1,12 @@
 import logging
-logging.basicConfig(level=logging.DEBUG,
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-
 logger = logging.getLogger(__name__)
-logging.getLogger("pyrogram").setLevel(logging.WARNING)
 
 import os
 import time
 import re
 import uuid
+import asyncio
+import zipfile
 import requests
 import aiohttp
 from urllib.parse import unquote, urlparse
@@ -18,6 +16,12 @@ from pyrogram import Client, filters
 from pyrogram.enums import ParseMode
 from helper_func.progress_bar import progress_bar
 from helper_func.dbhelper import Database as Db
+from helper_func.batch import VIDEO_EXTS, SUB_EXTS, extract_archive
+from helper_func.subtitles import guess_language
+from helper_func.preflight import preflight, SubtitleError
+from helper_func.settings_manager import SettingsManager
+from helper_func.ingest import ingestor
+from helper_func import keyframes, storage
 
 db = Db()
 
@@ -74,13 +78,15 @@ async def _download_http_with_progress(url: str, dest_dir: str, status_msg, star
             unique_name = f"{base}_{uuid.uuid4().hex[:6]}{ext}"
             full_path = os.path.join(dest_dir, unique_name)
 
+            loop = asyncio.get_running_loop()
             downloaded = 0
             chunk_size = 1024 * 1024  # 1MB
             with open(full_path, 'wb') as f:
                 async for chunk in resp.content.iter_chunked(chunk_size):
                     if not chunk:
                         continue
-                    f.write(chunk)
+                    # disk writes of 1MB chunks go to a thread, not the event loop
+                    await loop.run_in_executor(None, f.write, chunk)
                     downloaded += len(chunk)
 
                     await progress_bar(
@@ -95,6 +101,96 @@ async def _download_http_with_progress(url: str, dest_dir: str, status_msg, star
     return unique_name
 
 
+async def _preflight_sub(chat_id, path):
+    """
+    Normalise an uploaded subtitle off the event loop. Returns (filename, note)
+    or (None, reason) when the file is unusable (it is deleted then).
+    """
+    to_ass = SettingsManager.get(chat_id).get('srt_to_ass', 'off') == 'on'
+    try:
+        info = await asyncio.to_thread(preflight, path, to_ass)
+    except SubtitleError as e:
+        try:
+            await asyncio.to_thread(os.remove, path)
+        except OSError:
+            pass
+        return None, str(e)
+    note = f"\n{info['events']} lines"
+    if info['encoding'] not in ('utf-8', 'utf-8-sig', 'ascii'):
+        note += f", converted from {info['encoding']}"
+    if info['repairs']:
+        note += f", repaired: {', '.join(info['repairs'])}"
+    return os.path.basename(info['path']), note
+
+
+async def _add_to_batch(client, chat_id, status_id, tg_filename, og_name):
+    """File arrived while /batch is collecting: store it (or unpack a .zip) as a batch item."""
+    ext   = og_name.split('.').pop().lower()
+    src   = os.path.join(Config.DOWNLOAD_DIR, tg_filename)
+    stamp = f"{int(time.time())}_{uuid.uuid4().hex[:6]}"
+
+    if ext == 'zip':
+        try:
+            items = await asyncio.to_thread(extract_archive, src, stamp)
+        except zipfile.BadZipFile:
+            items = None
+        await asyncio.to_thread(os.remove, src)
+        if items is None:
+            return await client.edit_message_text(text='❌ Not a valid .zip archive.', chat_id=chat_id, message_id=status_id)
+    elif ext in VIDEO_EXTS + SUB_EXTS:
+        stored = f"{stamp}.{ext}"
+        await asyncio.to_thread(os.rename, src, os.path.join(Config.DOWNLOAD_DIR, stored))
+        items = [(stored, og_name)]
+    else:
+        await asyncio.to_thread(os.remove, src)
+        text = Chat.UNSUPPORTED_FORMAT.format(ext) + f'\nFile = {tg_filename}'
+        return await client.edit_message_text(text=text, chat_id=chat_id, message_id=status_id)
+
+    rejected = []
+    for stored, og in items:
+        kind = 'sub' if stored.rsplit('.', 1)[-1] in SUB_EXTS else 'video'
+        if kind == 'sub':
+            stored, why = await _preflight_sub(chat_id, os.path.join(Config.DOWNLOAD_DIR, stored))
+            if stored is None:
+                rejected.append(f'{og}: {why}')
+                continue
+        await db.run(db.add_batch_item, chat_id, kind, stored, og)
+
+    n_vid = len(await db.run(db.get_batch_items, chat_id, 'video'))
+    n_sub = len(await db.run(db.get_batch_items, chat_id, 'sub'))
+    text = (f'📦 Added {len(items) - len(rejected)} file(s) to the batch.\n'
+            f'Videos: {n_vid} | Subtitles: {n_sub}\n\n'
+            'Send more, or [ /batch soft , /batch hard , /batch nosub ] to start.')
+    if rejected:
+        text += '\n\n❌ Rejected subtitles:\n' + '\n'.join(rejected)
+    await client.edit_message_text(text=text, chat_id=chat_id, message_id=status_id)
+
+
+async def _maybe_defer(client, message, chat_id, start_time):
+    """
+    LAZY_INGEST: for a Telegram video only remember its file_id; the ingest
+    scheduler downloads it when its job gets close to the front of the queue.
+    Returns True when the file was deferred.
+    """
+    if not Config.LAZY_INGEST or await db.run(db.in_batch, chat_id):
+        return False
+    media = message.document or message.video
+    og_name = getattr(media, 'file_name', None) or ('video.mp4' if message.video else '')
+    ext = og_name.split('.').pop().lower() if '.' in og_name else ''
+    if media is None or ext not in VIDEO_EXTS:
+        return False
+
+    filename = str(round(start_time))+'.'+ext
+    await ingestor.record(chat_id, filename, media.file_id, media.file_size or 0)
+    await db.run(db.put_video, chat_id, filename, og_name)
+    if await db.run(db.check_sub, chat_id):
+        text = 'Video noted, it will be fetched right before its job runs.\nChoose : [ /softmux , /hardmux , /nosub ]'
+    else:
+        text = 'Video noted, it will be fetched right before its job runs.\nChoose[ /softmux , /hardmux , /nosub ].'
+    await client.send_message(chat_id, text)
+    return True
+
+
 # ================================
 # Handlers
 # ================================
@@ -103,6 +199,8 @@ async def _download_http_with_progress(url: str, dest_dir: str, status_msg, star
 async def save_doc(client, message):
     chat_id = message.from_user.id
     start_time = time.time()
+    if await _maybe_defer(client, message, chat_id, start_time):
+        return
     downloading = await client.send_message(chat_id, 'Downloading your File!')
     download_location = await client.download_media(
         message=message,
@@ -131,22 +229,48 @@ async def save_doc(client, message):
         og_filename = False
 
     save_filename = og_filename if og_filename else tg_filename
+    if await db.run(db.in_batch, chat_id):
+        return await _add_to_batch(client, chat_id, downloading.id, tg_filename, save_filename)
+
     ext = save_filename.split('.').pop()
     filename = str(round(start_time))+'.'+ext
 
     if ext in ['srt', 'ass']:
-        os.rename(Config.DOWNLOAD_DIR+'/'+tg_filename, Config.DOWNLOAD_DIR+'/'+filename)
-        db.put_sub(chat_id, filename)
-        if db.check_video(chat_id):
-            text = 'Subtitle file downloaded successfully.\nChoose : [ /softmux , /hardmux , /nosub ]'
+        # several subtitles can be collected for one soft-mux, keep their names apart
+        filename = str(round(start_time))+'_'+uuid.uuid4().hex[:4]+'.'+ext
+        await asyncio.to_thread(os.rename, Config.DOWNLOAD_DIR+'/'+tg_filename, Config.DOWNLOAD_DIR+'/'+filename)
+        filename, checked = await _preflight_sub(chat_id, Config.DOWNLOAD_DIR+'/'+filename)
+        if filename is None:
+            text = f'❌ Subtitle rejected: {checked}.\nFix it and send it again.'
+            return await client.edit_message_text(text=text, chat_id=chat_id, message_id=downloading.id)
+        await db.run(db.put_sub, chat_id, filename)
+        lang, title = guess_language(save_filename, message.caption)
+        replaced = await db.run(db.add_sub_track, chat_id, filename, lang, title)
+        if replaced:
+            # a corrected re-send takes the place of the earlier file instead of adding a second track
+            try:
+                await asyncio.to_thread(storage.remove, Config.DOWNLOAD_DIR+'/'+replaced)
+            except OSError:
+                pass
+        tracks = await db.run(db.get_sub_tracks, chat_id)
+        number = next((i for i, t in enumerate(tracks, 1) if t[0] == filename), len(tracks))
+        track_info = checked + f'\nTrack {number}: {lang}' + (f' ({title})' if title else '')
+        if replaced:
+            track_info += ' – replaces the one you sent before'
+        if len(tracks) > 1:
+            track_info += f'\n/softmux will add all {len(tracks)} subtitle tracks.'
+        if await db.run(db.check_video, chat_id):
+            text = 'Subtitle file downloaded successfully.'+track_info+'\nChoose : [ /softmux , /hardmux , /nosub ]'
         else:
-            text = 'Subtitle file downloaded.\nNow send Video File!'
+            text = 'Subtitle file downloaded.'+track_info+'\nNow send Video File!'
         await client.edit_message_text(text=text, chat_id=chat_id, message_id=downloading.id)
 
     elif ext in ['mp4', 'mkv']:
-        os.rename(Config.DOWNLOAD_DIR+'/'+tg_filename, Config.DOWNLOAD_DIR+'/'+filename)
-        db.put_video(chat_id, filename, save_filename)
-        if db.check_sub(chat_id):
+        await asyncio.to_thread(os.rename, Config.DOWNLOAD_DIR+'/'+tg_filename, Config.DOWNLOAD_DIR+'/'+filename)
+        keyframes.warm(Config.DOWNLOAD_DIR+'/'+filename)
+        ingestor.download_seconds[filename] = time.time() - start_time
+        await db.run(db.put_video, chat_id, filename, save_filename)
+        if await db.run(db.check_sub, chat_id):
             text = 'Video file downloaded successfully.\nChoose : [ /softmux , /hardmux , /nosub ]'
         else:
             text = 'Video file downloaded successfully.\nChoose[ /softmux , /hardmux , /nosub ].'
@@ -155,13 +279,15 @@ async def save_doc(client, message):
     else:
         text = Chat.UNSUPPORTED_FORMAT.format(ext)+f'\nFile = {tg_filename}'
         await client.edit_message_text(text=text, chat_id=chat_id, message_id=downloading.id)
-        os.remove(Config.DOWNLOAD_DIR+'/'+tg_filename)
+        await asyncio.to_thread(os.remove, Config.DOWNLOAD_DIR+'/'+tg_filename)
 
 
 @Client.on_message(filters.video & check_user & filters.private)
 async def save_video(client, message):
     chat_id = message.from_user.id
     start_time = time.time()
+    if await _maybe_defer(client, message, chat_id, start_time):
+        return
     downloading = await client.send_message(chat_id, 'Downloading your File!')
     download_location = await client.download_media(
         message=message,
@@ -190,12 +316,17 @@ async def save_video(client, message):
         og_filename = False
 
     save_filename = og_filename if og_filename else tg_filename
+    if await db.run(db.in_batch, chat_id):
+        return await _add_to_batch(client, chat_id, downloading.id, tg_filename, save_filename)
+
     ext = save_filename.split('.').pop()
     filename = str(round(start_time))+'.'+ext
-    os.rename(Config.DOWNLOAD_DIR+'/'+tg_filename, Config.DOWNLOAD_DIR+'/'+filename)
+    await asyncio.to_thread(os.rename, Config.DOWNLOAD_DIR+'/'+tg_filename, Config.DOWNLOAD_DIR+'/'+filename)
+    keyframes.warm(Config.DOWNLOAD_DIR+'/'+filename)
+    ingestor.download_seconds[filename] = time.time() - start_time
 
-    db.put_video(chat_id, filename, save_filename)
-    if db.check_sub(chat_id):
+    await db.run(db.put_video, chat_id, filename, save_filename)
+    if await db.run(db.check_sub, chat_id):
         text = 'Video file downloaded successfully.\nChoose : [ /softmux , /hardmux , /nosub ]'
     else:
         text = 'Video file downloaded successfully.\nChoose[ /softmux , /hardmux , /nosub ].'
@@ -224,8 +355,13 @@ async def save_url(client, message):
             job_id=job_id
         )
 
-        db.put_video(chat_id, saved_name, saved_name)
-        if db.check_sub(chat_id):
+        if await db.run(db.in_batch, chat_id):
+            return await _add_to_batch(client, chat_id, sent.id, saved_name, saved_name)
+
+        keyframes.warm(os.path.join(Config.DOWNLOAD_DIR, saved_name))
+        ingestor.download_seconds[saved_name] = time.time() - t0
+        await db.run(db.put_video, chat_id, saved_name, saved_name)
+        if await db.run(db.check_sub, chat_id):
             text = 'Video File Downloaded.\nChoose : [ /softmux , /hardmux , /nosub ]'
         else:
             text = 'Video file downloaded successfully.\nChoose[ /softmux , /hardmux , /nosub ].'
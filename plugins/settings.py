@@ -4,7 +4,10 @@ from pyrogram import Client, filters
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.enums import ParseMode
 from helper_func.settings_manager import SettingsManager
+from helper_func import encoders
+from helper_func.subtitles import LANGUAGES
 from config import Config
+import html
 
 # in‑memory state for who’s currently in settings
 _PENDING = {}
@@ -50,6 +53,16 @@ async def _check_user(filt, client, update):
 
 check_user = filters.create(_check_user)
 
+def _codec_options() -> list:
+    """CODECS this ffmpeg can encode, labelled with the implementation that will run."""
+    options = []
+    for name, family in CODECS:
+        impl = encoders.resolve(family)
+        if impl is None:
+            continue
+        options.append((name if impl == family else f"{name} ({impl})", family))
+    return options
+
 def _keyboard(options: list, tag: str) -> InlineKeyboardMarkup:
     """Build inline keyboard rows of one button each."""
     return InlineKeyboardMarkup(
@@ -68,6 +81,118 @@ async def start_settings(client: Client, message):
         parse_mode=ParseMode.HTML
     )
 
+@Client.on_message(filters.command("targetsize") & check_user & filters.private)
+async def set_target_size(client: Client, message):
+    """
+    /targetsize <MB>  – two-pass encode that lands just under that size
+    /targetsize tg    – fit Telegram's upload limit
+    /targetsize off   – back to plain CRF
+    """
+    uid = message.from_user.id
+    if len(message.command) != 2:
+        cur = SettingsManager.get(uid).get('target_size', 'off')
+        return await message.reply(
+            "Usage: <code>/targetsize &lt;MB|tg|off&gt;</code>\n"
+            f"Current: <code>{cur}</code>",
+            parse_mode=ParseMode.HTML
+        )
+
+    val = message.command[1].lower()
+    limit_mb = Config.TG_MAX_FILE_SIZE // (1024 * 1024)
+    if val not in ('off', 'tg'):
+        try:
+            mb = float(val)
+        except ValueError:
+            mb = 0
+        if not (1 <= mb <= limit_mb):
+            return await message.reply(
+                f"❌ Please enter a size between 1 and {limit_mb} MB, <code>tg</code> or <code>off</code>.",
+                parse_mode=ParseMode.HTML
+            )
+        val = str(int(mb)) if mb.is_integer() else str(mb)
+
+    SettingsManager.set(uid, 'target_size', val)
+    await message.reply(
+        f"✅ Target size set to <code>{val}</code>"
+        + (" (MB)" if val not in ('off', 'tg') else ""),
+        parse_mode=ParseMode.HTML
+    )
+
+@Client.on_message(filters.command("smartrender") & check_user & filters.private)
+async def set_smart_render(client: Client, message):
+    """/smartrender on|off – hard-mux re-encodes only the ranges that carry subtitles."""
+    uid = message.from_user.id
+    if len(message.command) != 2 or message.command[1].lower() not in ('on', 'off'):
+        cur = SettingsManager.get(uid).get('smart_render', 'off')
+        return await message.reply(
+            "Usage: <code>/smartrender on|off</code>\n"
+            f"Current: <code>{cur}</code>\n\n"
+            "Only used when resolution and FPS are <code>original</code> and the codec "
+            "matches the source video.",
+            parse_mode=ParseMode.HTML
+        )
+
+    val = message.command[1].lower()
+    SettingsManager.set(uid, 'smart_render', val)
+    await message.reply(f"✅ Smart-render <code>{val}</code>", parse_mode=ParseMode.HTML)
+
+@Client.on_message(filters.command("srt2ass") & check_user & filters.private)
+async def set_srt_to_ass(client: Client, message):
+    """/srt2ass on|off – convert uploaded SRT subtitles to styled ASS once, at upload."""
+    uid = message.from_user.id
+    if len(message.command) != 2 or message.command[1].lower() not in ('on', 'off'):
+        cur = SettingsManager.get(uid).get('srt_to_ass', 'off')
+        return await message.reply(
+            "Usage: <code>/srt2ass on|off</code>\n"
+            f"Current: <code>{cur}</code>\n\n"
+            "<code>on</code> turns SRT uploads into ASS with a default style (the bot's "
+            f"fallback font, {html.escape(Config.SUB_FALLBACK_FONT)}, with outline and shadow), "
+            "keeping italics, bold and colours.",
+            parse_mode=ParseMode.HTML
+        )
+
+    val = message.command[1].lower()
+    SettingsManager.set(uid, 'srt_to_ass', val)
+    await message.reply(f"✅ SRT to ASS conversion <code>{val}</code>", parse_mode=ParseMode.HTML)
+
+@Client.on_message(filters.command("uploadas") & check_user & filters.private)
+async def set_upload_as(client: Client, message):
+    """/uploadas video|document – send MP4 results as streamable videos or as files."""
+    uid = message.from_user.id
+    if len(message.command) != 2 or message.command[1].lower() not in ('video', 'document'):
+        cur = SettingsManager.get(uid).get('upload_as', 'document')
+        return await message.reply(
+            "Usage: <code>/uploadas video|document</code>\n"
+            f"Current: <code>{cur}</code>\n\n"
+            "<code>video</code> sends hard-mux / encode results as streamable MP4 "
+            "(plays instantly); MKV soft-mux output is always sent as a document.",
+            parse_mode=ParseMode.HTML
+        )
+
+    val = message.command[1].lower()
+    SettingsManager.set(uid, 'upload_as', val)
+    await message.reply(f"✅ Results will be sent as <code>{val}</code>", parse_mode=ParseMode.HTML)
+
+@Client.on_message(filters.command("defaultsub") & check_user & filters.private)
+async def set_default_sub(client: Client, message):
+    """/defaultsub first|none|<lang> – which soft-muxed subtitle track players pick by default."""
+    uid = message.from_user.id
+    val = message.command[1].lower() if len(message.command) == 2 else ''
+    # tracks are tagged with ISO 639-2 codes: "en" / "english" mean "eng"
+    if val in LANGUAGES:
+        val = LANGUAGES[val][0]
+    elif val not in ('first', 'none') and not (len(val) == 3 and val.isalpha()):
+        cur = SettingsManager.get(uid).get('default_sub', 'first')
+        return await message.reply(
+            "Usage: <code>/defaultsub first|none|&lt;lang&gt;</code> (e.g. <code>eng</code>)\n"
+            f"Current: <code>{cur}</code>\n\n"
+            "Tip: send a subtitle with caption <code>spa|Español</code> to set its language and title.",
+            parse_mode=ParseMode.HTML
+        )
+
+    SettingsManager.set(uid, 'default_sub', val)
+    await message.reply(f"✅ Default subtitle track: <code>{val}</code>", parse_mode=ParseMode.HTML)
+
 @Client.on_callback_query()
 async def handle_settings_cb(client: Client, cq):
     """Handle each button press."""
@@ -93,15 +218,17 @@ async def handle_settings_cb(client: Client, cq):
         _PENDING[uid] = 'codec'
         await cq.edit_message_text(
             "<b>Step 3/5</b>: Choose your video codec:",
-            reply_markup=_keyboard(CODECS, 'codec'),
+            reply_markup=_keyboard(_codec_options(), 'codec'),
             parse_mode=ParseMode.HTML
         )
 
     elif action == 'codec':
         SettingsManager.set(uid, 'codec', val)
         _PENDING[uid] = 'crf'
+        lo, hi = encoders.crf_range(val)
         await cq.edit_message_text(
-            "<b>Step 4/5</b>: Now send me a CRF value (0–51):",
+            f"<b>Step 4/5</b>: Now send me a CRF value ({lo}–{hi}), or <code>auto</code> "
+            "to pick it per video from sampled segments:",
             parse_mode=ParseMode.HTML
         )
 
@@ -122,7 +249,7 @@ async def handle_settings_cb(client: Client, cq):
 
 @Client.on_message(
     filters.text
-    & ~filters.command(["start","softmux","hardmux","nosub","cancel","settings"])
+    & ~filters.command(["start","softmux","hardmux","nosub","cancel","settings","targetsize","smartrender","batch","lag","queue","move","top","uploadas","usage","defaultsub","srt2ass","auto","loglevel","trim","urgent"])
     & check_user
     & filters.private,
     group=1
@@ -133,10 +260,11 @@ async def handle_crf_text(client: Client, message):
     if _PENDING.get(uid) != 'crf':
         return
 
-    txt = message.text.strip()
-    if not txt.isdigit() or not (0 <= int(txt) <= 51):
+    txt = message.text.strip().lower()
+    lo, hi = encoders.crf_range(SettingsManager.get(uid).get('codec', 'libx264'))
+    if txt != 'auto' and (not txt.isdigit() or not (lo <= int(txt) <= hi)):
         return await message.reply(
-            "❌ Please enter a number between 0 and 51."
+            f"❌ Please enter a number between {lo} and {hi}, or auto."
         )
 
     SettingsManager.set(uid, 'crf', txt)
@@ -0,0 +1,83 @@
+# plugins/stats.py
+
+from pyrogram import Client, filters
+from pyrogram.enums import ParseMode
+from helper_func.loop_monitor import monitor
+from helper_func import logs
+from helper_func.progress_bar import humanbytes
+from helper_func.dbhelper import Database as Db
+from config import Config
+import time, html
+
+db = Db()
+
+async def _check_user(filt, client, message):
+    return str(message.from_user.id) in Config.ALLOWED_USERS
+check_user = filters.create(_check_user)
+
+async def _check_admin(filt, client, message):
+    return str(message.from_user.id) in Config.ADMINS
+check_admin = filters.create(_check_admin)
+
+@Client.on_message(filters.command('lag') & check_user & filters.private)
+async def loop_lag(client, message):
+    """Event-loop health: heartbeat lag percentiles and the most recent stall."""
+    st = monitor.stats()
+    text = (
+        "🩺 <b>Event loop</b>\n\n"
+        f"• Lag p50: <code>{st['p50_ms']} ms</code>\n"
+        f"• Lag p99: <code>{st['p99_ms']} ms</code>\n"
+        f"• Lag max: <code>{st['max_ms']} ms</code>\n"
+        f"• Stalls ≥ {int(Config.LOOP_STALL_THRESHOLD * 1000)} ms: <code>{st['stalls']}</code>"
+    )
+    if monitor.stalls:
+        last = monitor.stalls[-1]
+        tail = "\n".join(last['stack'].strip().splitlines()[-6:])
+        text += f"\n\nLast stall ({last['duration'] * 1000:.0f} ms):\n<pre>{html.escape(tail)}</pre>"
+    await message.reply_text(text, parse_mode=ParseMode.HTML)
+
+@Client.on_message(filters.command('usage') & check_user & filters.private)
+async def usage_stats(client, message):
+    """
+    /usage [days]      – your ffmpeg CPU / RAM / IO per mode
+    /usage all [days]  – every user (admins only)
+    """
+    uid  = message.from_user.id
+    args = message.command[1:]
+    everyone = bool(args) and args[0] == 'all' and str(uid) in Config.ADMINS
+    if args and args[0] == 'all':
+        args = args[1:]
+    days  = float(args[0]) if args and args[0].replace('.', '', 1).isdigit() else 1
+    since = time.time() - days * 86400
+
+    rows = await db.run(db.usage_summary, since, None if everyone else uid)
+    if not rows:
+        return await message.reply_text("No finished jobs in that period.")
+
+    lines = []
+    for user_id, mode, jobs, cpu, rss, rd, wr in rows[:40]:
+        who = f"<code>{user_id}</code> " if everyone else ""
+        lines.append(
+            f"{who}<b>{mode}</b>: {jobs} job(s), CPU {round(cpu or 0)}s, "
+            f"peak RAM {humanbytes(rss)}, read {humanbytes(rd)}, wrote {humanbytes(wr)}"
+        )
+    text = f"📊 <b>Usage, last {days:g} day(s)</b>\n\n" + "\n".join(lines)
+    if Config.CPU_QUOTA_SECONDS and not everyone:
+        used = await db.run(db.cpu_used_since, uid, time.time() - Config.CPU_QUOTA_WINDOW)
+        text += f"\n\nQuota: {round(used)}s / {round(Config.CPU_QUOTA_SECONDS)}s CPU"
+    await message.reply_text(text, parse_mode=ParseMode.HTML)
+
+@Client.on_message(filters.command('loglevel') & check_admin & filters.private)
+async def log_level(client, message):
+    """
+    /loglevel                      – current levels
+    /loglevel <logger> <LEVEL>     – e.g. /loglevel helper_func.mux DEBUG (root = default)
+    """
+    args = message.command[1:]
+    if len(args) == 2:
+        try:
+            logs.set_level(args[0], args[1])
+        except ValueError as e:
+            return await message.reply_text(f"❌ {e}")
+    lines = [f"<code>{name}</code>: {level}" for name, level in logs.levels().items()]
+    await message.reply_text("🪵 <b>Log levels</b>\n\n" + "\n".join(lines), parse_mode=ParseMode.HTML)
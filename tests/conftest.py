@@ -0,0 +1,4 @@
+import os, sys
+
+# the bot runs from the repo root (`python muxbot.py`), so its modules import from there
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,18 @@
+from config import Config
+from helper_func.auto_mode import decide
+
+H264 = {'video': 'h264', 'audio': 'aac'}
+
+
+def test_copy_when_the_settings_allow_it():
+    assert decide(H264, {}, 'ep1.ass', 100, 0)[0] == 'soft'
+    mode, why, alternative = decide(H264, {}, None, 100, 0)
+    assert (mode, alternative) == ('remux', 'nosub') and 'streamable MP4' in why[-1]
+
+
+def test_encode_when_the_settings_or_size_need_it():
+    assert decide(H264, {'fps': '30'}, 'ep1.ass', 100, 0)[0] == 'hard'
+    assert decide(H264, {}, None, Config.TG_MAX_FILE_SIZE + 1, 0)[0] == 'nosub'
+    assert decide(H264, {}, None, 200, 100)[0] == 'nosub'
+    # the resolution setting alone does not force an encode
+    assert decide(H264, {'resolution': '720'}, None, 100, 0)[0] == 'remux'
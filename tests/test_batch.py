@@ -0,0 +1,34 @@
+import pytest
+
+pytest.importorskip('pyrogram')
+from helper_func.batch import episode_number, pair_files
+
+
+@pytest.mark.parametrize('name, episode', [
+    ('Show S01E05 1080p.mkv', 5),
+    ('Show 1x07.mkv', 7),
+    ('Show EP 09.mkv', 9),
+    ('[Group] Show - 12 [1080p].mkv', 12),
+    ('[Group] Show [03].mkv', 3),
+    ('Show 10bit x265 - 05.mkv', 5),
+    ('Show 2019 1080p x264 14.mkv', 14),   # year / resolution / codec numbers are noise
+    ('Show 14.en.srt', 14),
+    ('[Group] Show - 06 [1A2B3C4D].mkv', 6),  # CRC is not an episode
+    ('Movie 1080p.mkv', None),
+])
+def test_episode_number(name, episode):
+    assert episode_number(name) == episode
+
+
+def test_pairs_by_name_then_episode_sorted_by_episode():
+    videos = [('v1', 'Show - 02.mkv'), ('v2', 'Show - 01.mkv'), ('v3', 'Extras.mkv')]
+    subs = [('s1', 'Show 01.en.srt'), ('s2', 'Show - 02.ass'), ('s3', 'Other 09.srt')]
+    pairs, unmatched = pair_files(videos, subs)
+    assert pairs == [(videos[1], subs[0]), (videos[0], subs[1]), (videos[2], None)]
+    assert unmatched == [subs[2]]
+
+
+def test_a_subtitle_is_paired_only_once():
+    videos = [('v1', 'Show - 01.mkv'), ('v2', 'Show - 01 v2.mkv')]
+    pairs, unmatched = pair_files(videos, [('s1', 'Show - 01.srt')])
+    assert [sub for _, sub in pairs].count(('s1', 'Show - 01.srt')) == 1 and unmatched == []
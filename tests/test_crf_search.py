@@ -0,0 +1,19 @@
+import pytest
+
+pytest.importorskip('pyrogram')
+from helper_func.crf_search import pick_crf, sample_points
+
+
+def test_sample_points_are_spread_over_the_runtime():
+    assert sample_points(100, 4, 4) == [18.0, 38.0, 58.0, 78.0]
+    # only as many samples as fit, and one from the start when the video is shorter than a sample
+    assert sample_points(10, 4, 4) == [1.333, 4.667]
+    assert sample_points(3, 4, 4) == [0.0]
+
+
+def test_pick_crf_takes_the_cheapest_passing_crf():
+    scores = {20: (96.0, 900), 24: (94.0, 600), 28: (90.0, 400)}
+    assert pick_crf(scores, 93) == 24
+    # nothing passes: best quality
+    assert pick_crf(scores, 99) == 20
+    assert pick_crf({}, 93) is None
@@ -0,0 +1,13 @@
+from helper_func.dbhelper import Database
+
+
+def test_resent_track_replaces_the_one_with_the_same_language_and_title(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    db = Database()
+    db.setup()
+    assert db.add_sub_track(1, 'a.srt', 'eng', 'English') is None
+    assert db.add_sub_track(1, 'b.srt', 'spa', 'Español') is None
+    assert db.add_sub_track(1, 'c.srt', 'eng', 'English') == 'a.srt'
+    assert db.get_sub_tracks(1) == [('c.srt', 'eng', 'English'), ('b.srt', 'spa', 'Español')]
+    # another user's tracks are their own
+    assert db.add_sub_track(2, 'd.srt', 'eng', 'English') is None
@@ -0,0 +1,8 @@
+from helper_func import encoders
+
+
+def test_crf_range_follows_the_codec_family():
+    assert encoders.crf_range('libx264') == (0, 51)
+    assert encoders.crf_range('libx265') == (0, 51)
+    assert encoders.crf_range('libvpx-vp9') == (0, 63)
+    assert encoders.crf_range('libaom-av1') == (0, 63)
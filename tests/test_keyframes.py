@@ -0,0 +1,18 @@
+from helper_func import keyframes, smart_render
+
+
+def test_open_gop_keyframes_are_not_cut_points():
+    # decode order: closed GOP at 0, an open GOP at 2 (its leading B frames show before it), closed at 4
+    packets = [
+        '0.000,K__', '0.120,___', '0.040,___', '0.080,___',
+        '2.000,K__', '1.920,___', '1.960,___', '2.120,___',
+        '4.000,K__', '4.080,___', '4.040,___',
+    ]
+    assert keyframes.clean_keyframes(packets) == [0.0, 4.0]
+
+
+def test_reencoded_ranges_keep_the_source_profile():
+    src = {'codec_name': 'h264', 'profile': 'High', 'level': '41', 'refs': '4'}
+    assert smart_render.match_args('libx264', src) == ['-profile:v', 'high', '-level', '4.1', '-refs', '4']
+    src = {'codec_name': 'hevc', 'profile': 'Main 10', 'level': '153'}
+    assert smart_render.match_args('libx265', src) == ['-profile:v', 'main10', '-x265-params', 'level-idc=5.1']
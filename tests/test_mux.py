@@ -0,0 +1,33 @@
+import pytest
+
+pytest.importorskip('pyrogram')
+from config import Config
+from helper_func import mux
+
+
+@pytest.mark.parametrize('value, size', [
+    ('off', 0), ('tg', Config.TG_MAX_FILE_SIZE), ('100', 100 * 1024 * 1024),
+    ('1.5', int(1.5 * 1024 * 1024)), ('5000', Config.TG_MAX_FILE_SIZE), ('junk', 0),
+])
+def test_target_bytes(value, size):
+    assert mux._target_bytes({'target_size': value}) == size
+
+
+def test_video_bitrate_leaves_room_for_audio_and_overhead():
+    target = 100 * 1024 * 1024
+    v_bps = mux._video_bitrate_for(target, 100, 128_000)
+    assert (v_bps + 128_000) * 100 / 8 == pytest.approx(target * (1 - mux.MUX_OVERHEAD), rel=1e-6)
+    assert mux._video_bitrate_for(target, 0, 128_000) == 0
+
+
+def test_split_points_follow_keyframes():
+    kfs = [float(t) for t in range(0, 101, 10)]
+    assert mux.split_points(kfs, 100, 25) == [20.0, 40.0, 60.0, 80.0]
+    # without an index it cuts at the plain targets
+    assert mux.split_points([], 100, 30) == [30, 60, 90]
+
+
+def test_gop_longer_than_a_part_cuts_at_the_next_keyframe():
+    assert mux.split_points([0.0, 50.0, 100.0], 120, 20) == [50.0, 100.0]
+    # no keyframe left before the end: a single part
+    assert mux.split_points([0.0], 120, 20) == []
@@ -0,0 +1,33 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('pyrogram')
+import muxcli
+
+
+def test_watch_survives_a_crashing_job(tmp_path, monkeypatch, capsys):
+    (tmp_path / 'bad.mkv').write_bytes(b'x')
+    (tmp_path / 'good.mkv').write_bytes(b'x')
+    calls = []
+
+    async def run_one(mode, vid, sub, cfg, out, progress):
+        calls.append(vid)
+        if vid.endswith('bad.mkv'):
+            raise OSError('disk full')
+        return True
+
+    monkeypatch.setattr(muxcli, 'run_one', run_one)
+    args = SimpleNamespace(dir=str(tmp_path), mode='nosub', jobs=1, out=str(tmp_path / 'out'),
+                           progress='text', interval=0.01)
+
+    async def main():
+        watcher = asyncio.create_task(muxcli.watch(args, {}))
+        await asyncio.sleep(0.3)
+        watcher.cancel()
+
+    asyncio.run(main())
+    # the crashed input is not picked up again, the other one still runs and is remembered
+    assert sorted(calls) == sorted(str(tmp_path / n) for n in ('bad.mkv', 'good.mkv'))
+    assert 'bad.mkv] failed' in capsys.readouterr().err
+    assert (tmp_path / '.muxcli_done.json').read_text() == f'["{tmp_path / "good.mkv"}"]'
@@ -0,0 +1,43 @@
+import pytest
+from helper_func.preflight import parse_srt, decode, coverage
+
+SRT = """2
+00:00:05,000 --> 00:00:08,000
+Second
+
+1
+00:00:01,000 --> 00:00:06,000
+First, overlaps the second
+
+3
+00:00:09,000 --> 00:00:07,000
+Ends before it starts
+"""
+
+
+def test_out_of_order_and_broken_cues_are_repaired():
+    repairs = []
+    cues = parse_srt(SRT, repairs)
+    assert [c[0] for c in cues] == [1.0, 5.0, 9.0]
+    assert cues[2][1] > cues[2][0]
+    assert {'cues out of order', 'end before start'} <= set(repairs)
+
+
+def test_decode():
+    assert decode('Ünïcödé'.encode('utf-8-sig')) == ('Ünïcödé', 'utf-8-sig')
+    assert decode('Ünïcödé'.encode('utf-16')) == ('Ünïcödé', 'utf-16')
+    assert decode('Ünïcödé'.encode('utf-8')) == ('Ünïcödé', 'utf-8')
+    assert decode('plain text here'.encode('utf-16-le')) == ('plain text here', 'utf-16-le')
+
+
+def test_coverage_merges_overlapping_events(tmp_path):
+    path = tmp_path / 'a.srt'
+    path.write_text(SRT.replace('00:00:09,000 --> 00:00:07,000', '00:00:20,000 --> 00:00:25,000'))
+    assert coverage(str(path), 100) == (pytest.approx(0.12), None)
+
+
+def test_coverage_flags_a_subtitle_for_another_video(tmp_path):
+    path = tmp_path / 'a.srt'
+    path.write_text(SRT)
+    share, problem = coverage(str(path), 0.5)
+    assert problem == "every line starts after the video ends"
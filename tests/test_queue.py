@@ -0,0 +1,42 @@
+import asyncio
+from helper_func.queue import Job, JobQueue
+
+
+def _job(job_id, chat_id=1):
+    return Job(job_id, 'soft', chat_id, f'{job_id}.mkv', None, f'{job_id}.mkv', 1)
+
+
+def test_cancelled_job_is_skipped_by_the_worker():
+    queue, states = JobQueue(), []
+    queue.on_change = lambda job, state: states.append((job.job_id, state))
+    for job_id in 'abc':
+        queue.put_nowait(_job(job_id))
+    assert queue.cancel('a').job_id == 'a'
+    assert queue.cancel('a') is None
+    assert queue.qsize() == 2 and queue.position('c') == 2
+    assert asyncio.run(queue.get()).job_id == 'b'
+    assert ('a', 'cancelled') in states and ('b', 'running') in states
+
+
+def test_move_skips_tombstones():
+    queue, orders = JobQueue(), []
+    queue.on_reorder = orders.append
+    for job_id in 'abcd':
+        queue.put_nowait(_job(job_id, chat_id=2 if job_id == 'd' else 1))
+    queue.cancel('b')
+    assert queue.move('d', 1) and orders == [['d', 'a', 'c']]
+    assert not queue.move('b', 1)
+    assert [job.job_id for _, job in queue.jobs_for(1)] == ['a', 'c']
+    assert queue.position('a') == 2
+    assert asyncio.run(queue.get()).job_id == 'd'
+
+
+def test_take_runs_a_queued_job_out_of_order():
+    queue = JobQueue()
+    for job_id in 'ab':
+        queue.put_nowait(_job(job_id))
+    queue.mark_urgent('b')
+    assert queue.take('b').job_id == 'b' and 'b' not in queue.urgent
+    assert queue.take('b') is None
+    queue.done('b', 'failed')
+    assert queue.get_job('b') is None and queue.live_order() == ['a']
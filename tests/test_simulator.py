@@ -0,0 +1,27 @@
+from helper_func.simulator import TraceJob, Fifo, ShortestFirst, FairShare, simulate
+
+
+def _job(job_id, user_id, size, encode, arrival=0.0):
+    return TraceJob(job_id, user_id, 'hard', size, arrival, 0.0, encode, 0.0, 0.0)
+
+
+def _waits(done):
+    return {job.job_id: wait for job, wait, _ in done}
+
+
+def test_fifo_and_shortest_first():
+    # both wait for the first job; shortest-first learned its seconds per byte from it
+    jobs = [_job('first', 1, 50, 5), _job('long', 1, 100, 10, 1), _job('short', 2, 10, 1, 2)]
+    assert _waits(simulate(jobs, Fifo())) == {'first': 0, 'long': 4, 'short': 13}
+    assert _waits(simulate(jobs, ShortestFirst())) == {'first': 0, 'short': 3, 'long': 5}
+
+
+def test_fair_share_serves_the_least_served_user():
+    jobs = [_job('a1', 1, 10, 5), _job('a2', 1, 10, 5, 1), _job('b1', 2, 10, 5, 2)]
+    assert [job.job_id for job, _, _ in simulate(jobs, FairShare())] == ['a1', 'b1', 'a2']
+
+
+def test_more_workers_than_cores_stretch_the_encode():
+    jobs = [_job('a', 1, 10, 10), _job('b', 2, 10, 10)]
+    assert _waits(simulate(jobs, Fifo(), workers=2)) == {'a': 0, 'b': 0}
+    assert [service for _, _, service in simulate(jobs, Fifo(), workers=2, cores=1)] == [20, 20]
@@ -0,0 +1,24 @@
+import pytest
+from helper_func.smart_render import plan_segments, coverage
+
+KFS = [float(t) for t in range(0, 31, 5)]
+
+
+def test_burn_ranges_snap_to_keyframes():
+    assert plan_segments([(6, 7)], KFS, 30) == [(0.0, 5.0, False), (5.0, 10.0, True), (10.0, 30, False)]
+
+
+def test_short_copy_gaps_are_folded_into_the_burn_range():
+    assert plan_segments([(6, 7), (11, 12)], KFS, 30) == [(0.0, 5.0, False), (5.0, 15.0, True), (15.0, 30, False)]
+    # a short copy tail joins the last burn range
+    assert plan_segments([(20, 22)], KFS[:-1], 26) == [(0.0, 20.0, False), (20.0, 26, True)]
+
+
+def test_events_after_the_end_and_missing_keyframes():
+    assert plan_segments([(40, 41)], KFS, 30) == [(0.0, 30, False)]
+    assert plan_segments([(6, 7)], [], 30) == [(0.0, 30, True)]
+
+
+def test_coverage_is_the_burned_share():
+    plan = plan_segments([(20, 22)], KFS[:-1], 26)
+    assert coverage(plan, 26) == pytest.approx(6 / 26)
@@ -0,0 +1,48 @@
+import os
+import pytest
+from config import Config
+from helper_func import storage
+
+
+@pytest.fixture
+def tiers(tmp_path, monkeypatch):
+    dl, shm = tmp_path / 'dl', tmp_path / 'shm'
+    dl.mkdir()
+    monkeypatch.setattr(Config, 'DOWNLOAD_DIR', str(dl))
+    monkeypatch.setattr(Config, 'SCRATCH_DIR', str(shm))
+    monkeypatch.setattr(Config, 'SCRATCH_BUDGET', 1000)
+    monkeypatch.setattr(Config, 'SCRATCH_MAX_FILE', 500)
+    monkeypatch.setattr(storage, '_IDLE', 0)
+    storage.setup()
+    return dl
+
+
+def test_outgrown_file_is_promoted_once_its_job_ends(tiers):
+    out = str(tiers / 'out.mkv')
+    storage.place(out, 300, 'job1')
+    assert os.path.islink(out)
+    with open(out, 'w') as f:
+        f.write('y' * 700)
+    # a running (or SIGSTOPped) job's output stays where its ffmpeg writes it
+    assert storage.sweep({'job1'})['promoted'] == 0
+    assert os.path.islink(out)
+    assert storage.sweep()['promoted'] == 1
+    assert not os.path.islink(out) and os.path.getsize(out) == 700
+
+
+def test_unlinked_scratch_files_are_reaped(tiers):
+    out = str(tiers / 'out.mkv')
+    storage.place(out, 10, 'job1')
+    os.rename(out, str(tiers / 'final.mkv'))   # the worker renames outputs: still linked
+    assert storage.sweep()['reaped'] == 0
+    os.remove(str(tiers / 'final.mkv'))
+    assert storage.sweep()['reaped'] == 1
+
+
+def test_setup_moves_linked_files_back_to_disk(tiers):
+    out = str(tiers / 'out.mkv')
+    storage.place(out, 10, 'job1')
+    with open(out, 'w') as f:
+        f.write('x')
+    storage.setup()
+    assert not os.path.islink(out) and open(out).read() == 'x'
@@ -0,0 +1,52 @@
+import os, asyncio
+import pytest
+from helper_func.uploader import ThrottledTransport, upload_parts
+
+PART = 64 * 1024
+
+
+@pytest.fixture
+def blob(tmp_path):
+    path = tmp_path / 'out.bin'
+    path.write_bytes(os.urandom(PART * 20 + 123))
+    return str(path)
+
+
+class CountingTransport(ThrottledTransport):
+    """ThrottledTransport that remembers how many parts it is sending right now."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.active = 0
+
+    async def send_part(self, file_id, index, total, data):
+        self.active += 1
+        try:
+            await super().send_part(file_id, index, total, data)
+        finally:
+            self.active -= 1
+
+
+def test_parts_reassemble(blob):
+    parts = {}
+    transports = [ThrottledTransport(50 * 1024 * 1024, 0.2, parts) for _ in range(4)]
+    _, total = asyncio.run(upload_parts(blob, transports, retries=50, part_size=PART))
+    with open(blob, 'rb') as f:
+        assert b''.join(parts[i] for i in range(total)) == f.read()
+
+
+def test_failed_part_stops_the_other_workers(blob):
+    parts = {}
+    broken = CountingTransport(50 * 1024 * 1024, 1.0, parts)
+    slow   = [CountingTransport(1024 * 1024, 0.0, parts) for _ in range(3)]
+
+    async def run():
+        with pytest.raises(IOError):
+            await upload_parts(blob, [broken, *slow], retries=0, part_size=PART)
+        # nothing is still sending once the error surfaced, and nothing starts later
+        assert all(t.active == 0 for t in slow)
+        sent = len(parts)
+        await asyncio.sleep(0.3)
+        assert len(parts) == sent
+
+    asyncio.run(run())
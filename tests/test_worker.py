@@ -0,0 +1,103 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip('pyrogram')
+from plugins import muxer
+from helper_func.queue import Job, JobQueue
+
+
+def test_a_crashing_job_does_not_stop_the_worker(monkeypatch):
+    queue, states = JobQueue(), []
+    queue.on_change = lambda job, state: states.append((job.job_id, state))
+
+    async def _process(client, job, status, times):
+        if job.job_id == 'bad':
+            raise FileNotFoundError(job.vid)   # e.g. the input vanished before getsize
+        return 'done'
+
+    async def _nothing(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(muxer, 'job_queue', queue)
+    monkeypatch.setattr(muxer, '_process', _process)
+    monkeypatch.setattr(muxer, '_preempt', _nothing)
+    monkeypatch.setattr(muxer.db, 'run', _nothing)
+    client = SimpleNamespace(edit_message_text=_nothing)
+
+    async def main():
+        for job_id in ('bad', 'good'):
+            queue.put_nowait(Job(job_id, 'nosub', 1, f'{job_id}.mkv', None, 'out.mp4', 1))
+        worker = asyncio.create_task(muxer.queue_worker(client))
+        for _ in range(200):
+            if ('good', 'done') in states:
+                break
+            await asyncio.sleep(0.01)
+        alive = not worker.done()
+        worker.cancel()
+        return alive
+
+    assert asyncio.run(main())
+    assert ('bad', 'failed') in states and ('good', 'done') in states
+
+
+def test_paused_job_is_resumed_when_the_urgent_job_crashes(monkeypatch):
+    queue, resumed = JobQueue(), []
+    running = Job('long', 'nosub', 1, 'long.mkv', None, 'long.mp4', 1)
+    urgent  = Job('quick', 'remux', 1, 'quick.mkv', None, 'quick.mkv', 2)
+    queue.put_nowait(urgent)
+    picks = iter([urgent, None])
+
+    async def _run_job(client, job):
+        raise RuntimeError('boom')
+
+    async def _urgent_job(job, remaining):
+        return next(picks)
+
+    async def _size(name):
+        return 0
+
+    async def _nothing(*args, **kwargs):
+        pass
+
+    monkeypatch.setattr(muxer, 'job_queue', queue)
+    monkeypatch.setattr(muxer, '_run_job', _run_job)
+    monkeypatch.setattr(muxer, '_urgent_job', _urgent_job)
+    monkeypatch.setattr(muxer, 'pause_job', lambda job_id: True)
+    monkeypatch.setattr(muxer, 'resume_job', lambda job_id: resumed.append(job_id) or 1.0)
+    monkeypatch.setattr(muxer.ingestor, 'input_size', _size)
+    asyncio.run(muxer._preempt(SimpleNamespace(edit_message_text=_nothing), running))
+    assert resumed == ['long']
+
+
+def test_failed_part_upload_is_reported_not_raised(tmp_path, monkeypatch):
+    monkeypatch.setattr(muxer.Config, 'DOWNLOAD_DIR', str(tmp_path))
+    monkeypatch.setattr(muxer.Config, 'UPLOAD_SESSIONS', 1)
+    parts = ['out.part01.mkv', 'out.part02.mkv']
+    for name in parts:
+        (tmp_path / name).write_bytes(b'x' * 10)
+    edits = []
+
+    async def save_file(path, progress=None):
+        raise ConnectionError('connection reset')
+
+    async def edit(chat_id, msg_id, text, **kwargs):
+        edits.append(text)
+
+    client = SimpleNamespace(save_file=save_file, edit_message_text=edit)
+    job = Job('j1', 'soft', 1, 'in.mkv', None, 'out.mkv', 1)
+    status = muxer.StatusMessage(client, 1, 1)
+    assert asyncio.run(muxer._upload_parts(client, job, status, parts)) is False
+    assert not any((tmp_path / name).exists() for name in parts)
+    assert 'connection reset' in edits[-1]
+
+
+@pytest.mark.parametrize('text, secs', [('90', 90.0), ('1:30', 90.0), ('01:01:30.5', 3690.5)])
+def test_trim_times_parse(text, secs):
+    assert muxer._parse_ts(text) == secs
+
+
+@pytest.mark.parametrize('text', ['1:-30', '1:75', '60:00:60', '-5', 'nan', '1:2:3:4', 'x'])
+def test_bad_trim_times_are_rejected(text):
+    with pytest.raises(ValueError):
+        muxer._parse_ts(text)